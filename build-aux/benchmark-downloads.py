@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+# benchmark-downloads.py
+#
+# Copyright 2020 brombinmirko <send@mirko.pm>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Download a generated file from a local HTTP server, in a single stream
+and in segments, and check the downloaded files. The server limits the
+rate of each connection, like most mirrors do, and can be started
+without Range support to check the fallback. The installed bottles
+module is used:
+
+    PYTHONPATH=/app/share/bottles python3 build-aux/benchmark-downloads.py [--size MiB]
+"""
+
+import os
+import re
+import time
+import shutil
+import hashlib
+import argparse
+import tempfile
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+
+def make_handler(path: str, rate: int, ranges: bool):
+    size = os.path.getsize(path)
+
+    class Handler(BaseHTTPRequestHandler):
+
+        def do_GET(self):
+            start, end = 0, size - 1
+            match = re.match(r"bytes=(\d+)-(\d*)", self.headers.get("Range", ""))
+            if ranges and match:
+                start = int(match.group(1))
+                end = min(int(match.group(2) or end), end)
+                self.send_response(206)
+                self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+            else:
+                self.send_response(200)
+            self.send_header("Content-Length", str(end - start + 1))
+            self.end_headers()
+
+            with open(path, "rb") as f:
+                f.seek(start)
+                left = end - start + 1
+                chunk = max(rate // 20, 1)
+                while left > 0:
+                    data = f.read(min(chunk, left))
+                    try:
+                        self.wfile.write(data)
+                    except (BrokenPipeError, ConnectionResetError):
+                        return
+                    left -= len(data)
+                    time.sleep(len(data) / rate)
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+
+def md5(path: str) -> str:
+    with open(path, "rb") as f:
+        return hashlib.md5(f.read()).hexdigest()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Downloads benchmark")
+    parser.add_argument("--size", type=int, default=64, help="Size of the file (MiB)")
+    parser.add_argument("--rate", type=int, default=16, help="Rate of each connection (MiB/s)")
+    parser.add_argument("--segments", type=int, default=4, help="Segments of the download")
+    args = parser.parse_args()
+
+    from bottles.backend.downloader import Downloader  # pyright: reportMissingImports=false
+
+    tmp = tempfile.mkdtemp(prefix="bottles-bench-")
+    source = os.path.join(tmp, "source.tar.xz")
+    with open(source, "wb") as f:
+        for _ in range(args.size):
+            f.write(os.urandom(1024 * 1024))
+    checksum = md5(source)
+
+    try:
+        for ranges in [True, False]:
+            server = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(source, args.rate * 1024 * 1024, ranges))
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            url = f"http://127.0.0.1:{server.server_port}/source.tar.xz"
+            print(f"Server {'with' if ranges else 'without'} Range support:")
+
+            for segments in [1, args.segments]:
+                target = os.path.join(tmp, f"target-{segments}")
+                start = time.perf_counter()
+                res = Downloader(url, target, segments=segments).download()
+                elapsed = time.perf_counter() - start
+                valid = res and md5(target) == checksum
+                print(f"  {segments} segments: {elapsed:.2f}s, {args.size / elapsed:.1f} MiB/s, "
+                      f"{'valid' if valid else 'INVALID'}")
+                os.remove(target)
+
+            server.shutdown()
+            server.server_close()
+    finally:
+        shutil.rmtree(tmp)
+
+
+if __name__ == "__main__":
+    main()
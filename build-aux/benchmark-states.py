@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+# benchmark-states.py
+#
+# Copyright 2020 brombinmirko <send@mirko.pm>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Measure the state creation work (files index and object store) on a
+generated prefix, the first time and when nothing changed, so the
+files are not hashed again. The installed bottles module is used:
+
+    PYTHONPATH=/app/share/bottles python3 build-aux/benchmark-states.py [--files N]
+"""
+
+import os
+import sys
+import time
+import random
+import shutil
+import argparse
+import tempfile
+
+
+def make_prefix(path: str, files: int, size: int):
+    dirs = ["windows/system32", "windows/syswow64", "Program Files/App/bin", "Program Files/App/data"]
+    for i in range(files):
+        _dir = os.path.join(path, "drive_c", random.choice(dirs), f"{i % 97}")
+        os.makedirs(_dir, exist_ok=True)
+        with open(os.path.join(_dir, f"file_{i}.dll"), "wb") as f:
+            f.write(os.urandom(random.randint(1, size)))
+
+    # the cache does not trust the files modified in the last seconds
+    past = time.time() - 60
+    for root, _, _files in os.walk(path):
+        for f in _files:
+            os.utime(os.path.join(root, f), (past, past))
+
+
+def create_state(versioning, store_class, config: dict, bottle_path: str) -> tuple:
+    start = time.perf_counter()
+    index = versioning.get_index(config)
+    indexed = time.perf_counter()
+
+    store = store_class(bottle_path)
+    for file in index["Files"]:
+        if not store.has(file["checksum"]):
+            store.add(f"{bottle_path}/drive_c/{file['file']}", file["checksum"])
+    return indexed - start, time.perf_counter() - indexed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="State creation benchmark")
+    parser.add_argument("--files", type=int, default=50000, help="Files of the prefix")
+    parser.add_argument("--size", type=int, default=16384, help="Max size of the files (bytes)")
+    parser.add_argument("--runs", type=int, default=3, help="Runs on the unchanged prefix")
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="bottles-bench-")
+    os.environ["XDG_DATA_HOME"] = tmp
+    os.makedirs(os.path.join(tmp, "bottles"))
+
+    from bottles.backend.managers.versioning import VersioningManager  # pyright: reportMissingImports=false
+    from bottles.backend.managers.objects import ObjectStore
+
+    bottle_path = os.path.join(tmp, "bottle")
+    config = {"Name": "benchmark", "Path": bottle_path}
+    try:
+        random.seed(0)
+        print(f"Generating a prefix of {args.files} files…")
+        make_prefix(bottle_path, args.files, args.size)
+
+        index, store = create_state(VersioningManager, ObjectStore, config, bottle_path)
+        print(f"first state:      index {index:8.2f} s   store {store:8.2f} s")
+
+        for i in range(args.runs):
+            index, store = create_state(VersioningManager, ObjectStore, config, bottle_path)
+            print(f"unchanged #{i + 1}:     index {index:8.2f} s   store {store:8.2f} s")
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+# benchmark-yaml.py
+#
+# Copyright 2020 brombinmirko <send@mirko.pm>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Compare the pure Python and the libyaml loaders/dumpers used by
+bottles.backend.utils.yaml on fixtures shaped like a versioning
+files.yml and a journal.yml. Real files can be passed as arguments.
+
+    python3 build-aux/benchmark-yaml.py [--entries N] [file.yml ...]
+"""
+
+import os
+import sys
+import time
+import uuid
+import random
+import hashlib
+import argparse
+from datetime import datetime, timedelta
+
+import yaml
+
+
+def files_fixture(entries: int) -> dict:
+    dirs = ["windows/system32", "windows/syswow64", "Program Files/App", "users/steamuser/AppData"]
+    return {
+        "Update_Date": str(datetime.now()),
+        "Files": [
+            {
+                "file": f"{random.choice(dirs)}/file_{i}.dll",
+                "checksum": hashlib.md5(str(i).encode()).hexdigest()
+            }
+            for i in range(entries)
+        ]
+    }
+
+
+def journal_fixture(entries: int) -> dict:
+    now = datetime.now()
+    return {
+        str(uuid.uuid4()): {
+            "severity": random.choice(["info", "warning", "error", "crash"]),
+            "message": f"Setting Key: [Runner] to [caffe-7.{i}] for bottle: [Bottle {i % 50}]…",
+            "timestamp": (now - timedelta(seconds=i)).strftime("%Y-%m-%d %H:%M:%S")
+        }
+        for i in range(entries)
+    }
+
+
+def bench(func, runs: int = 3) -> float:
+    best = None
+    for _ in range(runs):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def run(name: str, content: str):
+    data = yaml.load(content, Loader=yaml.SafeLoader)
+    results = {
+        "load": [lambda: yaml.load(content, Loader=yaml.SafeLoader)],
+        "dump": [lambda: yaml.dump(data, Dumper=yaml.SafeDumper)]
+    }
+    if yaml.__with_libyaml__:
+        results["load"].append(lambda: yaml.load(content, Loader=yaml.CSafeLoader))
+        results["dump"].append(lambda: yaml.dump(data, Dumper=yaml.CSafeDumper))
+
+    print(f"{name} ({len(content) / 1024:.0f} KiB)")
+    for op, funcs in results.items():
+        timings = [bench(f) for f in funcs]
+        line = f"    {op}: python {timings[0] * 1000:8.1f} ms"
+        if len(timings) > 1:
+            line += f"   libyaml {timings[1] * 1000:8.1f} ms   x{timings[0] / timings[1]:.1f}"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="YAML loaders benchmark")
+    parser.add_argument("files", nargs="*", help="YAML files to benchmark")
+    parser.add_argument("--entries", type=int, default=20000, help="Entries of the fixtures")
+    args = parser.parse_args()
+
+    if not yaml.__with_libyaml__:
+        print("PyYAML is built without libyaml, only the fallback is available.")
+
+    if args.files:
+        for path in args.files:
+            with open(path, "r") as f:
+                run(os.path.basename(path), f.read())
+        return
+
+    random.seed(0)
+    run("files.yml", yaml.dump(files_fixture(args.entries), indent=4))
+    run("journal.yml", yaml.dump(journal_fixture(args.entries)))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,5 +1,6 @@
 import os
-import hashlib
+
+from bottles.backend.utils.hashing import FileHasher  # pyright: reportMissingImports=false
 
 
 class Diff:
@@ -29,27 +30,28 @@ class Diff:
             '''
             path += os.sep
 
+        paths = []
         for root, dirs, files in os.walk(path):
             dirs[:] = [d for d in dirs if d not in Diff.__ignored]
             for f in files:
                 if f in Diff.__ignored:
                     continue
-                with open(os.path.join(root, f), "rb") as fr:
-                    _hash = hashlib.sha1(fr.read()).hexdigest()
+                paths.append(os.path.join(root, f))
 
-                _key = os.path.join(root, f)
-                _key = _key.replace(path, "")
-                _files[_key] = _hash
+        for _key, _hash in FileHasher("sha1").hash_files(paths).items():
+            _files[_key.replace(path, "")] = _hash
 
         return _files
 
     @staticmethod
     def file_hashify(path: str) -> str:
         """Hash (SHA-1) a file and return it."""
-        with open(path, "rb") as fr:
-            _hash = hashlib.sha1(fr.read()).hexdigest()
+        return FileHasher("sha1").hash_file(path)
 
-        return _hash
+    @staticmethod
+    def files_hashify(paths: list) -> dict:
+        """Hash (SHA-1) many files concurrently, return them as path: hash."""
+        return FileHasher("sha1").hash_files(paths)
 
     @staticmethod
     def compare(parent: dict, child: dict) -> dict:
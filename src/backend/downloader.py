@@ -15,10 +15,17 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import os
+import re
+import json
+import threading
 import requests
+from concurrent.futures import ThreadPoolExecutor
 from gi.repository import GLib
 
 from bottles.backend.logger import Logger  # pyright: reportMissingImports=false
+from bottles.backend.utils.hashing import FileHasher
+from bottles.backend.utils.network import HttpClient
 
 logging = Logger()
 
@@ -28,46 +35,326 @@ class Downloader:
     Download a resource from a given URL. It shows and update a progress
     bar while downloading but can also be used to pdate external progress
     bars using the func parameter.
+    Large files are split in segments, fetched concurrently with HTTP
+    Range requests and written in place in a preallocated file. If the
+    server does not support ranges, the file is downloaded in a single
+    stream.
+    The file is downloaded as <file>.part and renamed once complete. A
+    journal (<file>.part.json) records the size, the ETag and the bytes
+    written of each segment, so an interrupted download is resumed,
+    even after a restart, if the resource did not change.
+    The digests of the given algorithms are computed while the data are
+    written, so the file does not need to be read again to be verified.
+    The segments written ahead are hashed when the contiguous part of
+    the file reaches them, from the page cache.
     """
 
-    def __init__(self, url: str, file: str, func: callable = None):
+    chunk_size = 64 * 1024
+    min_segment_size = 8 * 1024 * 1024
+    max_segments = 4
+    retries = 2
+    journal_interval = 8 * 1024 * 1024
+
+    def __init__(
+            self,
+            url: str,
+            file: str,
+            func: callable = None,
+            segments: int = None,
+            algorithms: tuple = ()
+    ):
         self.url = url
         self.file = file
         self.func = func
+        self.segments = segments or self.max_segments
+        self.algorithms = tuple(algorithms)
+        self.digests = {}  # algorithm: digest, once downloaded
+        self.part_path = f"{file}.part"
+        self.journal_path = f"{file}.part.json"
+        self.__lock = threading.Lock()
+        self.__journal_lock = threading.Lock()
+        self.__downloaded = 0
+        self.__percent = -1
+        self.__journal = None
+        self.__journaled = 0
+        self.__hashes = {}
+        self.__hashed = 0
+        self.__hash_lock = threading.Lock()
 
     def download(self):
         """Start the download."""
         try:
-            with open(self.file, "wb") as file:
-                headers = {"User-Agent": "curl/7.79.1"}
-                response = requests.get(self.url, stream=True, headers=headers)
-                total_size = int(response.headers.get("content-length", 0))
-                block_size = 1024
-                count = 0
-
-                if total_size != 0:
-                    for data in response.iter_content(block_size):
-                        file.write(data)
-                        count += 1
-                        if self.func is not None:
-                            GLib.idle_add(
-                                self.func,
-                                count,
-                                block_size,
-                                total_size
-                            )
-                            self.__progress(count, block_size, total_size)
+            '''
+            Ask for the whole file as a range: a server supporting
+            ranges answers with 206 and the total size, so it is
+            known if the file can be downloaded in segments.
+            '''
+            response = HttpClient.get(self.url, stream=True, headers={"Range": "bytes=0-"})
+            if response.status_code == 416:  # e.g. an empty file
+                response.close()
+                response = HttpClient.get(self.url, stream=True)
+            response.raise_for_status()
+            total_size = self.__get_total_size(response)
+            validator = response.headers.get("etag") or response.headers.get("last-modified")
+            self.__hashes = {a: FileHasher(a).new() for a in self.algorithms}
+            self.__hashed = 0
+
+            if response.status_code == 206 and total_size > 0:
+                journal = self.__load_journal(total_size, validator)
+                resume = journal is not None
+                if not resume:
+                    journal = self.__new_journal(total_size, validator)
                 else:
-                    file.write(response.content)
-                    if self.func is not None:
-                        GLib.idle_add(self.func, 1, 1, 1)
-                        self.__progress(1, 1, 1)
-        except (requests.exceptions.RequestException, OSError):
-            logging.error("Download failed! Check your internet connection.", )
+                    # the first request is of no use when resuming
+                    response.close()
+                    response = None
+                self.__download_segments(journal, response, resume)
+            else:
+                self.__remove_journal()
+                with response, open(self.part_path, "wb") as file:
+                    self.__download_stream(response, file, total_size)
+
+            self.digests = {a: h.hexdigest().lower() for a, h in self.__hashes.items()}
+            os.replace(self.part_path, self.file)
+            self.__remove_journal()
+        except (requests.exceptions.RequestException, OSError) as e:
+            logging.error(f"Download failed! Check your internet connection. {e}", )
             return False
 
         return True
 
+    @staticmethod
+    def __get_total_size(response) -> int:
+        content_range = response.headers.get("content-range", "")
+        match = re.match(r"bytes \d+-\d+/(\d+)", content_range)
+        if response.status_code == 206 and match:
+            return int(match.group(1))
+        return int(response.headers.get("content-length", 0))
+
+    def __download_stream(self, response, file, total_size: int):
+        if total_size != 0:
+            for data in response.iter_content(self.chunk_size):
+                file.write(data)
+                self.__hash(data)
+                self.__update(len(data), total_size)
+        else:
+            file.write(response.content)
+            self.__hash(response.content)
+            self.__update(1, 1)
+
+    def __new_journal(self, total_size: int, validator: str) -> dict:
+        """Split the file in segments of at least min_segment_size."""
+        count = max(1, min(self.segments, total_size // self.min_segment_size))
+        segment_size = -(-total_size // count)  # rounded up
+        return {
+            "url": self.url,
+            "size": total_size,
+            "validator": validator,
+            "segments": [
+                [start, min(start + segment_size, total_size) - 1, start]  # start, end, written up to
+                for start in range(0, total_size, segment_size)
+            ]
+        }
+
+    def __load_journal(self, total_size: int, validator: str):
+        """
+        Return the journal of the partial download, if the resource is
+        the same: same size and ETag (or the same URL without one).
+        """
+        try:
+            with open(self.journal_path, "r") as f:
+                journal = json.load(f)
+            if not os.path.isfile(self.part_path):
+                raise ValueError("the partial file is missing")
+            same = journal["size"] == total_size and journal["validator"] == validator
+            if not same or (validator is None and journal["url"] != self.url):
+                raise ValueError("the resource changed")
+            for start, end, offset in journal["segments"]:
+                if not start <= offset <= end + 1:
+                    raise ValueError("invalid segment")
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logging.warning(f"Cannot resume the download of {self.url}: {e}", )
+            return None
+
+        done = sum(offset - start for start, _, offset in journal["segments"])
+        logging.info(f"Resuming the download of {self.url} from [{done}] of [{total_size}] bytes.", )
+        return journal
+
+    def __save_journal(self, fd: int, wait: bool = True):
+        """
+        Save the journal, once the data it records are on disk. Without
+        wait, the journal is not saved if another thread is saving it.
+        The journal is taken before syncing, the segments can only grow
+        afterwards, so it never records data not synced yet.
+        """
+        if not self.__journal_lock.acquire(blocking=wait):
+            return
+        try:
+            with self.__lock:
+                data = json.dumps(self.__journal)
+            os.fdatasync(fd)
+            tmp_path = f"{self.journal_path}.tmp"
+            with open(tmp_path, "w") as f:
+                f.write(data)
+            os.replace(tmp_path, self.journal_path)
+        finally:
+            self.__journal_lock.release()
+
+    def __remove_journal(self):
+        for path in [self.journal_path, f"{self.journal_path}.tmp"]:
+            if os.path.exists(path):
+                os.remove(path)
+
+    def __download_segments(self, journal: dict, response=None, resume: bool = False):
+        """
+        Download the missing part of the segments on a thread pool,
+        each one written at its offset with pwrite. The response of
+        the first request is used for the first segment, if given.
+        Unless resuming from the journal, any previous partial file is
+        truncated, so none of its content is left in the new one.
+        """
+        total_size = journal["size"]
+        self.__journal = journal
+        self.__downloaded = sum(offset - start for start, _, offset in journal["segments"])
+        self.__journaled = self.__downloaded
+        missing = [s for s in journal["segments"] if s[2] <= s[1]]
+        logging.info(f"Downloading {self.url} in [{len(missing)}] segments.", )
+
+        flags = os.O_RDWR | os.O_CREAT | (0 if resume else os.O_TRUNC)
+        fd = os.open(self.part_path, flags, 0o644)
+        try:
+            if not resume:
+                try:
+                    os.posix_fallocate(fd, 0, total_size)
+                except (AttributeError, OSError):
+                    os.ftruncate(fd, total_size)
+            elif os.fstat(fd).st_size > total_size:
+                os.ftruncate(fd, total_size)
+            self.__save_journal(fd)
+            with self.__hash_lock:
+                self.__hash_written(fd)  # the part already downloaded
+
+            with ThreadPoolExecutor(max_workers=max(len(missing), 1)) as executor:
+                futures = [
+                    executor.submit(
+                        self.__download_segment, fd, segment, total_size,
+                        response if segment[2] == 0 else None
+                    )
+                    for segment in missing
+                ]
+                for future in futures:
+                    future.result()
+
+            with self.__hash_lock:
+                self.__hash_written(fd)
+                if self.__hashes and self.__hashed != total_size:
+                    raise OSError(f"Hashed [{self.__hashed}] of [{total_size}] bytes.")
+
+            # the digests only cover [0, total_size), so must the file
+            size = os.fstat(fd).st_size
+            if size != total_size:
+                raise OSError(f"{self.part_path} is [{size}] bytes instead of [{total_size}].")
+        finally:
+            if response is not None:
+                response.close()
+            self.__save_journal(fd)
+            os.close(fd)
+
+    def __download_segment(self, fd: int, segment: list, total_size: int, response=None):
+        """
+        Download the segment [start, end, offset] from offset to end
+        (inclusive), retrying from where it stopped. The offset is
+        updated as the data are written.
+        """
+        start, end = segment[0], segment[1]
+        validator = self.__journal["validator"]
+        for attempt in range(self.retries + 1):
+            try:
+                if response is None:
+                    headers = {"Range": f"bytes={segment[2]}-{end}"}
+                    if validator:
+                        headers["If-Range"] = validator
+                    response = HttpClient.get(self.url, stream=True, headers=headers)
+                with response:
+                    if response.status_code != 206 \
+                            or not response.headers.get("content-range", "").startswith(f"bytes {segment[2]}-"):
+                        raise requests.exceptions.HTTPError(
+                            f"Unexpected response to a range request: {response.status_code}",
+                            response=response
+                        )
+                    for data in response.iter_content(self.chunk_size):
+                        data = data[:end + 1 - segment[2]]
+                        os.pwrite(fd, data, segment[2])
+                        with self.__lock:
+                            segment[2] += len(data)
+                        self.__hash_segment(fd, data, segment[2] - len(data))
+                        self.__update(len(data), total_size, fd)
+                        if segment[2] > end:
+                            return
+                if segment[2] > end:
+                    return
+                raise requests.exceptions.ConnectionError(f"Segment {start}-{end} ended at {segment[2]}")
+            except requests.exceptions.RequestException as e:
+                if attempt == self.retries:
+                    raise
+                logging.warning(f"Segment {start}-{end} interrupted, retrying: {e}", )
+            finally:
+                response = None
+
+    def __hash(self, data: bytes):
+        for checksum in self.__hashes.values():
+            checksum.update(data)
+        self.__hashed += len(data)
+
+    def __hash_segment(self, fd: int, data: bytes, offset: int):
+        """
+        Hash the data written at offset if the file is hashed up to
+        there, then the following segments already written.
+        """
+        if not self.__hashes:
+            return
+        with self.__hash_lock:
+            if offset != self.__hashed:
+                return
+            self.__hash(data)
+            self.__hash_written(fd)
+
+    def __hash_written(self, fd: int):
+        """Hash the contiguous written part of the file, from the last hashed byte."""
+        if not self.__hashes:
+            return
+        with self.__lock:
+            written = self.__journal["size"]
+            for start, end, offset in self.__journal["segments"]:
+                if offset <= end:
+                    written = offset
+                    break
+        while self.__hashed < written:
+            data = os.pread(fd, min(1024 * 1024, written - self.__hashed), self.__hashed)
+            if not data:
+                raise OSError(f"Cannot read {self.part_path} at [{self.__hashed}].")
+            self.__hash(data)
+
+    def __update(self, size: int, total_size: int, fd: int = None):
+        """Notify the progress, once per percent, and save the journal."""
+        with self.__lock:
+            self.__downloaded += size
+            downloaded = min(self.__downloaded, total_size)
+            save = fd is not None and downloaded - self.__journaled >= self.journal_interval
+            if save:
+                self.__journaled = downloaded
+            percent = int(downloaded * 100 / total_size)
+            notify = percent != self.__percent
+            self.__percent = percent
+
+        if save:
+            self.__save_journal(fd, wait=False)
+        if notify and self.func is not None:
+            GLib.idle_add(self.func, downloaded, 1, total_size)
+            self.__progress(downloaded, 1, total_size)
+
     def __progress(self, count, block_size, total_size):
         """Update the progress bar."""
         percent = int(count * block_size * 100 / total_size)
@@ -62,6 +62,7 @@ class Paths:
     nvapi = f"{base}/nvapi"
     latencyflex = f"{base}/latencyflex"
     templates = f"{base}/templates"
+    cache = f"{base}/cache"
     library = f"{base}/library.yml"
 
     data = DataManager()
@@ -16,7 +16,6 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 import os
-import yaml
 import shutil
 import platform
 import subprocess
@@ -24,6 +23,7 @@ import subprocess
 from bottles.backend.utils.display import DisplayUtils  # pyright: reportMissingImports=false
 from bottles.backend.utils.gpu import GPUUtils
 from bottles.backend.utils.generic import is_glibc_min_available
+from bottles.backend.utils import yaml
 
 
 class HealthChecker:
@@ -17,7 +17,6 @@
 
 import os
 import uuid
-import yaml
 import shutil
 from glob import glob
 from typing import NewType
@@ -27,6 +26,7 @@ from bottles.backend.models.samples import Samples
 from bottles.backend.utils.manager import ManagerUtils
 from bottles.backend.globals import Paths
 from bottles.backend.diff import Diff
+from bottles.backend.utils import yaml
 
 logging = Logger()
 
@@ -243,14 +243,16 @@ class Layer:
         logging.info(f"Sweeping layer {self.__config['Name']}…", )
         for mount in self.__mounts:
             _tree = mount["Tree"]
+            _files = [f"{self.__path}/{f}" for f in _tree if os.path.exists(f"{self.__path}/{f}")]
+            _hashes = Diff.files_hashify(_files)
 
             for f in _tree:
                 _file = f"{self.__path}/{f}"
 
-                if not os.path.exists(_file):
+                if _file not in _hashes:
                     continue
 
-                if Diff.file_hashify(_file) != _tree[f]:
+                if _hashes[_file] != _tree[f]:
                     continue
 
                 if os.path.islink(_file):
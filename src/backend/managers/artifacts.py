@@ -0,0 +1,281 @@
+# artifacts.py
+#
+# Copyright 2020 brombinmirko <send@mirko.pm>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import time
+import uuid
+import errno
+import sqlite3
+import hashlib
+import threading
+from typing import Union
+from collections import Counter
+from contextlib import closing, contextmanager
+
+from bottles.backend.logger import Logger  # pyright: reportMissingImports=false
+from bottles.backend.globals import Paths
+from bottles.backend.utils.copier import FileCopier
+
+logging = Logger()
+
+
+class ArtifactCache:
+    """
+    Content-addressed cache of the downloaded files (runners, components,
+    dependencies and installers resources), under cache/artifacts. An
+    artifact is keyed by its checksum (e.g. sha256:…), so the same file
+    is downloaded once for all the bottles, whatever its name; files
+    without a checksum are not cached, as nothing tells when they
+    change upstream. The temp directory only keeps symlinks to the
+    artifacts, so the cache holds the single copy of each file.
+    The index (index.db) records the URL, name, size, last access and
+    pin of each artifact: once the cache exceeds max_size (MiB), the
+    least recently used artifacts are evicted, except the pinned ones
+    and those in use.
+    """
+
+    path = f"{Paths.cache}/artifacts"
+    objects = f"{path}/objects"
+    max_size = 4096  # MiB, 0 for no limit
+
+    __version = 2
+    __lock = threading.Lock()
+    __in_use = Counter()
+
+    __schema = [
+        """CREATE TABLE IF NOT EXISTS artifacts (
+            key TEXT PRIMARY KEY,
+            url TEXT,
+            name TEXT,
+            size INTEGER NOT NULL,
+            last_access REAL NOT NULL,
+            pinned INTEGER NOT NULL DEFAULT 0
+        )"""
+    ]
+
+    @staticmethod
+    def get_key(checksum: str = None) -> Union[str, None]:
+        """Return the key of an artifact, its checksum (algorithm:digest), None if not cacheable."""
+        if checksum:
+            return checksum.lower()
+        return None
+
+    @staticmethod
+    def get_object_path(key: str) -> str:
+        _hash = hashlib.sha256(key.encode("utf-8")).hexdigest()
+        return os.path.join(ArtifactCache.objects, _hash[:2], _hash[2:])
+
+    @staticmethod
+    def connect() -> sqlite3.Connection:
+        """Open the index, creating it if needed."""
+        os.makedirs(ArtifactCache.path, exist_ok=True)
+        conn = sqlite3.connect(os.path.join(ArtifactCache.path, "index.db"), timeout=30)
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        if version != ArtifactCache.__version:
+            with conn:
+                for statement in ArtifactCache.__schema:
+                    conn.execute(statement)
+                if version == 1:
+                    ArtifactCache.__drop_url_keys(conn)
+                conn.execute(f"PRAGMA user_version = {ArtifactCache.__version}")
+        return conn
+
+    @staticmethod
+    def __drop_url_keys(conn: sqlite3.Connection):
+        """Drop the artifacts cached by URL by the previous version, they are never revalidated."""
+        for (key,) in conn.execute("SELECT key FROM artifacts WHERE key LIKE 'url:%'").fetchall():
+            try:
+                os.remove(ArtifactCache.get_object_path(key))
+            except OSError:
+                pass
+        conn.execute("DELETE FROM artifacts WHERE key LIKE 'url:%'")
+
+    @staticmethod
+    @contextmanager
+    def use(key: str):
+        """Protect an artifact from the eviction while in the block."""
+        with ArtifactCache.__lock:
+            ArtifactCache.__in_use[key] += 1
+        try:
+            yield
+        finally:
+            with ArtifactCache.__lock:
+                ArtifactCache.__in_use[key] -= 1
+                if ArtifactCache.__in_use[key] <= 0:
+                    del ArtifactCache.__in_use[key]
+
+    @staticmethod
+    def get(key: str) -> Union[str, None]:
+        """Return the path of the artifact and mark it as used, None if not cached."""
+        path = ArtifactCache.get_object_path(key)
+        with closing(ArtifactCache.connect()) as conn, conn:
+            row = conn.execute("SELECT size FROM artifacts WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            if not os.path.isfile(path) or os.path.getsize(path) != row[0]:
+                conn.execute("DELETE FROM artifacts WHERE key = ?", (key,))
+                return None
+            conn.execute("UPDATE artifacts SET last_access = ? WHERE key = ?", (time.time(), key))
+        return path
+
+    @staticmethod
+    def is_linked(key: str, path: str) -> bool:
+        """Return True if path is a symlink to the artifact of the given key."""
+        try:
+            return os.readlink(path) == ArtifactCache.get_object_path(key)
+        except OSError:
+            return False
+
+    @staticmethod
+    def __symlink(path: str, target: str):
+        """Replace target with a symlink to path."""
+        tmp_path = f"{target}.{uuid.uuid4().hex}.tmp"
+        os.symlink(path, tmp_path)
+        os.replace(tmp_path, target)
+
+    @staticmethod
+    def link(key: str, target: str) -> bool:
+        """
+        Make the artifact available at target, as a symlink to the
+        cached file, return False if it is not cached.
+        """
+        with ArtifactCache.use(key):
+            path = ArtifactCache.get(key)
+            if path is None:
+                return False
+            try:
+                ArtifactCache.__symlink(path, target)
+            except OSError as e:
+                logging.error(f"Cannot get [{key}] from the cache: {e}", )
+                return False
+        return True
+
+    @staticmethod
+    def add(key: str, source: str, url: str = "", name: str = "") -> Union[str, None]:
+        """
+        Move the source file in the cache as the artifact of the given
+        key and replace it with a symlink to the artifact, then evict
+        the least recently used artifacts if the cache is full. A source
+        already linked (e.g. by a merged request of the same file) is
+        left as is.
+        """
+        target = ArtifactCache.get_object_path(key)
+        tmp_path = f"{target}.{uuid.uuid4().hex}.tmp"
+        with ArtifactCache.use(key):
+            try:
+                with ArtifactCache.__lock:
+                    if os.path.islink(source):
+                        return target if ArtifactCache.is_linked(key, source) else None
+                    os.makedirs(os.path.dirname(target), exist_ok=True)
+                    try:
+                        os.rename(source, tmp_path)
+                    except OSError as e:
+                        if e.errno != errno.EXDEV:
+                            raise
+                        FileCopier.copy_file(source, tmp_path)
+                    os.replace(tmp_path, target)
+                    ArtifactCache.__symlink(target, source)
+                with closing(ArtifactCache.connect()) as conn, conn:
+                    conn.execute(
+                        "INSERT INTO artifacts (key, url, name, size, last_access) VALUES (?, ?, ?, ?, ?) "
+                        "ON CONFLICT (key) DO UPDATE SET url = excluded.url, name = excluded.name, "
+                        "size = excluded.size, last_access = excluded.last_access",
+                        (key, url, name, os.path.getsize(target), time.time())
+                    )
+            except (OSError, sqlite3.Error) as e:
+                logging.error(f"Cannot add [{name or key}] to the cache: {e}", )
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                return None
+
+            ArtifactCache.evict()
+        return target
+
+    @staticmethod
+    def pin(key: str, pinned: bool = True) -> bool:
+        """Pin (or unpin) an artifact, so it is never evicted. Return False if not cached."""
+        with closing(ArtifactCache.connect()) as conn, conn:
+            cursor = conn.execute("UPDATE artifacts SET pinned = ? WHERE key = ?", (int(pinned), key))
+            return cursor.rowcount > 0
+
+    @staticmethod
+    def list_artifacts() -> list:
+        """Return the artifacts, the most recently used first."""
+        with closing(ArtifactCache.connect()) as conn:
+            rows = conn.execute(
+                "SELECT key, url, name, size, last_access, pinned FROM artifacts ORDER BY last_access DESC"
+            ).fetchall()
+        return [
+            {"key": r[0], "url": r[1], "name": r[2], "size": r[3], "last_access": r[4], "pinned": bool(r[5])}
+            for r in rows
+        ]
+
+    @staticmethod
+    def get_size() -> int:
+        with closing(ArtifactCache.connect()) as conn:
+            return conn.execute("SELECT COALESCE(SUM(size), 0) FROM artifacts").fetchone()[0]
+
+    @staticmethod
+    def remove(key: str) -> int:
+        """Remove an artifact, return the number of bytes freed."""
+        with closing(ArtifactCache.connect()) as conn, conn:
+            row = conn.execute("SELECT size FROM artifacts WHERE key = ?", (key,)).fetchone()
+            conn.execute("DELETE FROM artifacts WHERE key = ?", (key,))
+
+        path = ArtifactCache.get_object_path(key)
+        try:
+            os.remove(path)
+            os.rmdir(os.path.dirname(path))
+        except OSError:
+            pass  # missing object, or not empty prefix
+        return row[0] if row else 0
+
+    @staticmethod
+    def evict(max_size: int = None) -> dict:
+        """
+        Remove the least recently used artifacts, not pinned nor in use,
+        until the cache fits in max_size (MiB, the configured size by
+        default; 0 removes all of them). Return the removed keys and the
+        freed bytes.
+        """
+        if max_size is None:
+            if not ArtifactCache.max_size:
+                return {"removed": [], "freed": 0}
+            max_size = ArtifactCache.max_size
+
+        with closing(ArtifactCache.connect()) as conn:
+            rows = conn.execute(
+                "SELECT key, size, pinned FROM artifacts ORDER BY last_access"
+            ).fetchall()
+
+        total = sum(size for _, size, _ in rows)
+        removed = []
+        freed = 0
+        for key, size, pinned in rows:
+            if total <= max_size * 1024 * 1024:
+                break
+            with ArtifactCache.__lock:
+                if pinned or ArtifactCache.__in_use[key]:
+                    continue
+            freed += ArtifactCache.remove(key)
+            total -= size
+            removed.append(key)
+
+        if removed:
+            logging.info(f"Evicted [{len(removed)}] artifacts from the cache, "
+                         f"[{freed}] bytes freed.", )
+        return {"removed": removed, "freed": freed}
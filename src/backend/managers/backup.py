@@ -16,7 +16,6 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 import os
-import yaml
 import uuid
 import tarfile
 import shutil
@@ -29,7 +28,9 @@ from bottles.backend.managers.manager import Manager
 from bottles.backend.models.result import Result
 from bottles.backend.globals import Paths
 from bottles.backend.utils.manager import ManagerUtils
+from bottles.backend.utils.copier import FileCopier
 from bottles.operation import OperationManager
+from bottles.backend.utils import yaml
 
 logging = Logger()
 
@@ -196,9 +197,9 @@ class BackupManager:
                 source_reg = os.path.join(source, reg)
                 dest_reg = os.path.join(dest, reg)
                 if os.path.exists(source_reg):
-                    shutil.copyfile(source_reg, dest_reg)
+                    FileCopier.copy_file(source_reg, dest_reg)
 
-            shutil.copyfile(source_config, dest_config)
+            FileCopier.copy_file(source_config, dest_config)
 
             with open(dest_config, "r") as config_file:
                 config = yaml.safe_load(config_file)
@@ -208,9 +209,9 @@ class BackupManager:
             with open(dest_config, "w") as config_file:
                 yaml.dump(config, config_file, indent=4)
 
-            shutil.copytree(
-                src=source_drive,
-                dst=dest_drive,
+            FileCopier.copy_tree(
+                source_drive,
+                dest_drive,
                 ignore=shutil.ignore_patterns(".*"),
                 symlinks=False
             )
@@ -32,9 +32,13 @@ except (RuntimeError, GLib.GError):
 from bottles.backend.utils.generic import is_glibc_min_available
 from bottles.backend.utils.manager import ManagerUtils
 from bottles.backend.utils.file import FileUtils
+from bottles.backend.utils.hashing import FileHasher
+from bottles.backend.utils.network import HttpClient
 from bottles.backend.globals import Paths
+from bottles.backend.managers.inventory import InventoryManager
+from bottles.backend.managers.artifacts import ArtifactCache
 from bottles.backend.models.result import Result
-from bottles.backend.downloader import Downloader
+from bottles.backend.scheduler import DownloadScheduler
 from bottles.backend.logger import Logger
 
 logging = Logger()
@@ -175,9 +179,47 @@ class ComponentManager:
 
         existing_file = rename if rename else file
         temp_dest = os.path.join(Paths.temp, file)
+        file_path = os.path.join(Paths.temp, existing_file)
+        algorithm, checksum = self.__parse_checksum(checksum)
+        artifact_url = download_url  # before following the redirects
+        artifact_key = ArtifactCache.get_key(f"{algorithm}:{checksum}" if checksum else None)
+        local_checksum = None
         just_downloaded = False
 
-        if os.path.isfile(os.path.join(Paths.temp, existing_file)):
+        if os.path.islink(file_path) and not os.path.exists(file_path):
+            # the artifact it pointed to was evicted from the cache
+            os.remove(file_path)
+
+        if artifact_key and ArtifactCache.is_linked(artifact_key, file_path):
+            # verified when added to the artifacts cache
+            local_checksum = checksum
+        elif os.path.isfile(file_path) and checksum:
+            '''
+            Downloads are renamed once complete, but a file left by an
+            older version can be truncated: download it again. The
+            checksum is recorded as soon as the file is verified, so a
+            file is hashed once, not on each call.
+            '''
+            local_checksum = FileUtils.get_recorded_checksum(file_path, algorithm)
+            if local_checksum is None:
+                local_checksum = FileUtils.get_checksum(file_path, algorithm)
+                if local_checksum == checksum:
+                    FileUtils.record_checksum(file_path, algorithm, local_checksum)
+            if local_checksum != checksum:
+                logging.warning(f"File [{existing_file}] in temp looks corrupted, downloading it again.", )
+                os.remove(file_path)
+                local_checksum = None
+
+        if not os.path.isfile(file_path) and artifact_key and ArtifactCache.link(artifact_key, file_path):
+            '''
+            The file was downloaded before, maybe for another bottle or
+            with another name: take it from the artifacts cache. It was
+            verified when added, as it is keyed by its checksum.
+            '''
+            logging.info(f"File [{existing_file}] found in the artifacts cache.", )
+            local_checksum = checksum
+
+        if os.path.isfile(file_path):
             '''
             Check if the file already exists in the /temp directory.
             If so, then skip the download process and set the update_func
@@ -192,13 +234,7 @@ class ComponentManager:
             skipped for large files (e.g. runners).
             '''
             try:
-                requests.packages.urllib3.disable_warnings()
-                headers = {"User-Agent": "curl/7.79.1"}
-                response = requests.head(
-                    download_url,
-                    allow_redirects=True,
-                    headers=headers
-                )
+                response = HttpClient.head(download_url, allow_redirects=True)
                 download_url = response.url
                 req_code = response.status_code
             except requests.exceptions.RequestException:
@@ -211,44 +247,57 @@ class ComponentManager:
                 If the status code is 200, the resource should be available
                 and the download should be started. Any exceptions return
                 False and the download is removed from the download manager.
+                The checksum is computed while downloading.
                 """
-                res = Downloader(
+                job = DownloadScheduler.submit(
                     url=download_url,
                     file=temp_dest,
-                    func=update_func
-                ).download()
+                    func=lambda count, block_size, total_size: update_func(
+                        task_id, count, block_size, total_size
+                    ),
+                    queue_func=lambda position: GLib.idle_add(
+                        self.__operation_manager.update_task_queue, task_id, position
+                    ),
+                    algorithms=(algorithm,) if checksum else ()
+                )
 
-                if not res:
+                if not job.wait():
                     GLib.idle_add(self.__operation_manager.remove_task, task_id)
                     return False
 
-                if not os.path.isfile(temp_dest):
+                if not os.path.isfile(temp_dest) and not os.path.isfile(file_path):
                     """Fail if the file is not available in the /temp directory."""
                     GLib.idle_add(self.__operation_manager.remove_task, task_id)
                     return False
 
+                local_checksum = job.digests.get(algorithm)
                 just_downloaded = True
             else:
                 logging.warning(f"Failed to download [{download_url}] with code: {req_code} != 200")
                 GLib.idle_add(self.__operation_manager.remove_task, task_id)
                 return False
 
-        file_path = os.path.join(Paths.temp, existing_file)
         if rename and just_downloaded:
             """Renaming the downloaded file if requested."""
             logging.info(f"Renaming [{file}] to [{rename}].", )
-            file_path = os.path.join(Paths.temp, rename)
-            os.rename(temp_dest, file_path)
+            try:
+                os.rename(temp_dest, file_path)
+            except FileNotFoundError:
+                # a concurrent request of the same file renamed it already
+                if not os.path.isfile(file_path):
+                    raise
 
         if checksum:
             """
             Compare the checksum of the downloaded file with the one
             provided by the caller. If they don't match, remove the
             file from the /temp directory, remove the entry from the
-            download manager and return False.
+            download manager and return False. Otherwise record it,
+            so the next installs of this file skip the verification.
             """
-            checksum = checksum.lower()
-            local_checksum = FileUtils().get_checksum(file_path)
+            if local_checksum is None:
+                # e.g. a concurrent request of the same file without checksum
+                local_checksum = FileUtils.get_checksum(file_path, algorithm)
 
             if local_checksum and local_checksum != checksum:
                 logging.error(f"Downloaded file [{file}] looks corrupted.", )
@@ -258,9 +307,28 @@ class ComponentManager:
                 GLib.idle_add(self.__operation_manager.remove_task, task_id)
                 return False
 
+            if local_checksum:
+                FileUtils.record_checksum(file_path, algorithm, local_checksum)
+
+        if just_downloaded and artifact_key:
+            ArtifactCache.add(artifact_key, file_path, url=artifact_url, name=existing_file)
+
         GLib.idle_add(self.__operation_manager.remove_task, task_id)
         return True
 
+    @staticmethod
+    def __parse_checksum(checksum: str) -> tuple:
+        """
+        Return the algorithm and the digest of a manifest checksum: an
+        MD5 or a SHA-256 digest, optionally prefixed (e.g. sha256:…).
+        """
+        checksum = (checksum or "").strip().lower()
+        if ":" in checksum:
+            algorithm, checksum = checksum.split(":", 1)
+            if algorithm in FileHasher.algorithms:
+                return algorithm, checksum
+        return "sha256" if len(checksum) == 64 else "md5", checksum
+
     @staticmethod
     def extract(name: str, component: str, archive: str) -> True:
         """Extract a component from an archive."""
@@ -357,7 +425,7 @@ class ComponentManager:
             download_url=manifest["File"][0]["url"],
             file=manifest["File"][0]["file_name"],
             rename=manifest["File"][0]["rename"],
-            checksum=manifest["File"][0]["file_checksum"],
+            checksum=manifest["File"][0].get("file_sha256") or manifest["File"][0]["file_checksum"],
             func=func
         )
 
@@ -378,6 +446,7 @@ class ComponentManager:
             archive = manifest["File"][0]["rename"]
 
         self.extract(component_name, component_type, archive)
+        InventoryManager.invalidate(component_type)
 
         '''
         Execute Post Install if the component has it defined
@@ -496,6 +565,8 @@ class ComponentManager:
         except Exception as e:
             logging.error(f"Failed to uninstall component: {component_name}, {e}")
             return Result(False, data={"message": "Failed to uninstall component."})
+        finally:
+            InventoryManager.invalidate(component_type)
 
         logging.info(f"Component uninstalled: {component_type} {component_name}")
 
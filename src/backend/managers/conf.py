@@ -1,7 +1,7 @@
 import os
 import json
-import yaml
 from configparser import ConfigParser
+from bottles.backend.utils import yaml
 
 
 class ConfigManager(object):
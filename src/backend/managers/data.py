@@ -16,11 +16,11 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 import os
-import yaml
 from pathlib import Path
 
 from bottles.backend.logger import Logger  # pyright: reportMissingImports=false
 from bottles.backend.models.samples import Samples
+from bottles.backend.utils import yaml
 
 logging = Logger()
 
@@ -19,6 +19,7 @@ import os
 import uuid
 import shutil
 import patoolib
+import threading
 from glob import glob
 from functools import lru_cache
 from typing import Union, NewType
@@ -75,6 +76,9 @@ class DependencyManager:
             catalog[dependency[0]] = dependency[1]
 
         catalog = dict(sorted(catalog.items()))
+
+        # store the manifests in background, so installs resolve them offline
+        threading.Thread(target=self.__repo.prefetch, daemon=True).start()
         return catalog
 
     def install(
@@ -127,6 +131,7 @@ class DependencyManager:
             If the manifest has dependencies, we need to install them
             before installing the current one.
             '''
+            self.__repo.prefetch(manifest.get("Dependencies"))
             for _ext_dep in manifest.get("Dependencies"):
                 if _ext_dep in config["Installed_Dependencies"]:
                     continue
@@ -151,24 +156,6 @@ class DependencyManager:
             if not res.data.get("uninstaller"):
                 uninstaller = False
 
-        if dependency[0] not in config.get("Installed_Dependencies") \
-                or reinstall:
-            '''
-            If the dependency is not already listed in the installed
-            dependencies list of the bottle, add it.
-            '''
-            dependencies = [dependency[0]]
-
-            if config.get("Installed_Dependencies"):
-                dependencies = config["Installed_Dependencies"] + \
-                               [dependency[0]]
-
-            self.__manager.update_config(
-                config=config,
-                key="Installed_Dependencies",
-                value=dependencies
-            )
-
         if manifest.get("Uninstaller"):
             '''
             If the manifest has an uninstaller, add it to the
@@ -177,12 +164,22 @@ class DependencyManager:
             '''
             uninstaller = manifest.get("Uninstaller")
 
-        self.__manager.update_config(
-            config,
-            dependency[0],
-            uninstaller,
-            "Uninstallers"
-        )
+        with self.__manager.config_transaction(config) as tx:
+            if dependency[0] not in config.get("Installed_Dependencies") \
+                    or reinstall:
+                '''
+                If the dependency is not already listed in the installed
+                dependencies list of the bottle, add it.
+                '''
+                dependencies = [dependency[0]]
+
+                if config.get("Installed_Dependencies"):
+                    dependencies = config["Installed_Dependencies"] + \
+                                   [dependency[0]]
+
+                tx.set("Installed_Dependencies", dependencies)
+
+            tx.set(dependency[0], uninstaller, "Uninstallers")
 
         # Remove entry from operation manager
         GLib.idle_add(self.__operation_manager.remove_task, task_id)
@@ -333,7 +330,7 @@ class DependencyManager:
             download_url=step.get("url"),
             file=step.get("file_name"),
             rename=step.get("rename"),
-            checksum=step.get("file_checksum")
+            checksum=step.get("file_sha256") or step.get("file_checksum")
         )
 
         return download
@@ -369,7 +366,7 @@ class DependencyManager:
             download_url=step.get("url"),
             file=step.get("file_name"),
             rename=step.get("rename"),
-            checksum=step.get("file_checksum")
+            checksum=step.get("file_sha256") or step.get("file_checksum")
         )
         file = step.get("file_name")
         if step.get("rename"):
@@ -419,7 +416,7 @@ class DependencyManager:
                 download_url=step.get("url"),
                 file=step.get("file_name"),
                 rename=step.get("rename"),
-                checksum=step.get("file_checksum")
+                checksum=step.get("file_sha256") or step.get("file_checksum")
             )
 
             if download:
@@ -498,7 +495,7 @@ class DependencyManager:
             download_url=step.get("url"),
             file=step.get("file_name"),
             rename=step.get("rename"),
-            checksum=step.get("file_checksum")
+            checksum=step.get("file_sha256") or step.get("file_checksum")
         )
 
         if download:
@@ -16,7 +16,6 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 import os
-import yaml
 import subprocess
 from glob import glob
 from datetime import datetime
@@ -120,9 +119,7 @@ class ImportManager:
         new_config["Update_Date"] = str(datetime.now())
 
         # save config
-        with open(f"{bottle_complete_path}/bottle.yml", "w") as conf_file:
-            yaml.dump(new_config, conf_file, indent=4)
-            conf_file.close()
+        self.manager.write_config(new_config, bottle_complete_path)
 
         # update bottles view
         self.manager.update_bottles(silent=True)
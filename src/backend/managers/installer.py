@@ -17,8 +17,8 @@
 
 import os
 import subprocess
+import threading
 import markdown
-import urllib.request
 from typing import Union, NewType
 from functools import lru_cache
 from datetime import datetime
@@ -37,6 +37,7 @@ from bottles.backend.managers.journal import JournalManager, JournalSeverity
 from bottles.backend.globals import Paths
 from bottles.backend.logger import Logger
 from bottles.backend.layers import LayersStore, Layer
+from bottles.backend.scheduler import DownloadScheduler
 
 from bottles.backend.utils.manager import ManagerUtils
 from bottles.backend.utils.wine import WineUtils
@@ -90,6 +91,9 @@ class InstallerManager:
             catalog[installer[0]] = installer[1]
 
         catalog = dict(sorted(catalog.items()))
+
+        # store the manifests in background, so browsing resolves them offline
+        threading.Thread(target=self.__repo.prefetch, daemon=True).start()
         return catalog
 
     def __download_icon(self, config, executable: dict, manifest):
@@ -105,7 +109,7 @@ class InstallerManager:
             if not os.path.exists(bottle_icons_path):
                 os.makedirs(bottle_icons_path)
             if not os.path.isfile(icon_path):
-                urllib.request.urlretrieve(icon_url, icon_path)
+                DownloadScheduler.download(icon_url, icon_path, priority=DownloadScheduler.BACKGROUND)
 
     def __ask_for_local_resources(self, exe_msi_steps, _config):
         files = [s.get("file_name", "") for s in exe_msi_steps]
@@ -206,7 +210,7 @@ class InstallerManager:
                         st.get("url"),
                         st.get("file_name"),
                         st.get("rename"),
-                        checksum=st.get("file_checksum")
+                        checksum=st.get("file_sha256") or st.get("file_checksum")
                     )
                 else:
                     download = True
@@ -0,0 +1,212 @@
+# inventory.py
+#
+# Copyright 2020 brombinmirko <send@mirko.pm>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import threading
+
+from bottles.backend.logger import Logger  # pyright: reportMissingImports=false
+from bottles.backend.globals import Paths
+from bottles.backend.utils import yaml
+
+logging = Logger()
+
+
+class InventoryManager:
+    """
+    Store the installed components in the inventory.yml file, so the
+    components directories are walked only when they change. Each
+    component type is keyed by the mtime of its parent directory, which
+    changes every time a component is added, removed or renamed. The
+    ComponentManager also invalidates the types it installs/uninstalls.
+    """
+
+    path = f"{Paths.base}/inventory.yml"
+    __lock = threading.Lock()
+    __inventory = None
+    __paths = {
+        "runners": Paths.runners,
+        "runtimes": Paths.runtimes,
+        "dxvk": Paths.dxvk,
+        "vkd3d": Paths.vkd3d,
+        "nvapi": Paths.nvapi,
+        "latencyflex": Paths.latencyflex
+    }
+    __winemenubuilder_paths = [
+        "lib64/wine/x86_64-windows/winemenubuilder.exe",
+        "lib/wine/x86_64-windows/winemenubuilder.exe",
+        "lib32/wine/i386-windows/winemenubuilder.exe",
+        "lib/wine/i386-windows/winemenubuilder.exe",
+    ]
+
+    @staticmethod
+    def get_type(component_type: str) -> str:
+        """Return the inventory type of a ComponentManager component type."""
+        if component_type in ["runner", "runner:proton"]:
+            return "runners"
+        if component_type == "runtime":
+            return "runtimes"
+        return component_type
+
+    @staticmethod
+    def get_winemenubuilder_paths(runner_path: str) -> list:
+        return [
+            os.path.join(runner_path, p)
+            for p in InventoryManager.__winemenubuilder_paths
+        ]
+
+    @staticmethod
+    def get(component_type: str) -> dict:
+        """
+        Return the installed components of the given type as a dict
+        (name: entry), scanning the directory only if it changed since
+        the last scan.
+        """
+        component_type = InventoryManager.get_type(component_type)
+        if component_type not in InventoryManager.__paths:
+            raise ValueError(f"Component type not supported: {component_type}")
+
+        path = InventoryManager.__paths[component_type]
+
+        with InventoryManager.__lock:
+            inventory = InventoryManager.__get_inventory()
+            try:
+                mtime = os.stat(path).st_mtime_ns
+            except FileNotFoundError:
+                return {}
+
+            cached = inventory.get(component_type)
+            if cached and cached.get("mtime") == mtime:
+                return dict(cached["entries"])
+
+            logging.info(f"Scanning {component_type} inventory…", )
+            inventory[component_type] = {
+                "mtime": mtime,
+                "entries": InventoryManager.__scan(component_type, path)
+            }
+            InventoryManager.__save_inventory()
+            return dict(inventory[component_type]["entries"])
+
+    @staticmethod
+    def get_entry(component_type: str, name: str) -> dict:
+        """Return the inventory entry of an installed component."""
+        return InventoryManager.get(component_type).get(name, {})
+
+    @staticmethod
+    def update(component_type: str, name: str, **values):
+        """Update the inventory entry of an installed component."""
+        component_type = InventoryManager.get_type(component_type)
+
+        with InventoryManager.__lock:
+            inventory = InventoryManager.__get_inventory()
+            entries = inventory.get(component_type, {}).get("entries", {})
+            if name not in entries:
+                return
+            entries[name].update(values)
+            InventoryManager.__save_inventory()
+
+    @staticmethod
+    def invalidate(component_type: str = None):
+        """
+        Invalidate the given component type or the whole inventory if
+        no type is given. The next get call will walk the directory again.
+        """
+        with InventoryManager.__lock:
+            inventory = InventoryManager.__get_inventory()
+            if component_type is None:
+                inventory.clear()
+            else:
+                inventory.pop(InventoryManager.get_type(component_type), None)
+            InventoryManager.__save_inventory()
+
+    @staticmethod
+    def __scan(component_type: str, path: str) -> dict:
+        entries = {}
+
+        with os.scandir(path) as it:
+            for entry in it:
+                if not entry.is_dir():
+                    continue
+
+                if component_type == "runners":
+                    entries[entry.name] = InventoryManager.__scan_runner(entry.path)
+                elif component_type == "runtimes":
+                    entries[entry.name] = InventoryManager.__scan_runtime(entry.path)
+                else:
+                    entries[entry.name] = {}
+
+        return entries
+
+    @staticmethod
+    def __scan_runner(path: str) -> dict:
+        proton = None
+        if os.path.isdir(os.path.join(path, "dist")):
+            proton = "dist"
+        elif os.path.isdir(os.path.join(path, "files")):
+            proton = "files"
+
+        return {
+            "layout": [
+                lib for lib in ["lib", "lib32", "lib64"]
+                if os.path.isdir(os.path.join(path, lib))
+            ],
+            "proton": proton,
+            "winemenubuilder_locked": not any(
+                os.path.isfile(p)
+                for p in InventoryManager.get_winemenubuilder_paths(path)
+            )
+        }
+
+    @staticmethod
+    def __scan_runtime(path: str) -> dict:
+        version = None
+        manifest = os.path.join(path, "manifest.yml")
+
+        if os.path.exists(manifest):
+            with open(manifest, "r") as f:
+                try:
+                    version = (yaml.safe_load(f) or {}).get("version")
+                except yaml.YAMLError:
+                    logging.error(f"Cannot parse runtime manifest: {manifest}", )
+
+        return {"version": version}
+
+    @staticmethod
+    def __get_inventory() -> dict:
+        if InventoryManager.__inventory is not None:
+            return InventoryManager.__inventory
+
+        inventory = {}
+        try:
+            with open(InventoryManager.path, "r") as f:
+                inventory = yaml.safe_load(f) or {}
+        except FileNotFoundError:
+            pass
+        except yaml.YAMLError:
+            logging.warning("Inventory file is corrupted, it will be regenerated.", )
+
+        InventoryManager.__inventory = inventory
+        return inventory
+
+    @staticmethod
+    def __save_inventory():
+        tmp_path = f"{InventoryManager.path}.tmp"
+        try:
+            with open(tmp_path, "w") as f:
+                yaml.dump(InventoryManager.__inventory, f)
+            os.replace(tmp_path, InventoryManager.path)
+        except OSError as e:
+            logging.error(f"Cannot write the inventory file: {e}", )
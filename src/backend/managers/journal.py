@@ -16,12 +16,14 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 import os
-import yaml
 import uuid
 import shutil
+import threading
 from pathlib import Path
 from datetime import datetime, timedelta
 
+from bottles.backend.utils import yaml
+
 
 class JournalSeverity:
     """Represents the severity of a journal entry."""
@@ -42,6 +44,7 @@ class JournalManager:
     _xdg_data_home = os.environ.get("XDG_DATA_HOME", f"{Path.home()}/.local/share")
     _base = f"{_xdg_data_home}/bottles"
     path = f"{_base}/journal.yml"
+    __lock = threading.Lock()
 
     @staticmethod
     def __get_journal() -> dict:
@@ -156,18 +159,23 @@ class JournalManager:
 
     @staticmethod
     def write(severity: JournalSeverity, message: str):
-        """Write an event to the journal."""
-        journal = JournalManager.__get_journal()
+        """
+        Write an event to the journal. Events can be written from
+        concurrent threads (e.g. startup checks), so the journal file
+        is updated under a lock.
+        """
         event_id = str(uuid.uuid4())
         now = datetime.now()
 
         if severity not in JournalSeverity.__dict__.values():
             severity = JournalSeverity.INFO
 
-        journal[event_id] = {
-            "severity": severity,
-            "message": message,
-            "timestamp": now.strftime("%Y-%m-%d %H:%M:%S")
-        }
-        JournalManager.__save_journal(journal)
-        JournalManager.__clean_old()
+        with JournalManager.__lock:
+            journal = JournalManager.__get_journal()
+            journal[event_id] = {
+                "severity": severity,
+                "message": message,
+                "timestamp": now.strftime("%Y-%m-%d %H:%M:%S")
+            }
+            JournalManager.__save_journal(journal)
+            JournalManager.__clean_old()
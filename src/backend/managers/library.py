@@ -17,11 +17,11 @@
 
 import os
 import uuid
-import yaml
 from pathlib import Path
 
 from bottles.backend.logger import Logger  # pyright: reportMissingImports=false
 from bottles.backend.globals import Paths
+from bottles.backend.utils import yaml
 
 logging = Logger()
 
@@ -20,34 +20,40 @@ import hashlib
 import subprocess
 import random
 import time
-import yaml
 import shlex
 import shutil
-import struct
-import locale
 import fnmatch
 from glob import glob
 from datetime import datetime
 from gettext import gettext as _
 from typing import Union, NewType, Any, List
+from contextlib import contextmanager
 from gi.repository import GLib
 
 from bottles.backend.logger import Logger  # pyright: reportMissingImports=false
 from bottles.backend.runner import Runner
+from bottles.backend.startup import StartupScheduler
 from bottles.backend.models.result import Result
 from bottles.backend.models.samples import Samples
 from bottles.backend.globals import Paths
 from bottles.backend.managers.journal import JournalManager, JournalSeverity
+from bottles.backend.managers.inventory import InventoryManager
+from bottles.backend.managers.registry import BottleRegistry
+from bottles.backend.managers.transaction import ConfigTransaction
+from bottles.backend.managers.watcher import WatcherManager
+from bottles.backend.managers.programs import ProgramsIndex
 from bottles.backend.managers.template import TemplateManager
 from bottles.backend.managers.versioning import VersioningManager
 from bottles.backend.managers.repository import RepositoryManager
 from bottles.backend.managers.component import ComponentManager
+from bottles.backend.managers.artifacts import ArtifactCache
 from bottles.backend.managers.installer import InstallerManager
 from bottles.backend.managers.dependency import DependencyManager
 from bottles.backend.managers.steam import SteamManager
 from bottles.backend.utils.file import FileUtils
 from bottles.backend.utils.manager import ManagerUtils
 from bottles.backend.utils.generic import sort_by_version
+from bottles.backend.utils.icons import IconsIndex
 from bottles.backend.managers.importer import ImportManager
 from bottles.backend.layers import Layer, LayersStore
 from bottles.backend.dlls.dxvk import DXVKComponent
@@ -59,6 +65,7 @@ from bottles.backend.wine.wineboot import WineBoot
 from bottles.backend.wine.wineserver import WineServer
 from bottles.backend.wine.reg import Reg
 from bottles.backend.wine.regkeys import RegKeys
+from bottles.backend.utils import yaml
 
 logging = Logger()
 
@@ -96,6 +103,9 @@ class Manager:
     supported_latencyflex = {}
     supported_dependencies = {}
     supported_installers = {}
+    startup_report = None
+    watcher = None
+    __icons = IconsIndex(Paths.icons_user)
 
     def __init__(self, window, is_cli=False, **kwargs):
         super().__init__(**kwargs)
@@ -105,49 +115,94 @@ class Manager:
         self.settings = window.settings
         self.utils_conn = window.utils_conn
         self.is_cli = is_cli
-        self.repository_manager = RepositoryManager()
+        ArtifactCache.max_size = self.settings.get_int("artifacts-cache-size")
+        self.repository_manager = RepositoryManager(self.utils_conn)
         self.versioning_manager = VersioningManager(window, self)
         self.component_manager = ComponentManager(self)
         self.installer_manager = InstallerManager(self)
         self.dependency_manager = DependencyManager(self)
         self.import_manager = ImportManager(self)
+        self.bottle_registry = BottleRegistry(self.__migrate_config)
 
         if not is_cli:
             self.checks(install_latest=False, first_run=True)
+            self.watcher = WatcherManager(self)
+            GLib.idle_add(self.watcher.start)
         else:
             logging.set_silent()
 
     def checks(self, install_latest=False, first_run=False):
+        """
+        Perform the startup checks. Local scans and catalog fetches are
+        independent, so they run concurrently on the startup scheduler;
+        the components catalog is organized only once the scans are
+        completed (to mark the installed ones) and the latest components
+        are installed only once the catalog is available.
+        """
         logging.info("Performing Bottles checks...", )
-        start = time.time()
-        self.check_app_dirs()
-        self.check_dxvk(install_latest)
-        self.check_vkd3d(install_latest)
-        self.check_nvapi(install_latest)
-        self.check_latencyflex(install_latest)
-        self.check_runtimes(install_latest)
-        self.check_winebridge(install_latest)
-        self.check_runners(install_latest)
+        scans = {
+            "check_dxvk": self.check_dxvk,
+            "check_vkd3d": self.check_vkd3d,
+            "check_nvapi": self.check_nvapi,
+            "check_latencyflex": self.check_latencyflex,
+            "check_runtimes": self.check_runtimes,
+            "check_winebridge": self.check_winebridge,
+            "check_runners": self.check_runners
+        }
+        scheduler = StartupScheduler()
+        scheduler.add("check_app_dirs", self.check_app_dirs)
+
+        for name, func in scans.items():
+            scheduler.add(name, lambda _func=func: _func(install_latest=False), ["check_app_dirs"])
+
+        scheduler.add("check_bottles", self.check_bottles, ["check_app_dirs"])
+        scheduler.add("organize_dependencies", self.organize_dependencies, ["check_app_dirs"])
+        scheduler.add("organize_installers", self.organize_installers, ["check_app_dirs"])
+        last = list(scans)
+
+        if first_run or install_latest:
+            scheduler.add("organize_components", self.organize_components, last)
+            last = ["organize_components"]
+
+        if install_latest:
+            def install_latest_components():
+                # installs are sequential as each one re-checks the manager lists
+                for _func in scans.values():
+                    _func(install_latest=True)
+
+            scheduler.add("install_latest", install_latest_components, last)
+            last = ["install_latest"]
+
         if first_run:
-            self.organize_components()
-            self.__clear_temp()
-        self.check_bottles()
-        self.organize_dependencies()
-        self.organize_installers()
+            scheduler.add("clear_temp", self.__clear_temp, last)
+
+        self.startup_report = scheduler.run()
 
         JournalManager.write(
             severity=JournalSeverity.INFO,
-            message="Startup took %s seconds" % (time.time() - start)
+            message="Startup took %s seconds\n%s" % (
+                self.startup_report.total,
+                self.startup_report.get_results(plain=True)
+            )
         )
 
+        if self.startup_report.errors:
+            raise self.startup_report.errors[0]
+
     def __clear_temp(self, force: bool = False):
         """Clears the temp directory if user setting allows it. Use the force
-        parameter to force clearing the directory.
+        parameter to force clearing the directory. Partial downloads are
+        kept, so they can be resumed, unless forced.
         """
         if self.settings.get_boolean("temp") or force:
             try:
-                shutil.rmtree(Paths.temp)
-                os.makedirs(Paths.temp, exist_ok=True)
+                for entry in os.scandir(Paths.temp):
+                    if not force and entry.name.endswith((".part", ".part.json")):
+                        continue
+                    if entry.is_dir(follow_symlinks=False):
+                        shutil.rmtree(entry.path)
+                    else:
+                        os.remove(entry.path)
                 logging.info("Temp path cleaned successfully!", )
             except FileNotFoundError:
                 self.check_app_dirs()
@@ -289,22 +344,20 @@ class Manager:
         the latest version if install_latest is True. It also masks the
         winemenubuilder tool.
         """
-        runners = glob(f"{Paths.runners}/*/")
+        runners = InventoryManager.get("runners")
         self.runners_available = []
 
         # lock winemenubuilder.exe
-        for runner in runners:
-            winemenubuilder_paths = [
-                f"{runner}lib64/wine/x86_64-windows/winemenubuilder.exe",
-                f"{runner}lib/wine/x86_64-windows/winemenubuilder.exe",
-                f"{runner}lib32/wine/i386-windows/winemenubuilder.exe",
-                f"{runner}lib/wine/i386-windows/winemenubuilder.exe",
-            ]
+        for runner, data in runners.items():
+            if data.get("winemenubuilder_locked"):
+                continue
+            winemenubuilder_paths = InventoryManager.get_winemenubuilder_paths(
+                ManagerUtils.get_runner_path(runner)
+            )
             for winemenubuilder in winemenubuilder_paths:
-                if winemenubuilder.startswith("Proton"):
-                    continue
                 if os.path.isfile(winemenubuilder):
                     os.rename(winemenubuilder, f"{winemenubuilder}.lock")
+            InventoryManager.update("runners", runner, winemenubuilder_locked=True)
 
         # check system wine
         if shutil.which("wine") is not None:
@@ -323,7 +376,7 @@ class Manager:
 
         # check bottles runners
         for runner in runners:
-            self.runners_available.append(runner.split("/")[-2])
+            self.runners_available.append(runner)
 
         if len(self.runners_available) > 0:
             logging.info("Runners found:\n - {0}".format(
@@ -363,7 +416,7 @@ class Manager:
 
     def check_runtimes(self, install_latest: bool = True) -> bool:
         self.runtimes_available = []
-        runtimes = glob("%s/*/" % Paths.runtimes)
+        runtimes = InventoryManager.get("runtimes")
         if len(runtimes) == 0:
             if install_latest and self.utils_conn.check_connection():
                 logging.warning("No runtime found.", )
@@ -377,15 +430,11 @@ class Manager:
                     return False
             return False
 
-        runtime = runtimes[0]  # runtimes cannot be more than one
-        manifest = f"{runtime}/manifest.yml"
-        if os.path.exists(manifest):
-            with open(manifest, "r") as f:
-                data = yaml.safe_load(f)
-                version = data.get("version")
-                if version:
-                    version = f"runtime-{version}"
-                    self.runtimes_available = [version]
+        runtime = next(iter(runtimes.values()))  # runtimes cannot be more than one
+        version = runtime.get("version")
+        if version:
+            version = f"runtime-{version}"
+            self.runtimes_available = [version]
 
     def check_winebridge(self, install_latest: bool = True, update: bool = False) -> bool:
         self.winebridge_available = []
@@ -441,28 +490,23 @@ class Manager:
         components = {
             "dxvk": {
                 "available": self.dxvk_available,
-                "supported": self.supported_dxvk,
-                "path": Paths.dxvk
+                "supported": self.supported_dxvk
             },
             "vkd3d": {
                 "available": self.vkd3d_available,
-                "supported": self.supported_vkd3d,
-                "path": Paths.vkd3d
+                "supported": self.supported_vkd3d
             },
             "nvapi": {
                 "available": self.nvapi_available,
-                "supported": self.supported_nvapi,
-                "path": Paths.nvapi
+                "supported": self.supported_nvapi
             },
             "latencyflex": {
                 "available": self.latencyflex_available,
-                "supported": self.supported_latencyflex,
-                "path": Paths.latencyflex
+                "supported": self.supported_latencyflex
             },
             "runtime": {
                 "available": self.runtimes_available,
-                "supported": self.supported_runtimes,
-                "path": Paths.runtimes
+                "supported": self.supported_runtimes
             }
         }
 
@@ -471,8 +515,7 @@ class Manager:
             raise ValueError("Component type not supported.")
 
         component = components[component_type]
-        component_list = glob("%s/*/" % component["path"])
-        component["available"] = [c.split("/")[-2] for c in component_list]
+        component["available"] = list(InventoryManager.get(component_type))
 
         if len(component["available"]) > 0:
             logging.info("{0}s found:\n - {1}".format(
@@ -508,13 +551,9 @@ class Manager:
         'application-x-executable' if not found.
         """
         logging.debug(f"Searching [{program_name}] icon..", )
-        pattern = f"*{program_name}*"
-
-        for root, dirs, files in os.walk(Paths.icons_user):
-            for name in files:
-                if fnmatch.fnmatch(name.lower(), pattern.lower()):
-                    name = name.split("/")[-1][:-4]
-                    return name
+        icon = Manager.__icons.find(program_name)
+        if icon is not None:
+            return icon
 
         if "FLATPAK_ID" in os.environ:
             '''
@@ -527,70 +566,6 @@ class Manager:
 
         return "com.usebottles.bottles-program"
 
-    @staticmethod
-    def __get_exe_parent_dir(config, executable_path):
-        """Get parent directory of the executable."""
-        if "\\" in executable_path:
-            p = "\\".join(executable_path.split("\\")[:-1])
-            p = p.replace("C:\\", "\\drive_c\\").replace("\\", "/")
-            return ManagerUtils.get_bottle_path(config) + p
-
-        p = "\\".join(executable_path.split("/")[:-1])
-        p = f"/drive_c/{p}"
-        return p.replace("\\", "/")
-
-    @staticmethod
-    def __get_lnk_data(path):
-        """
-        Gets data from a .lnk file, and returns them in a dictionary.
-        Thanks to @Winand and @Jared for the code.
-        <https://gist.github.com/Winand/997ed38269e899eb561991a0c663fa49>
-        """
-        with open(path, 'rb') as stream:
-            content = stream.read()
-            '''
-            Skip first 20 bytes (HeaderSize and LinkCLSID)
-            read the LinkFlags structure (4 bytes)
-            '''
-            lflags = struct.unpack('I', content[0x14:0x18])[0]
-            position = 0x18
-
-            if (lflags & 0x01) == 1:
-                '''
-                If the HasLinkTargetIDList bit is set then skip the stored IDList 
-                structure and header
-                '''
-                position = struct.unpack('H', content[0x4C:0x4E])[0] + 0x4E
-
-            last_pos = position
-            position += 0x04
-
-            # get how long the file information is (LinkInfoSize)
-            length = struct.unpack('I', content[last_pos:position])[0]
-
-            '''
-            Skip 12 bytes (LinkInfoHeaderSize, LinkInfoFlags and 
-            VolumeIDOffset)
-            '''
-            position += 0x0C
-
-            # go to the LocalBasePath position
-            lbpos = struct.unpack('I', content[position:position + 0x04])[0]
-            position = last_pos + lbpos
-
-            # read the string at the given position of the determined length
-            size = (length + last_pos) - position - 0x02
-            content = content[position:position + size].split(b'\x00', 1)
-
-            decode = locale.getdefaultlocale()[1]
-            if len(content) > 1 or decode is None:
-                decode = 'utf-16'
-
-            try:
-                return content[-1].decode(decode)
-            except UnicodeDecodeError:
-                return None
-
     @staticmethod
     def launch_layer_program(config, layer):
         """Mount a layer and launch the program on it."""
@@ -624,28 +599,17 @@ class Manager:
         program_layer.sweep()
         program_layer.save()
 
+    def get_programs_index(self, config: dict) -> ProgramsIndex:
+        """Return the shortcuts index of the bottle, see ProgramsIndex."""
+        return ProgramsIndex(config, self.__find_program_icon)
+
     def get_programs(self, config: dict) -> list:
         """
         Get the list of programs (both from the drive and the user defined
         in the bottle configuration file).
         """
         bottle = ManagerUtils.get_bottle_path(config)
-        results = glob(
-            f"{bottle}/drive_c/users/*/Desktop/*.lnk",
-            recursive=True
-        )
-        results += glob(
-            f"{bottle}/drive_c/users/*/Start Menu/Programs/**/*.lnk",
-            recursive=True
-        )
-        results += glob(
-            f"{bottle}/drive_c/ProgramData/Microsoft/Windows/Start Menu/Programs/**/*.lnk",
-            recursive=True
-        )
-        results += glob(
-            f"{bottle}/drive_c/users/*/AppData/Roaming/Microsoft/Windows/Start Menu/Programs/**/*.lnk",
-            recursive=True
-        )
+        results = self.get_programs_index(config).refresh()
         installed_programs = []
         ignored_patterns = [
             "*installer*",
@@ -678,25 +642,19 @@ class Manager:
                 "path": _program["path"],
                 "folder": program_folder,
                 "icon": icon,
+                "working_dir": _program.get("working_dir"),
                 "script": _program.get("script"),
                 "removed": _program.get("removed")
             })
 
         for program in results:
             '''
-            for each .lnk file, try to get the executable path and
-            append it to the installed_programs list with its icon, 
-            skip if the path contains the "Uninstall" word.
+            for each indexed .lnk file, append the executable to the
+            installed_programs list with its icon, skip if the path
+            contains the "Uninstall" word.
             '''
-            executable_path = self.__get_lnk_data(program)
-            if executable_path is None:
-                continue
-            executable_name = executable_path.split("\\")[-1]
-            program_folder = self.__get_exe_parent_dir(
-                config,
-                executable_path
-            )
-            icon = self.__find_program_icon(executable_name)
+            executable_path = program["path"]
+            executable_name = program["executable"]
             stop = False
 
             for pattern in ignored_patterns:
@@ -715,11 +673,12 @@ class Manager:
                 if executable_name not in found:
                     installed_programs.append({
                         "executable": executable_name,
-                        "arguments": "",
-                        "name": executable_name.split(".")[0],
+                        "arguments": program["arguments"],
+                        "name": program["name"],
                         "path": executable_path,
-                        "folder": program_folder,
-                        "icon": icon
+                        "folder": program["folder"],
+                        "working_dir": program["cwd"],
+                        "icon": program["icon"]
                     })
                     found.append(executable_name)
 
@@ -731,101 +690,11 @@ class Manager:
         Will also mark the broken ones if the configuration file is missing
         TODO: move to bottle.py (Bottle manager)
         """
-        bottles = glob(f"{Paths.bottles}/*/")
-
-        for bottle in bottles:
-            '''
-            For each bottle add the path name to the `local_bottles` variable
-            and append the config.
-            '''
-            bottle_name_path = bottle.split("/")[-2]
-
-            _placeholder = os.path.join(bottle, "placeholder.yml")
-            _config = os.path.join(bottle, "bottle.yml")
-
-            if os.path.exists(_placeholder):
-                with open(_placeholder, "r") as f:
-                    try:
-                        placeholder_yaml = yaml.safe_load(f)
-                        if placeholder_yaml.get("Path"):
-                            _config = os.path.join(placeholder_yaml.get("Path"), "bottle.yml")
-                        else:
-                            raise Exception("Missing Path in placeholder.yml")
-                    except (yaml.YAMLError, Exception):
-                        if not silent:
-                            logging.error("Placeholder found but could not be parsed")
-                        continue
-
-            try:
-                with open(_config, "r") as f:
-                    conf_file_yaml = yaml.safe_load(f)
-            except FileNotFoundError:
-                if not silent:
-                    logging.warning(f"A placeholder found but can't reach the config file: {_config}")
-                continue
-
-            if conf_file_yaml is None:
-                raise AttributeError
-
-            # Migrate old environment_variables to new format
-            if "Parameters" in conf_file_yaml:
-                _parameters = conf_file_yaml["Parameters"]
-                if "environment_variables" in _parameters:
-                    entries = shlex.split(_parameters["environment_variables"])
-                    _env = {}
-
-                    if len(entries) > 0:
-                        for e in entries:
-                            kv = e.split("=")
-
-                            if len(kv) > 2:
-                                kv[1] = "=".join(kv[1:])
-                                kv = kv[:2]
-
-                            if len(kv) == 2:
-                                _env[kv[0]] = kv[1]
-
-                        conf_file_yaml["Environment_Variables"] = _env
-                        if len(_env) > 0:
-                            del _parameters["environment_variables"]
-
-            # Migrate old Software env to the new Application
-            if conf_file_yaml["Environment"] == "Software":
-                conf_file_yaml["Environment"] = "Application"
-
-            # Clear Latest_Executables on new session start
-            if conf_file_yaml.get("Latest_Executables"):
-                conf_file_yaml["Latest_Executables"] = []
-
-            miss_keys = Samples.config.keys() - conf_file_yaml.keys()
-            for key in miss_keys:
-                logging.warning(f"Key: [{key}] not in bottle: "
-                                f"[{bottle.split('/')[-2]}] config, updating.", )
-                self.update_config(
-                    config=conf_file_yaml,
-                    key=key,
-                    value=Samples.config[key]
-                )
-
-            miss_params_keys = Samples.config["Parameters"].keys(
-            ) - conf_file_yaml["Parameters"].keys()
-
-            for key in miss_params_keys:
-                '''
-                For each missing key in the bottle configuration, set
-                it to the default value.
-                '''
-                logging.warning(f"Key: [{key}] not in bottle: "
-                                f"[{bottle.split('/')[-2]}] config Parameters, "
-                                "updating.", )
-                self.update_config(
-                    config=conf_file_yaml,
-                    key=key,
-                    value=Samples.config["Parameters"][key],
-                    scope="Parameters"
-                )
-            self.local_bottles[bottle_name_path] = conf_file_yaml
+        bottles, removed = self.bottle_registry.refresh(silent)
 
+        for name in removed:
+            self.local_bottles.pop(name, None)
+        self.local_bottles.update(bottles)
 
         if len(self.local_bottles) > 0 and not silent:
             logging.info("Bottles found:\n - {0}".format(
@@ -838,6 +707,82 @@ class Manager:
             SteamManager.update_bottles()
             self.local_bottles.update(SteamManager.list_prefixes())
 
+    def update_bottle(self, name: str) -> Union[dict, None]:
+        """
+        Update a single bottle in the local_bottles list, it is removed
+        if it does not exist anymore. Returns the bottle config.
+        """
+        config = self.bottle_registry.update(name, silent=True)
+        if config is None:
+            self.local_bottles.pop(name, None)
+        else:
+            self.local_bottles[name] = config
+        return config
+
+    def __migrate_config(self, conf_file_yaml: dict, bottle_name: str) -> dict:
+        """
+        Migrate a freshly parsed bottle config, called by the bottle
+        registry only when the bottle.yml changed since the last scan.
+        """
+        # Migrate old environment_variables to new format
+        if "Parameters" in conf_file_yaml:
+            _parameters = conf_file_yaml["Parameters"]
+            if "environment_variables" in _parameters:
+                entries = shlex.split(_parameters["environment_variables"])
+                _env = {}
+
+                if len(entries) > 0:
+                    for e in entries:
+                        kv = e.split("=")
+
+                        if len(kv) > 2:
+                            kv[1] = "=".join(kv[1:])
+                            kv = kv[:2]
+
+                        if len(kv) == 2:
+                            _env[kv[0]] = kv[1]
+
+                    conf_file_yaml["Environment_Variables"] = _env
+                    if len(_env) > 0:
+                        del _parameters["environment_variables"]
+
+        # Migrate old Software env to the new Application
+        if conf_file_yaml["Environment"] == "Software":
+            conf_file_yaml["Environment"] = "Application"
+
+        # Clear Latest_Executables on new session start
+        if conf_file_yaml.get("Latest_Executables"):
+            conf_file_yaml["Latest_Executables"] = []
+
+        miss_keys = Samples.config.keys() - conf_file_yaml.keys()
+        for key in miss_keys:
+            logging.warning(f"Key: [{key}] not in bottle: "
+                            f"[{bottle_name}] config, updating.", )
+            self.update_config(
+                config=conf_file_yaml,
+                key=key,
+                value=Samples.config[key]
+            )
+
+        miss_params_keys = Samples.config["Parameters"].keys(
+        ) - conf_file_yaml["Parameters"].keys()
+
+        for key in miss_params_keys:
+            '''
+            For each missing key in the bottle configuration, set
+            it to the default value.
+            '''
+            logging.warning(f"Key: [{key}] not in bottle: "
+                            f"[{bottle_name}] config Parameters, "
+                            "updating.", )
+            self.update_config(
+                config=conf_file_yaml,
+                key=key,
+                value=Samples.config["Parameters"][key],
+                scope="Parameters"
+            )
+        return conf_file_yaml
+
     # Update parameters in bottle config
     @staticmethod
     def update_config(
@@ -850,44 +795,83 @@ class Manager:
         """
         Update parameters in bottle config. Use the scope argument to
         update the parameters in the specified scope (e.g. Parameters).
+        Use config_transaction to update many parameters at once.
         TODO: move to bottle.py (Bottle manager)
         """
-        if config.get("IsLayer"):
-            return {}
+        with Manager.config_transaction(config) as tx:
+            if remove:
+                tx.remove(key, scope)
+            else:
+                tx.set(key, value, scope)
+        return tx.config
 
-        logging.info(f"Setting Key: [{key}] to [{value}] for "
-                     f"bottle: [{config['Name']}]…", )
+    @staticmethod
+    @contextmanager
+    def config_transaction(config: dict):
+        """
+        Batch many updates of a bottle config in a single write:
 
-        wineboot = WineBoot(config)
-        bottle_path = ManagerUtils.get_bottle_path(config)
+            with manager.config_transaction(config) as tx:
+                tx.set("State", state_id)
+                tx.set("dxvk", True, scope="Parameters")
 
-        if scope != "":
-            config[scope][key] = value
-            if remove:
-                del config[scope][key]
-        else:
-            config[key] = value
+        The changes are applied and written when the block exits, if
+        it raises nothing is changed. The updated config is tx.config.
+        """
+        tx = ConfigTransaction(config)
+        yield tx
+
+        if config.get("IsLayer"):
+            tx.config = {}
+            return
+
+        if not tx.changes:
+            return
+
+        for key, value, scope, remove in tx.changes:
             if remove:
-                del config[key]
+                logging.info(f"Removing Key: [{key}] for bottle: [{config['Name']}]…", )
+            else:
+                logging.info(f"Setting Key: [{key}] to [{value}] for "
+                             f"bottle: [{config['Name']}]…", )
+        tx.apply()
 
-        if key == "sync":
+        if "sync" in [c[0] for c in tx.changes]:
             '''
             Workaround <https://github.com/bottlesdevs/Bottles/issues/916>
             Sync type change requires wineserver restart or wine will fail
             to execute any command.
             '''
-            wineboot.kill()
-
-        with open(f"{bottle_path}/bottle.yml", "w") as conf_file:
-            yaml.dump(config, conf_file, indent=4)
-            conf_file.close()
+            WineBoot(config).kill()
 
+        Manager.write_config(config)
         config["Update_Date"] = str(datetime.now())
 
         if config.get("Environment") == "Steam":
-            config = SteamManager.update_bottle(config)
+            tx.config = SteamManager.update_bottle(config)
 
-        return config
+    @staticmethod
+    def write_config(config: dict, path: str = None):
+        """
+        Atomically write the bottle config: the file is written aside and
+        then renamed over the bottle.yml, so it is never left truncated.
+        Use path to write in another bottle path than the config one.
+        """
+        if path is None:
+            path = ManagerUtils.get_bottle_path(config)
+        conf_path = f"{path}/bottle.yml"
+        tmp_path = f"{conf_path}.tmp"
+
+        try:
+            with open(tmp_path, "w") as conf_file:
+                yaml.dump(config, conf_file, indent=4)
+                conf_file.flush()
+                os.fsync(conf_file.fileno())
+            os.replace(tmp_path, conf_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
 
     def create_bottle_from_config(self, config: dict) -> bool:
         """Create a bottle from a config dict."""
@@ -961,9 +945,7 @@ class Manager:
 
         # write the bottle config file
         try:
-            with open(f"{bottle_path}/bottle.yml", "w") as conf_file:
-                yaml.dump(config, conf_file, indent=4)
-                conf_file.close()
+            self.write_config(config, bottle_path)
         except (OSError, IOError, yaml.YAMLError) as e:
             logging.error(f"Error writing config file {e}")
             return False
@@ -1295,9 +1277,7 @@ class Manager:
             config["Layers"] = {}
 
         # save bottle config
-        with open(f"{bottle_complete_path}/bottle.yml", "w") as conf_file:
-            yaml.dump(config, conf_file, indent=4)
-            conf_file.close()
+        self.write_config(config, bottle_complete_path)
 
         if versioning:
             # create first state if versioning enabled
@@ -1423,9 +1403,7 @@ class Manager:
         new_config["Update_Date"] = str(datetime.now())
 
         try:
-            with open(f"{bottle_path}/bottle.yml", "w") as conf_file:
-                yaml.dump(new_config, conf_file, indent=4)
-                conf_file.close()
+            self.write_config(new_config, bottle_path)
         except (OSError, IOError, yaml.YAMLError) as e:
             logging.error(f"Failed to repair bottle: {e}")
             return False
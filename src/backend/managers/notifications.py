@@ -15,14 +15,15 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-import yaml
-import urllib.request
+import requests
 from functools import lru_cache
 from datetime import datetime, timedelta
 
 from bottles.params import VERSION  # pyright: reportMissingImports=false
 from bottles.backend.globals import API
 from bottles.backend.managers.data import DataManager
+from bottles.backend.utils.network import HttpClient
+from bottles.backend.utils import yaml
 
 
 class NotificationsManager:
@@ -44,10 +45,9 @@ class NotificationsManager:
         notifications = [notifications] if isinstance(notifications, int) else notifications
 
         try:
-            with urllib.request.urlopen(API.notifications) as url:
-                res = url.read().decode('utf-8')
-                _messages = yaml.safe_load(res)
-        except (urllib.error.HTTPError, urllib.error.URLError):
+            res = HttpClient.fetch(API.notifications).decode('utf-8')
+            _messages = yaml.safe_load(res)
+        except requests.exceptions.RequestException:
             _messages = []
 
         for message in _messages.items():
@@ -0,0 +1,113 @@
+# objects.py
+#
+# Copyright 2020 brombinmirko <send@mirko.pm>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import uuid
+from collections import Counter
+
+from bottles.backend.utils.copier import FileCopier  # pyright: reportMissingImports=false
+from bottles.backend.utils.hashing import FileHasher
+
+
+class ObjectStore:
+    """
+    Content-addressed store of the files of the bottle states, under
+    states/objects. Each object is a file named by its checksum, split
+    in a two characters directory and the rest (e.g. ab/cdef…), so a
+    content shared by many states, or many paths, is stored once.
+    The states only keep a manifest of path: checksum (StatesIndex).
+    """
+
+    algorithm = "md5"  # the one of the StatCache checksums
+
+    def __init__(self, bottle_path: str):
+        self.bottle_path = bottle_path
+        self.path = os.path.join(bottle_path, "states", "objects")
+        self.strategies = Counter()  # the FileCopier strategies used by add
+
+    def get_path(self, checksum: str) -> str:
+        return os.path.join(self.path, checksum[:2], checksum[2:])
+
+    def has(self, checksum: str) -> bool:
+        return os.path.isfile(self.get_path(checksum))
+
+    def add(self, source: str, checksum: str) -> tuple:
+        """
+        Store the source file, expected to have the given checksum, and
+        return a (checksum, size) tuple of the stored content and the
+        bytes written (0 if the object was already stored).
+        The object is copied aside, hashed and renamed, so an interrupted
+        copy never leaves a partial object. A source changed since it
+        was hashed (e.g. in a running bottle) is stored under the
+        checksum of the copied content, never under the expected one.
+        """
+        if self.has(checksum):
+            return checksum, 0
+
+        os.makedirs(self.path, exist_ok=True)
+        tmp_path = os.path.join(self.path, f".{uuid.uuid4().hex}.tmp")
+        try:
+            self.strategies[FileCopier.copy_file(source, tmp_path)] += 1
+            copied = FileHasher(self.algorithm).hash_file(tmp_path)
+            if copied is None:
+                raise OSError(f"Cannot hash the copy of {source}")
+            target = self.get_path(copied)
+            if os.path.isfile(target):
+                os.remove(tmp_path)
+                return copied, 0
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            os.replace(tmp_path, target)
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return copied, os.path.getsize(target)
+
+    def get_objects(self) -> dict:
+        """Return all the stored objects as checksum: size."""
+        objects = {}
+        if not os.path.isdir(self.path):
+            return objects
+        for prefix in os.scandir(self.path):
+            if not prefix.is_dir(follow_symlinks=False):
+                continue
+            for entry in os.scandir(prefix.path):
+                objects[prefix.name + entry.name] = entry.stat(follow_symlinks=False).st_size
+        return objects
+
+    def remove(self, checksum: str) -> int:
+        """Remove an object, return the number of bytes freed."""
+        path = self.get_path(checksum)
+        try:
+            st = os.stat(path)
+            os.remove(path)
+        except FileNotFoundError:
+            return 0
+        try:
+            os.rmdir(os.path.dirname(path))
+        except OSError:
+            pass  # not empty
+        # a hardlinked object (e.g. of a duplicated bottle) frees nothing
+        return st.st_size if st.st_nlink == 1 else 0
+
+    def remove_partials(self):
+        """Remove the partial objects left by an interrupted copy."""
+        if not os.path.isdir(self.path):
+            return
+        for entry in os.scandir(self.path):
+            if entry.name.endswith(".tmp") and entry.is_file(follow_symlinks=False):
+                os.remove(entry.path)
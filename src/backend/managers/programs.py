@@ -0,0 +1,196 @@
+# programs.py
+#
+# Copyright 2020 brombinmirko <send@mirko.pm>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import hashlib
+import threading
+from glob import glob
+from typing import Union
+
+from bottles.backend.logger import Logger  # pyright: reportMissingImports=false
+from bottles.backend.globals import Paths
+from bottles.backend.utils.manager import ManagerUtils
+from bottles.backend.utils.lnk import ShellLink
+from bottles.backend.utils import yaml
+
+logging = Logger()
+
+
+class ProgramsIndex:
+    """
+    Index of the shortcuts (.lnk) of a bottle. Each shortcut is keyed by
+    its path (relative to the bottle) and stores its mtime and size, the
+    target executable, its name, folder and icon. On refresh only the
+    new or changed shortcuts are parsed again, the removed ones are
+    dropped. Changed shortcuts are parsed in batch with ShellLink. The
+    index is kept in memory and in the cache directory.
+    """
+
+    path = f"{Paths.cache}/programs"
+    __version = 3
+    __lock = threading.Lock()
+    __indexes = {}  # bottle path: {lnk: entry}
+    __patterns = [
+        "drive_c/users/*/Desktop/*.lnk",
+        "drive_c/users/*/Start Menu/Programs/**/*.lnk",
+        "drive_c/ProgramData/Microsoft/Windows/Start Menu/Programs/**/*.lnk",
+        "drive_c/users/*/AppData/Roaming/Microsoft/Windows/Start Menu/Programs/**/*.lnk"
+    ]
+
+    def __init__(self, config: dict, find_icon: callable):
+        """The find_icon callable receives the executable name."""
+        self.config = config
+        self.bottle = ManagerUtils.get_bottle_path(config)
+        self.__find_icon = find_icon
+        _hash = hashlib.sha1(self.bottle.encode("utf-8")).hexdigest()[:16]
+        self.__index_path = os.path.join(self.path, f"{_hash}.yml")
+
+    def refresh(self) -> list:
+        """Update the index and return the entries of the valid shortcuts."""
+        shortcuts = []
+        for pattern in self.__patterns:
+            shortcuts += glob(os.path.join(self.bottle, pattern), recursive=True)
+
+        with ProgramsIndex.__lock:
+            index = self.__get_index()
+            updated = {}
+            changed = {}
+
+            for lnk in shortcuts:
+                key = os.path.relpath(lnk, self.bottle)
+                try:
+                    st = os.stat(lnk)
+                except OSError:
+                    continue
+
+                entry = index.get(key)
+                if entry is None or entry["mtime"] != st.st_mtime_ns or entry["size"] != st.st_size:
+                    changed[lnk] = st
+                updated[key] = entry
+
+            if changed:
+                parsed = ShellLink.parse_many(changed)
+                for lnk, st in changed.items():
+                    updated[os.path.relpath(lnk, self.bottle)] = self.__get_entry(st, parsed[lnk])
+
+            if changed or updated.keys() != index.keys():
+                ProgramsIndex.__indexes[self.bottle] = updated
+                self.__save_index(updated)
+
+            return [dict(e, lnk=k) for k, e in updated.items() if e["path"] is not None]
+
+    def get(self, lnk: str) -> Union[dict, None]:
+        """Return the entry of a shortcut, lnk is relative to the bottle path."""
+        with ProgramsIndex.__lock:
+            entry = self.__get_index().get(lnk)
+        if entry is None or entry["path"] is None:
+            return None
+        return dict(entry, lnk=lnk)
+
+    def find(self, name: str = None, executable: str = None) -> list:
+        """Return the entries matching the given program name and/or executable."""
+        results = []
+        for entry in self.refresh():
+            if name is not None and entry["name"].lower() != name.lower():
+                continue
+            if executable is not None and entry["executable"].lower() != executable.lower():
+                continue
+            results.append(entry)
+        return results
+
+    def invalidate(self):
+        """Drop the index of the bottle, all the shortcuts will be parsed again."""
+        with ProgramsIndex.__lock:
+            ProgramsIndex.__indexes.pop(self.bottle, None)
+            try:
+                os.remove(self.__index_path)
+            except FileNotFoundError:
+                pass
+
+    def __get_entry(self, st: os.stat_result, link: Union[dict, None]) -> dict:
+        entry = {
+            "mtime": st.st_mtime_ns,
+            "size": st.st_size,
+            "path": None
+        }
+
+        if link is None or not link["path"]:
+            return entry
+
+        executable_path = link["path"]
+        executable_name = executable_path.split("\\")[-1]
+        entry.update({
+            "path": executable_path,
+            "executable": executable_name,
+            "name": executable_name.split(".")[0],
+            "folder": self.__get_exe_parent_dir(executable_path),
+            "icon": self.__find_icon(executable_name),
+            "arguments": link["arguments"] or "",
+            "working_dir": link["working_dir"],
+            "cwd": self.__get_working_dir(link["working_dir"]),
+            "icon_location": link["icon_location"],
+            "description": link["name"]
+        })
+        return entry
+
+    def __get_working_dir(self, working_dir: str) -> Union[str, None]:
+        """Get the working directory of the shortcut in the bottle, if on C:."""
+        if not working_dir or working_dir[:3].upper() != "C:\\":
+            return None
+        path = os.path.join(self.bottle, "drive_c", *working_dir[3:].split("\\"))
+        return path.rstrip("/") if os.path.isdir(path) else None
+
+    def __get_exe_parent_dir(self, executable_path: str) -> str:
+        """Get parent directory of the executable."""
+        if "\\" in executable_path:
+            p = "\\".join(executable_path.split("\\")[:-1])
+            p = p.replace("C:\\", "\\drive_c\\").replace("\\", "/")
+            return self.bottle + p
+
+        p = "\\".join(executable_path.split("/")[:-1])
+        p = f"/drive_c/{p}"
+        return p.replace("\\", "/")
+
+    def __get_index(self) -> dict:
+        index = ProgramsIndex.__indexes.get(self.bottle)
+        if index is not None:
+            return index
+
+        index = {}
+        try:
+            with open(self.__index_path, "r") as f:
+                data = yaml.safe_load(f) or {}
+            if data.get("version") == ProgramsIndex.__version:
+                index = data.get("shortcuts", {})
+        except FileNotFoundError:
+            pass
+        except (OSError, yaml.YAMLError):
+            logging.warning(f"Programs index of {self.config.get('Name')} is corrupted, "
+                            "it will be regenerated.", )
+
+        ProgramsIndex.__indexes[self.bottle] = index
+        return index
+
+    def __save_index(self, index: dict):
+        tmp_path = f"{self.__index_path}.tmp"
+        try:
+            os.makedirs(self.path, exist_ok=True)
+            with open(tmp_path, "w") as f:
+                yaml.dump({"version": ProgramsIndex.__version, "shortcuts": index}, f)
+            os.replace(tmp_path, self.__index_path)
+        except OSError as e:
+            logging.error(f"Cannot write the programs index: {e}", )
@@ -0,0 +1,240 @@
+# registry.py
+#
+# Copyright 2020 brombinmirko <send@mirko.pm>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import copy
+import threading
+from typing import Union
+
+from bottles.backend.logger import Logger  # pyright: reportMissingImports=false
+from bottles.backend.models.samples import Samples
+from bottles.backend.globals import Paths
+from bottles.backend.utils import yaml
+
+logging = Logger()
+
+
+class BottleRegistry:
+    """
+    Keep the parsed and migrated bottle configurations in memory, keyed
+    by the mtime, size and inode of the bottle.yml (and placeholder.yml)
+    files. A bottle is parsed again only when one of its files changes,
+    removed bottles are evicted. Only the keys and the resolved config
+    paths are persisted, in a small index which is written when they
+    change: it is regenerated if missing, unreadable or built for a
+    different configuration sample.
+    """
+
+    path = f"{Paths.cache}/bottles-index.yml"
+    __version = 2
+
+    def __init__(self, migrate: callable):
+        """
+        The migrate callable receives a freshly parsed configuration and
+        the bottle name, and returns the configuration to register.
+        """
+        self.__migrate = migrate
+        self.__lock = threading.Lock()
+        self.__index = None  # name: entry, persisted
+        self.__saved = None  # the index as last loaded or saved
+        self.__configs = {}  # name: config, shared with the manager
+
+    def refresh(self, silent: bool = False) -> tuple:
+        """
+        Scan the bottles directory and return a (configs, removed)
+        tuple, where configs is a dict (name: config) of all the valid
+        bottles and removed is the list of the evicted bottle names.
+        """
+        with self.__lock:
+            if self.__index is None:
+                self.__load_index()
+
+            found = set()
+            known = set(self.__configs)
+
+            try:
+                entries = [e for e in os.scandir(Paths.bottles) if e.is_dir()]
+            except FileNotFoundError:
+                entries = []
+
+            for entry in entries:
+                if self.__check(entry.name, entry.path, silent) is not None:
+                    found.add(entry.name)
+
+            # the bottles gone, and those no more valid (already dropped)
+            removed = [name for name in known if name not in found]
+            for name in removed:
+                logging.info(f"Bottle [{name}] is gone, removing from registry.", )
+                self.__drop(name)
+
+            self.__save_index()
+
+            return dict(self.__configs), removed
+
+    def update(self, name: str, silent: bool = False) -> Union[dict, None]:
+        """
+        Check a single bottle, return its config or None if it was
+        removed or is not valid anymore.
+        """
+        with self.__lock:
+            if self.__index is None:
+                self.__load_index()
+
+            path = os.path.join(Paths.bottles, name)
+            try:
+                res = self.__check(name, path, silent) if os.path.isdir(path) else self.__drop(name)
+            except (AttributeError, OSError, yaml.YAMLError) as e:
+                # a bottle being written, keep the previous config
+                logging.warning(f"Cannot read the config of bottle [{name}]: {e}", )
+                return self.__configs.get(name)
+
+            self.__save_index()
+
+            return self.__configs.get(name) if res is not None else None
+
+    def get_config_path(self, name: str) -> Union[str, None]:
+        """Return the path of the bottle.yml, which may be out of the bottles path."""
+        with self.__lock:
+            entry = (self.__index or {}).get(name)
+            return entry["config_path"] if entry else None
+
+    def invalidate(self, name: str = None):
+        """Force the given bottle, or all of them, to be parsed again."""
+        with self.__lock:
+            if self.__index is None:
+                return
+            for _name in [name] if name else list(self.__index):
+                if _name in self.__index:
+                    self.__index[_name]["key"] = None
+
+    @staticmethod
+    def __stat(path: str) -> Union[list, None]:
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        return [st.st_mtime_ns, st.st_size, st.st_ino]
+
+    def __check(self, name: str, path: str, silent: bool) -> Union[bool, None]:
+        """
+        Make sure the registered bottle is up to date. Return True if it
+        was parsed again, False if unchanged and None if it is not valid.
+        """
+        cached = self.__index.get(name)
+
+        placeholder = os.path.join(path, "placeholder.yml")
+        placeholder_key = self.__stat(placeholder)
+        config_path = os.path.join(path, "bottle.yml")
+
+        if placeholder_key is not None:
+            if cached and cached["placeholder"] == placeholder_key:
+                config_path = cached["config_path"]
+            else:
+                try:
+                    with open(placeholder, "r") as f:
+                        placeholder_yaml = yaml.safe_load(f)
+                    if not placeholder_yaml.get("Path"):
+                        raise Exception("Missing Path in placeholder.yml")
+                    config_path = os.path.join(placeholder_yaml.get("Path"), "bottle.yml")
+                except (yaml.YAMLError, Exception):
+                    if not silent:
+                        logging.error("Placeholder found but could not be parsed")
+                    return self.__drop(name)
+
+        key = self.__stat(config_path)
+        if key is None:
+            if not silent:
+                logging.warning(f"A placeholder found but can't reach the config file: {config_path}")
+            return self.__drop(name)
+
+        if cached and name in self.__configs \
+                and cached["config_path"] == config_path \
+                and cached["placeholder"] == placeholder_key \
+                and cached["key"] == key:
+            return False
+
+        with open(config_path, "r") as f:
+            config = yaml.safe_load(f)
+
+        if config is None:
+            raise AttributeError
+
+        config = self.__migrate(config, name)
+
+        self.__configs[name] = config
+        self.__index[name] = {
+            "placeholder": placeholder_key,
+            "config_path": config_path,
+            "key": self.__stat(config_path)  # the migration may write the config
+        }
+        return True
+
+    def __drop(self, name: str) -> None:
+        """Forget a bottle which is no more valid, it is not returned."""
+        self.__configs.pop(name, None)
+        self.__index.pop(name, None)
+        return None
+
+    @staticmethod
+    def __get_signature() -> list:
+        """Configurations migrated with a different sample must be migrated again."""
+        return [
+            BottleRegistry.__version,
+            Paths.bottles,
+            sorted(Samples.config.keys()),
+            sorted(Samples.config["Parameters"].keys())
+        ]
+
+    def __load_index(self):
+        self.__index = {}
+        self.__saved = {}
+        self.__configs = {}
+
+        try:
+            with open(self.path, "r") as f:
+                data = yaml.safe_load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, yaml.YAMLError):
+            logging.warning("Bottles index is corrupted, it will be regenerated.", )
+            return
+
+        if not isinstance(data, dict) or data.get("signature") != self.__get_signature():
+            return
+
+        self.__index = data.get("bottles") or {}
+        self.__saved = copy.deepcopy(self.__index)
+
+    def __save_index(self):
+        """Write the index, if it changed since it was loaded or saved."""
+        if self.__index == self.__saved:
+            return
+
+        tmp_path = f"{self.path}.tmp"
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(tmp_path, "w") as f:
+                yaml.dump({
+                    "signature": self.__get_signature(),
+                    "bottles": self.__index
+                }, f)
+            os.replace(tmp_path, self.path)
+            self.__saved = copy.deepcopy(self.__index)
+        except (OSError, yaml.YAMLError) as e:
+            logging.error(f"Cannot write the bottles index: {e}", )
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
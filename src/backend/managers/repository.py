@@ -16,14 +16,17 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 import os
-import urllib.request
+import hashlib
 from typing import Union, NewType
+from concurrent.futures import ThreadPoolExecutor
 
 from bottles.backend.logger import Logger  # pyright: reportMissingImports=false
 from bottles.backend.repos.dependency import DependencyRepo
 from bottles.backend.repos.component import ComponentRepo
 from bottles.backend.repos.installer import InstallerRepo
+from bottles.backend.repos.cache import IndexCache
 from bottles.params import VERSION_NUM
+from bottles.backend.utils import yaml
 
 logging = Logger()
 
@@ -33,28 +36,35 @@ class RepositoryManager:
         "components": {
             "url": "https://repo.usebottles.com/components/",
             "index": "",
+            "catalog": None,
+            "revision": None,
             "cls": ComponentRepo
         },
         "dependencies": {
             "url": "https://repo.usebottles.com/dependencies/",
             "index": "",
+            "catalog": None,
+            "revision": None,
             "cls": DependencyRepo
         },
         "installers": {
             "url": "https://repo.usebottles.com/programs/",
             "index": "",
+            "catalog": None,
+            "revision": None,
             "cls": InstallerRepo
         }
     }
 
-    def __init__(self):
+    def __init__(self, utils_conn=None):
+        self.__utils_conn = utils_conn
         self.__check_locals()
         self.__get_index()
 
     def get_repo(self, name: str):
         if name in self.__repositories:
             repo = self.__repositories[name]
-            return repo["cls"](repo["url"], repo["index"])
+            return repo["cls"](repo["url"], repo["index"], repo["catalog"], repo["revision"])
 
         logging.error(f"Repository {name} not found", )
 
@@ -81,17 +91,39 @@ class RepositoryManager:
                 logging.error(f"Local {repo} path does not exist: {_path}", )
 
     def __get_index(self):
-        for repo, data in self.__repositories.items():
-            __index = os.path.join(data["url"], f"{VERSION_NUM}.yml")
-            __fallback = os.path.join(data["url"], "index.yml")
-
-            try:
-                with urllib.request.urlopen(__index) as res:
-                    data["index"] = __index
-            except (urllib.error.HTTPError, urllib.error.URLError):
-                try:
-                    with urllib.request.urlopen(__fallback) as res:
-                        data["index"] = __fallback
-                except (urllib.error.HTTPError, urllib.error.URLError):
-                    logging.error(f"Could not get index for {repo} repository", )
-                    continue
+        """
+        Get the indexes of all the repositories concurrently. The indexes
+        are served from the local cache (revalidated in background) and
+        downloaded only if there is no cached copy.
+        """
+        online = self.__utils_conn is None or self.__utils_conn.check_connection()
+
+        def get_repo_index(item: tuple):
+            self.__get_repo_index(item, online)
+
+        with ThreadPoolExecutor(max_workers=len(self.__repositories)) as executor:
+            list(executor.map(get_repo_index, self.__repositories.items()))
+
+    @staticmethod
+    def __get_repo_index(item: tuple, online: bool = True):
+        repo, data = item
+        __index = os.path.join(data["url"], f"{VERSION_NUM}.yml")
+        __fallback = os.path.join(data["url"], "index.yml")
+        cache = IndexCache(repo)
+
+        # local repositories are always available
+        offline = not online and not data["url"].startswith("file://")
+        index, content = cache.get([__index, __fallback], offline)
+        if index is None:
+            return
+
+        try:
+            catalog = yaml.safe_load(content)
+        except yaml.YAMLError:
+            logging.error(f"Cannot parse {repo} repository index.", )
+            cache.invalidate()
+            return
+
+        data["index"] = index
+        data["catalog"] = catalog or {}
+        data["revision"] = hashlib.sha1(content).hexdigest()
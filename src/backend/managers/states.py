@@ -0,0 +1,385 @@
+# states.py
+#
+# Copyright 2020 brombinmirko <send@mirko.pm>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import sqlite3
+from contextlib import closing
+from datetime import datetime
+
+from bottles.backend.logger import Logger  # pyright: reportMissingImports=false
+from bottles.backend.utils import yaml
+
+logging = Logger()
+
+
+class StatesIndex:
+    """
+    Index of the states of a bottle, in a SQLite database under
+    states/index.db. Paths and checksums are stored once (paths and
+    hashes tables), each state references them in the files table (its
+    manifest) and in the edits table (its differences with the previous
+    state). States created with the YAML files (states.yml and each
+    states/<id>/index.yml and files.yml) are imported once, the first
+    time the index is opened; the YAML files are left untouched.
+    The manifests of the states created before the recursive index only
+    list the files at the top of drive_c, those states are marked as
+    not recursive.
+    """
+
+    __version = 2
+    EDITS = ["Additions", "Removed", "Changes"]
+
+    __schema = [
+        """CREATE TABLE IF NOT EXISTS states (
+            id INTEGER PRIMARY KEY,
+            comment TEXT,
+            creation_date TEXT,
+            update_date TEXT,
+            recursive INTEGER NOT NULL DEFAULT 1
+        )""",
+        """CREATE TABLE IF NOT EXISTS paths (
+            id INTEGER PRIMARY KEY,
+            path TEXT NOT NULL UNIQUE
+        )""",
+        """CREATE TABLE IF NOT EXISTS hashes (
+            id INTEGER PRIMARY KEY,
+            checksum TEXT NOT NULL UNIQUE,
+            size INTEGER
+        )""",
+        """CREATE TABLE IF NOT EXISTS files (
+            state_id INTEGER NOT NULL,
+            path_id INTEGER NOT NULL,
+            hash_id INTEGER NOT NULL,
+            PRIMARY KEY (state_id, path_id)
+        ) WITHOUT ROWID""",
+        """CREATE TABLE IF NOT EXISTS edits (
+            state_id INTEGER NOT NULL,
+            kind INTEGER NOT NULL,
+            path_id INTEGER NOT NULL,
+            hash_id INTEGER NOT NULL,
+            PRIMARY KEY (state_id, kind, path_id)
+        ) WITHOUT ROWID""",
+        "CREATE INDEX IF NOT EXISTS files_hash ON files (hash_id)"
+    ]
+
+    def __init__(self, bottle_path: str):
+        self.bottle_path = bottle_path
+        self.states_path = os.path.join(bottle_path, "states")
+        self.path = os.path.join(self.states_path, "index.db")
+
+    def exists(self) -> bool:
+        """Return True if the bottle has states, in the index or in YAML."""
+        return os.path.isfile(self.path) \
+            or os.path.isfile(os.path.join(self.states_path, "states.yml"))
+
+    def connect(self) -> sqlite3.Connection:
+        """
+        Open the index, creating or migrating it if needed. Use the
+        connection as context manager to commit, and close it.
+        """
+        os.makedirs(self.states_path, exist_ok=True)
+        conn = sqlite3.connect(self.path)
+        conn.execute("PRAGMA foreign_keys = OFF")
+        conn.execute("PRAGMA synchronous = NORMAL")
+
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        if version != StatesIndex.__version:
+            with conn:
+                for statement in StatesIndex.__schema:
+                    conn.execute(statement)
+                if version == 1:
+                    self.__migrate_recursive(conn)
+                conn.execute(f"PRAGMA user_version = {StatesIndex.__version}")
+                if version == 0:
+                    self.__migrate_yaml(conn)
+        return conn
+
+    def list_states(self) -> dict:
+        """Return the states as id: {Creation_Date, Update_Date, Comment}."""
+        if not self.exists():
+            return {}
+        with closing(self.connect()) as conn:
+            rows = conn.execute(
+                "SELECT id, comment, creation_date, update_date FROM states ORDER BY id"
+            ).fetchall()
+        return {
+            row[0]: {"Creation_Date": row[2], "Update_Date": row[3], "Comment": row[1]}
+            for row in rows
+        }
+
+    def is_recursive(self, state_id: int) -> bool:
+        """Return False if the manifest of the state only lists the top of drive_c."""
+        if not self.exists():
+            return True
+        with closing(self.connect()) as conn:
+            row = conn.execute("SELECT recursive FROM states WHERE id = ?", (int(state_id),)).fetchone()
+        return bool(row[0]) if row else True
+
+    def get_next_id(self) -> int:
+        with closing(self.connect()) as conn:
+            return conn.execute("SELECT COALESCE(MAX(id) + 1, 0) FROM states").fetchone()[0]
+
+    def get_files(self, state_id: int) -> dict:
+        """Return the manifest of a state, as path: checksum."""
+        if not self.exists():
+            return {}
+        with closing(self.connect()) as conn:
+            return self.__get_files(conn, state_id)
+
+    @staticmethod
+    def __get_files(conn: sqlite3.Connection, state_id: int) -> dict:
+        return dict(conn.execute(
+            """SELECT paths.path, hashes.checksum FROM files
+            JOIN paths ON paths.id = files.path_id
+            JOIN hashes ON hashes.id = files.hash_id
+            WHERE files.state_id = ?""",
+            (int(state_id),)
+        ).fetchall())
+
+    def get_edits(self, state_id: int) -> dict:
+        """Return the differences of a state with the previous one."""
+        edits = {kind: [] for kind in StatesIndex.EDITS}
+        if not self.exists():
+            return edits
+        with closing(self.connect()) as conn:
+            row = conn.execute("SELECT update_date FROM states WHERE id = ?", (int(state_id),)).fetchone()
+            if row is None:
+                return {}
+            rows = conn.execute(
+                """SELECT edits.kind, paths.path, hashes.checksum FROM edits
+                JOIN paths ON paths.id = edits.path_id
+                JOIN hashes ON hashes.id = edits.hash_id
+                WHERE edits.state_id = ?""",
+                (int(state_id),)
+            ).fetchall()
+
+        for kind, path, checksum in rows:
+            edits[StatesIndex.EDITS[kind]].append({"file": path, "checksum": checksum})
+        return {"Update_Date": row[0], **edits}
+
+    def count_edits(self, state_id: int) -> dict:
+        """Return the number of additions, removed and changes of a state."""
+        counts = {kind: 0 for kind in StatesIndex.EDITS}
+        if not self.exists():
+            return counts
+        with closing(self.connect()) as conn:
+            for kind, count in conn.execute(
+                    "SELECT kind, COUNT(*) FROM edits WHERE state_id = ? GROUP BY kind",
+                    (int(state_id),)
+            ):
+                counts[StatesIndex.EDITS[kind]] = count
+        return counts
+
+    def add_state(
+            self,
+            state_id: int,
+            comment: str,
+            files: dict,
+            edits: dict,
+            sizes: dict = None,
+            creation_date: str = None,
+            update_date: str = None,
+            recursive: bool = True,
+            conn: sqlite3.Connection = None
+    ):
+        """
+        Add a state with its manifest (path: checksum) and its edits
+        (Additions, Removed, Changes: path: checksum). The sizes of the
+        new checksums can be given as checksum: size.
+        """
+        now = str(datetime.now())
+        if conn is None:
+            with closing(self.connect()) as conn, conn:
+                return self.add_state(state_id, comment, files, edits, sizes,
+                                      creation_date, update_date, recursive, conn)
+
+        conn.execute(
+            "INSERT INTO states (id, comment, creation_date, update_date, recursive) VALUES (?, ?, ?, ?, ?)",
+            (int(state_id), comment, creation_date or now, update_date or now, int(recursive))
+        )
+
+        paths = set(files)
+        checksums = set(files.values())
+        for kind in StatesIndex.EDITS:
+            paths.update(edits.get(kind, {}))
+            checksums.update(edits.get(kind, {}).values())
+
+        sizes = sizes or {}
+        conn.executemany("INSERT OR IGNORE INTO paths (path) VALUES (?)", ((p,) for p in paths))
+        conn.executemany(
+            "INSERT OR IGNORE INTO hashes (checksum, size) VALUES (?, ?)",
+            ((c, sizes.get(c)) for c in checksums)
+        )
+        path_ids = self.__get_ids(conn, "paths", "path", paths)
+        hash_ids = self.__get_ids(conn, "hashes", "checksum", checksums)
+
+        conn.executemany(
+            "INSERT INTO files (state_id, path_id, hash_id) VALUES (?, ?, ?)",
+            ((state_id, path_ids[p], hash_ids[c]) for p, c in files.items())
+        )
+        for kind, name in enumerate(StatesIndex.EDITS):
+            conn.executemany(
+                "INSERT OR REPLACE INTO edits (state_id, kind, path_id, hash_id) VALUES (?, ?, ?, ?)",
+                ((state_id, kind, path_ids[p], hash_ids[c]) for p, c in edits.get(name, {}).items())
+            )
+
+    def get_referenced(self, state_ids: list = None) -> dict:
+        """
+        Return the checksums referenced by the given states, or by all
+        of them, with their size (None if it is not known).
+        """
+        if not self.exists():
+            return {}
+        query = """SELECT DISTINCT hashes.checksum, hashes.size FROM files
+            JOIN hashes ON hashes.id = files.hash_id"""
+        with closing(self.connect()) as conn:
+            if state_ids is None:
+                return dict(conn.execute(query).fetchall())
+            referenced = {}
+            for state_id in state_ids:
+                referenced.update(conn.execute(
+                    f"{query} WHERE files.state_id = ?", (int(state_id),)
+                ).fetchall())
+            return referenced
+
+    def set_sizes(self, sizes: dict):
+        """Record the sizes of the given checksums (checksum: size)."""
+        with closing(self.connect()) as conn, conn:
+            conn.executemany(
+                "UPDATE hashes SET size = ? WHERE checksum = ?",
+                ((size, checksum) for checksum, size in sizes.items())
+            )
+
+    def remove_states(self, state_ids: list):
+        """
+        Remove the given states. The edits of each remaining state which
+        followed a removed one are computed again against the previous
+        remaining state, then the paths and checksums no more referenced
+        are dropped.
+        """
+        state_ids = {int(i) for i in state_ids}
+        with closing(self.connect()) as conn, conn:
+            all_ids = [row[0] for row in conn.execute("SELECT id FROM states ORDER BY id")]
+            for state_id in state_ids:
+                for table, column in [("states", "id"), ("files", "state_id"), ("edits", "state_id")]:
+                    conn.execute(f"DELETE FROM {table} WHERE {column} = ?", (state_id,))
+
+            previous = None
+            previous_removed = False
+            for state_id in all_ids:
+                if state_id in state_ids:
+                    previous_removed = True
+                    continue
+                if previous_removed:
+                    self.__rewrite_edits(conn, state_id, previous)
+                previous = state_id
+                previous_removed = False
+
+            conn.execute(
+                """DELETE FROM hashes WHERE id NOT IN (SELECT hash_id FROM files)
+                AND id NOT IN (SELECT hash_id FROM edits)"""
+            )
+            conn.execute(
+                """DELETE FROM paths WHERE id NOT IN (SELECT path_id FROM files)
+                AND id NOT IN (SELECT path_id FROM edits)"""
+            )
+        with closing(sqlite3.connect(self.path)) as conn:
+            conn.execute("VACUUM")
+
+    def __rewrite_edits(self, conn: sqlite3.Connection, state_id: int, previous_id: int = None):
+        files = self.__get_files(conn, state_id)
+        previous = self.__get_files(conn, previous_id) if previous_id is not None else {}
+        edits = {
+            "Additions": {f: c for f, c in files.items() if f not in previous},
+            "Removed": {f: c for f, c in previous.items() if f not in files},
+            "Changes": {f: c for f, c in files.items() if f in previous and previous[f] != c}
+        }
+
+        conn.execute("DELETE FROM edits WHERE state_id = ?", (state_id,))
+        paths = set(files) | set(previous)
+        path_ids = self.__get_ids(conn, "paths", "path", paths)
+        hash_ids = self.__get_ids(conn, "hashes", "checksum", set(files.values()) | set(previous.values()))
+        for kind, name in enumerate(StatesIndex.EDITS):
+            conn.executemany(
+                "INSERT INTO edits (state_id, kind, path_id, hash_id) VALUES (?, ?, ?, ?)",
+                ((state_id, kind, path_ids[p], hash_ids[c]) for p, c in edits[name].items())
+            )
+
+    @staticmethod
+    def __get_ids(conn: sqlite3.Connection, table: str, column: str, values: set) -> dict:
+        ids = {}
+        values = list(values)
+        for i in range(0, len(values), 500):
+            chunk = values[i:i + 500]
+            ids.update(conn.execute(
+                f"SELECT {column}, id FROM {table} WHERE {column} IN ({','.join('?' * len(chunk))})",
+                chunk
+            ).fetchall())
+        return ids
+
+    @staticmethod
+    def __migrate_recursive(conn: sqlite3.Connection):
+        """Mark the states without any nested file in their manifest as not recursive."""
+        conn.execute("ALTER TABLE states ADD COLUMN recursive INTEGER NOT NULL DEFAULT 1")
+        conn.execute(
+            """UPDATE states SET recursive = 0 WHERE id NOT IN (
+                SELECT files.state_id FROM files
+                JOIN paths ON paths.id = files.path_id
+                WHERE paths.path LIKE '%/%'
+            )"""
+        )
+
+    def __migrate_yaml(self, conn: sqlite3.Connection):
+        """Import the states described by the YAML files, if any."""
+        states_file = os.path.join(self.states_path, "states.yml")
+        if not os.path.isfile(states_file):
+            return
+
+        logging.info(f"Migrating the states of {self.bottle_path} to the states index…", )
+        try:
+            with open(states_file, "r") as f:
+                states = (yaml.safe_load(f) or {}).get("States") or {}
+        except (OSError, yaml.YAMLError) as e:
+            logging.error(f"Cannot read the states file: {e}", )
+            return
+
+        for state_id, state in sorted(states.items(), key=lambda s: int(s[0])):
+            state_path = os.path.join(self.states_path, str(state_id))
+            try:
+                with open(os.path.join(state_path, "files.yml"), "r") as f:
+                    files = (yaml.safe_load(f) or {}).get("Files") or []
+                with open(os.path.join(state_path, "index.yml"), "r") as f:
+                    index = yaml.safe_load(f) or {}
+            except (OSError, yaml.YAMLError) as e:
+                logging.error(f"Cannot migrate state [{state_id}]: {e}", )
+                continue
+
+            files = {f["file"]: f["checksum"] for f in files if f.get("checksum")}
+            self.add_state(
+                int(state_id),
+                state.get("Comment"),
+                files,
+                {
+                    kind: {f["file"]: f["checksum"] for f in index.get(kind) or [] if f.get("checksum")}
+                    for kind in StatesIndex.EDITS
+                },
+                creation_date=state.get("Creation_Date"),
+                update_date=index.get("Update_Date"),
+                recursive=any("/" in f for f in files),
+                conn=conn
+            )
+        logging.info(f"Migrated [{len(states)}] states.", )
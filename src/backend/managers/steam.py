@@ -17,7 +17,6 @@
 
 import os
 import uuid
-import yaml
 import shlex
 import shutil
 import subprocess
@@ -32,6 +31,7 @@ from bottles.backend.wine.winecommand import WineCommand
 from bottles.backend.globals import Paths
 from bottles.backend.utils.steam import SteamUtils
 from bottles.backend.logger import Logger
+from bottles.backend.utils import yaml
 
 logging = Logger()
 
@@ -16,7 +16,6 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 import os
-import yaml
 import uuid
 import shutil
 from datetime import datetime
@@ -24,8 +23,10 @@ from pathlib import Path
 
 from bottles.backend.logger import Logger  # pyright: reportMissingImports=false
 from bottles.backend.utils.manager import ManagerUtils
+from bottles.backend.utils.copier import FileCopier
 from bottles.backend.globals import Paths
 from bottles.backend.models.samples import Samples
+from bottles.backend.utils import yaml
 
 logging = Logger()
 
@@ -57,7 +58,7 @@ class TemplateManager:
         ]
         _path = f"{Paths.templates}/{_uuid}"
         logging.info("Copying files …", )
-        shutil.copytree(bottle, _path, symlinks=True, ignore=shutil.ignore_patterns(*ignored))
+        FileCopier.copy_tree(bottle, _path, symlinks=True, ignore=shutil.ignore_patterns(*ignored))
 
         template = {
             "uuid": _uuid,
@@ -161,5 +162,5 @@ class TemplateManager:
         bottle = ManagerUtils.get_bottle_path(config)
         _path = f"{Paths.templates}/{template['uuid']}"
 
-        shutil.copytree(_path, bottle, symlinks=False, dirs_exist_ok=True)
+        FileCopier.copy_tree(_path, bottle, symlinks=False, dirs_exist_ok=True)
         logging.info("Template unpacked successfully!", )
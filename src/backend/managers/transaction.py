@@ -0,0 +1,104 @@
+# transaction.py
+#
+# Copyright 2020 brombinmirko <send@mirko.pm>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from gi.repository import GLib
+
+from bottles.backend.logger import Logger  # pyright: reportMissingImports=false
+
+logging = Logger()
+
+
+class ConfigTransaction:
+    """
+    Collect the changes to a bottle config, they are applied and
+    written at once by Manager.config_transaction when the block
+    exits without errors. Use config to get the updated config.
+    """
+
+    def __init__(self, config: dict):
+        self.config = config
+        self.changes = []
+
+    def set(self, key: str, value, scope: str = ""):
+        self.changes.append((key, value, scope, False))
+
+    def remove(self, key: str, scope: str = ""):
+        self.changes.append((key, None, scope, True))
+
+    def apply(self):
+        """Apply the collected changes to the config in memory."""
+        for key, value, scope, remove in self.changes:
+            target = self.config[scope] if scope != "" else self.config
+            if remove:
+                target.pop(key, None)
+            else:
+                target[key] = value
+
+
+class ConfigWriter:
+    """
+    Debounced writer for the config toggles of the UI. Changes are
+    applied to the config immediately, while the bottle.yml is written
+    once the changes stop for the given delay (ms), so a burst of
+    toggles results in a single write. It must be used from the main
+    loop, flush writes the pending changes immediately.
+    """
+
+    def __init__(self, manager, delay: int = 500):
+        self.__manager = manager
+        self.__delay = delay
+        self.__config = None
+        self.__changes = []
+        self.__source = None
+
+    def update(self, config: dict, key: str, value, scope: str = "") -> dict:
+        if self.__config is not None and self.__config is not config:
+            self.flush()
+
+        self.__config = config
+        self.__changes.append((key, value, scope))
+        if scope != "":
+            config[scope][key] = value
+        else:
+            config[key] = value
+
+        if self.__source is not None:
+            GLib.source_remove(self.__source)
+        self.__source = GLib.timeout_add(self.__delay, self.__on_timeout)
+        return config
+
+    def __on_timeout(self) -> bool:
+        self.__source = None
+        self.flush()
+        return False  # GLib.SOURCE_REMOVE
+
+    def flush(self, *args):
+        if self.__source is not None:
+            GLib.source_remove(self.__source)
+            self.__source = None
+
+        config, changes = self.__config, self.__changes
+        self.__config, self.__changes = None, []
+        if not changes:
+            return
+
+        try:
+            with self.__manager.config_transaction(config) as tx:
+                for key, value, scope in changes:
+                    tx.set(key, value, scope)
+        except (OSError, IOError) as e:
+            logging.error(f"Cannot write the config of bottle [{config.get('Name')}]: {e}", )
@@ -16,13 +16,14 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 import os
-import yaml
 import uuid
 import shutil
-from glob import glob
+import sqlite3
 from typing import NewType
 from datetime import datetime
 from gettext import gettext as _
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
 from gi.repository import GLib
 
 try:
@@ -31,9 +32,14 @@ except (RuntimeError, GLib.GError):
     from bottles.operation_cli import OperationManager
 
 from bottles.backend.utils.file import FileUtils
+from bottles.backend.utils.statcache import StatCache
+from bottles.backend.utils.copier import FileCopier
 from bottles.backend.models.result import Result
 from bottles.backend.utils.manager import ManagerUtils
+from bottles.backend.managers.objects import ObjectStore
+from bottles.backend.managers.states import StatesIndex
 from bottles.backend.logger import Logger
+from bottles.backend.utils import yaml
 
 logging = Logger()
 
@@ -66,77 +72,24 @@ class VersioningManager:
             False
         )
 
-        states_file_yaml = None
-
-        # check if this is the first state
-        first = True
-        if os.path.isdir(f"{bottle_path}/states/"):
-            first = False
+        states_index = StatesIndex(bottle_path)
 
         # get the current index (all files list)
         cur_index = self.get_index(config)
+        cur_files = {f["file"]: f["checksum"] for f in cur_index["Files"]}
 
-        if not first:
+        if states_index.exists():
             '''
             If this is not the first state, we will compare the current
-            index with the previous one. Otherwise, we will create a new
-            state with the current index.
+            index with the manifest of the current state. Otherwise, we
+            will create a new state with the current index.
             '''
-            states_file = open(f"{bottle_path}/states/states.yml")
-            states_file_yaml = yaml.safe_load(states_file)
-            states_file.close()
-
-            state_index_file = open('%s/states/%s/index.yml' % (
-                bottle_path,
-                str(config.get("State")))
-                                    )
-            state_index = yaml.safe_load(state_index_file)
-            state_index_file.close()
-            state_index_files = state_index["Additions"] + \
-                                state_index["Removed"] + \
-                                state_index["Changes"]
-
-            state_temp_checksums = [f["checksum"] for f in state_index_files]
-            state_temp_files = [
-                tuple([f["file"], f["checksum"]])
-                for f in state_index_files
-            ]
-            cur_temp_files = [
-                tuple([f["file"], f["checksum"]])
-                for f in cur_index["Files"]
-            ]
-            additions = set(cur_temp_files) - set(state_temp_files)
-            removed = set(state_temp_files) - set(cur_temp_files)
-
-            new_state_index = {
-                "Update_Date": str(datetime.now()),
-                "Additions": [
-                    {"file": f[0], "checksum": f[1]}
-                    for f in additions
-                ],
-                "Removed": [
-                    {"file": f[0], "checksum": f[1]}
-                    for f in removed
-                ],
-                "Changes": [
-                    {"file": f["file"], "checksum": f["checksum"]}
-                    for f in cur_index["Files"]
-                    if f["checksum"] not in state_temp_checksums
-                ]
-            }
-
-            state_id = int(str(len(states_file_yaml.get("States"))))
+            state_files = states_index.get_files(config.get("State"))
+            state_id = states_index.get_next_id()
         else:
-            new_state_index = {
-                "Update_Date": str(datetime.now()),
-                "Additions": cur_index["Files"],
-                "Removed": [],
-                "Changes": []
-            }
+            state_files = {}
             state_id = 0
 
-        state_path = "%s/states/%s" % (bottle_path, state_id)
-
         GLib.idle_add(self.__operation_manager.remove_task, task_id)
         GLib.idle_add(
             self.__operation_manager.new_task,
@@ -145,52 +98,44 @@ class VersioningManager:
             False
         )
 
+        '''
+        Store the content of the files in the object store, the files
+        whose content is already stored (by this or a previous state)
+        are skipped, the state index keeps the manifest of the state.
+        A file changed since it was hashed is recorded with the checksum
+        of the content actually stored.
+        '''
+        store = ObjectStore(bottle_path)
+        sizes = {}
         try:
-            '''
-            Try to create the state folder and place the index.yml and
-            files.yml files inside it. If it fails, it will return False.
-            '''
-            os.makedirs(
-                f"{bottle_path}/states/{state_id}/drive_c",
-                exist_ok=True
-            )
-
-            with open(f"{state_path}/index.yml", "w") as state_index_file:
-                yaml.dump(new_state_index, state_index_file, indent=4)
-                state_index_file.close()
-
-            with open(f"{state_path}/files.yml", "w") as state_files_file:
-                yaml.dump(cur_index, state_files_file, indent=4)
-                state_files_file.close()
-        except (OSError, IOError, yaml.YAMLError):
+            for file, checksum in list(cur_files.items()):
+                if checksum in sizes or store.has(checksum):
+                    continue
+                source = "{0}/drive_c/{1}".format(bottle_path, file)
+                stored, size = store.add(source, checksum)
+                if stored != checksum:
+                    logging.warning(f"File [{file}] changed while creating the state.", )
+                    cur_files[file] = stored
+                sizes.setdefault(stored, size)
+        except (OSError, IOError):
             return Result(
                 status=False,
-                message=_("Could not create the state folder.")
+                message=_("Could not store the state files.")
             )
 
-        GLib.idle_add(self.__operation_manager.remove_task, task_id)
-        GLib.idle_add(
-            self.__operation_manager.new_task,
-            task_id,
-            _("Updating index …"),
-            False
-        )
+        edits = {
+            "Additions": {f: c for f, c in cur_files.items() if f not in state_files},
+            "Removed": {f: c for f, c in state_files.items() if f not in cur_files},
+            "Changes": {
+                f: c for f, c in cur_files.items()
+                if f in state_files and state_files[f] != c
+            }
+        }
 
-        for file in cur_index["Files"]:
-            '''
-            For each file in the current index, we will copy it to the
-            new state path.
-            '''
-            os.makedirs(
-                "{0}/drive_c/{1}".format(
-                    state_path,
-                    "/".join(file["file"].split("/")[:-1])
-                ),
-                exist_ok=True
-            )
-            source = "{0}/drive_c/{1}".format(bottle_path, file["file"])
-            target = "{0}/drive_c/{1}".format(state_path, file["file"])
-            shutil.copy2(source, target)
+        logging.info(f"Stored [{len(sizes)}] new objects "
+                     f"({FileUtils.get_human_size(sum(sizes.values()))}, "
+                     f"{FileCopier.describe(store.strategies)}), "
+                     f"[{len(cur_files) - len(sizes)}] already stored.", )
 
         GLib.idle_add(self.__operation_manager.remove_task, task_id)
         GLib.idle_add(
@@ -200,51 +145,19 @@ class VersioningManager:
             False
         )
 
-        # update the states.yml file, appending the new state
-        new_state = {
-            "Creation_Date": str(datetime.now()),
-            "Comment": comment
-        }
-
-        if not first:
-            new_state_file = {
-                "Update_Date": str(datetime.now()),
-                "States": states_file_yaml.get("States")
-            }
-            new_state_file["States"][state_id] = new_state
-        else:
-            new_state_file = {
-                "Update_Date": str(datetime.now()),
-                "States": {"0": new_state}
-            }
-
         try:
-            with open('%s/states/states.yml' % bottle_path, "w") as states_file:
-                yaml.dump(new_state_file, states_file, indent=4)
-                states_file.close()
-        except (OSError, IOError, yaml.YAMLError):
+            states_index.add_state(state_id, comment, cur_files, edits, sizes)
+        except sqlite3.Error as e:
+            logging.error(f"Cannot update the states index: {e}", )
             return Result(
                 status=False,
-                message=_("Could not update the states file.")
-            )
-
-        try:
-            '''
-            Try to create the new index.yml in the bottle's root folder.
-            If it fails, it will return False.
-            '''
-            with open(f'{bottle_path}/states/index.yml', "w") as cur_index_file:
-                yaml.dump(cur_index, cur_index_file, indent=4)
-                cur_index_file.close()
-        except (OSError, IOError, yaml.YAMLError):
-            return Result(
-                status=False,
-                message=_("Could not update the index file.")
+                message=_("Could not update the states index.")
             )
 
         # update bottle configuration
-        self.manager.update_config(config, "State", state_id)
-        self.manager.update_config(config, "Versioning", True)
+        with self.manager.config_transaction(config) as tx:
+            tx.set("State", state_id)
+            tx.set("Versioning", True)
 
         logging.info(f"New state [{state_id}] created successfully!", )
 
@@ -258,6 +171,10 @@ class VersioningManager:
                 False, config
             )
 
+        # apply the retention policy, if the bottle has one
+        if any(self.get_retention_policy(config).values()):
+            self.prune_states(config)
+
         # update the bottles' list
         self.manager.update_bottles()
 
@@ -268,7 +185,6 @@ class VersioningManager:
             message=_("New state [{0}] created successfully!").format(state_id),
             data={
                 "state_id": state_id,
-                "state_path": state_path,
                 "states": self.list_states(config)
             }
         )
@@ -284,26 +200,17 @@ class VersioningManager:
         index as plain text.
         """
         bottle_path = ManagerUtils.get_bottle_path(config)
+        states_index = StatesIndex(bottle_path)
         try:
-            file = open('%s/states/%s/index.yml' % (bottle_path, state_id))
-            content = file.read()
-            files = yaml.safe_load(content)
-            file.close()
-
-            additions = len(files["Additions"])
-            removed = len(files["Removed"])
-            changes = len(files["Changes"])
-
             if plain:
+                counts = states_index.count_edits(state_id)
                 return {
-                    "Plain": content,
-                    "Additions": additions,
-                    "Removed": removed,
-                    "Changes": changes
+                    "Plain": yaml.dump(states_index.get_edits(state_id), indent=4),
+                    **counts
                 }
 
-            return files
-        except (OSError, IOError, yaml.YAMLError):
+            return states_index.get_edits(state_id)
+        except (sqlite3.Error, yaml.YAMLError):
             return {}
 
     @staticmethod
@@ -313,141 +220,462 @@ class VersioningManager:
             plain: bool = False
     ) -> dict:
         """
-        Return the files.yml content of the state. Use the plain argument
-        to return the content as plain text.
+        Return the files (the manifest) of the state. Use the plain
+        argument to return the content as plain text.
         """
         bottle_path = ManagerUtils.get_bottle_path(config)
 
         try:
-            file = open('%s/states/%s/files.yml' % (bottle_path, state_id))
-            files = file.read() if plain else yaml.safe_load(file.read())
-            file.close()
-            return files
-        except (OSError, IOError, yaml.YAMLError):
+            files = {
+                "Files": [
+                    {"file": f, "checksum": c}
+                    for f, c in StatesIndex(bottle_path).get_files(state_id).items()
+                ]
+            }
+            return yaml.dump(files, indent=4) if plain else files
+        except (sqlite3.Error, yaml.YAMLError):
             return {}
 
     @staticmethod
     def get_index(config: dict):
-        """List all files in a bottle and return as dict."""
+        """
+        List all files in a bottle and return as dict. The checksums of
+        the files which did not change since the last call are taken
+        from the bottle StatCache.
+        """
         bottle_path = ManagerUtils.get_bottle_path(config)
+        drive_c = os.path.join(bottle_path, "drive_c")
+
+        files = {}
+        for root, dirs, _files in os.walk(drive_c):
+            if root == drive_c:
+                dirs[:] = [d for d in dirs if d not in ["users"]]
 
+            for f in _files:
+                file = os.path.join(root, f)
+                if not os.path.isfile(file):
+                    continue
+                files[os.path.relpath(file, drive_c)] = file
+
+        checksums = StatCache(bottle_path).get_checksums(files)
         cur_index = {
             "Update_Date": str(datetime.now()),
-            "Files": []
+            "Files": [
+                {"file": file, "checksum": checksums[file]}
+                for file in files
+                if file in checksums
+            ]
         }
-        for file in glob("%s/drive_c/**" % bottle_path):
-            if not os.path.isfile(file):
-                continue
+        return cur_index
 
-            if os.path.islink(os.path.dirname(file)):
-                continue
+    @staticmethod
+    def plan_state(config: dict, state_id: int) -> dict:
+        """
+        Compare the bottle with a state and return the restore plan:
+        the files to remove, to replace and to add (file: checksum),
+        the source of each file to copy (from the object store or the
+        drive_c of a legacy state), the missing ones, and the bytes to
+        write and to remove.
+        The manifest of a state which is not recursive only lists the
+        files at the top of drive_c: the nested files are left as they
+        are, never removed.
+        """
+        bottle_path = ManagerUtils.get_bottle_path(config)
+        states_index = StatesIndex(bottle_path)
 
-            if file[len(bottle_path) + 9:].split("/")[0] in ["users"]:
+        bottle_files = {
+            f["file"]: f["checksum"]
+            for f in VersioningManager.get_index(config).get("Files")
+        }
+        state_files = states_index.get_files(state_id)
+        recursive = states_index.is_recursive(state_id)
+        if not recursive:
+            logging.warning(f"State [{state_id}] only lists the top of drive_c, "
+                            "the nested files will be kept.", )
+
+        remove = [
+            f for f in bottle_files
+            if f not in state_files and (recursive or os.sep not in f)
+        ]
+        replace = {
+            f: checksum for f, checksum in state_files.items()
+            if f in bottle_files and bottle_files[f] != checksum
+        }
+        add = {f: checksum for f, checksum in state_files.items() if f not in bottle_files}
+
+        store = ObjectStore(bottle_path)
+        sources = {}
+        legacy = {}
+        for f, checksum in list(replace.items()) + list(add.items()):
+            source = store.get_path(checksum)
+            if os.path.isfile(source):
+                sources[f] = source
+            else:
+                legacy[f] = checksum
+        if legacy:
+            sources.update(VersioningManager.__find_legacy_sources(config, legacy, state_id))
+
+        def _size(path):
+            try:
+                return os.path.getsize(path)
+            except OSError:
+                return 0
+
+        return {
+            "recursive": recursive,
+            "remove": remove,
+            "replace": replace,
+            "add": add,
+            "sources": sources,
+            "missing": [f for f in legacy if f not in sources],
+            "bytes": sum(_size(s) for s in sources.values()),
+            "removed_bytes": sum(_size(f"{bottle_path}/drive_c/{f}") for f in remove)
+        }
+
+    @staticmethod
+    def __find_legacy_sources(config: dict, files: dict, state_id: int) -> dict:
+        """
+        States created before the object store keep a copy of their files
+        in states/<id>/drive_c, described by their manifest, so a file is
+        found by its checksum in the manifests, from the given state back
+        to the first one, without hashing the candidates.
+        """
+        bottle_path = ManagerUtils.get_bottle_path(config)
+        states_index = StatesIndex(bottle_path)
+        sources = {}
+        for i in range(int(state_id), -1, -1):
+            state_path = f"{bottle_path}/states/{i}/drive_c"
+            if not os.path.isdir(state_path):
                 continue
 
-            cur_index["Files"].append({
-                "file": file[len(bottle_path) + 9:],
-                "checksum": FileUtils().get_checksum(file)
-            })
-        return cur_index
+            manifest = states_index.get_files(i)
+            for f, checksum in files.items():
+                if f not in sources and manifest.get(f) == checksum \
+                        and os.path.isfile(f"{state_path}/{f}"):
+                    sources[f] = f"{state_path}/{f}"
+
+            if len(sources) == len(files):
+                break
+        return sources
+
+    def __execute_plan(self, bottle_path: str, plan: dict, task_id: str):
+        """
+        Apply a restore plan: remove the files, then copy the sources on a
+        thread pool, reporting the progress (in bytes) to the task.
+        """
+        if not plan["recursive"] and any(os.sep in f for f in plan["remove"]):
+            raise OSError("A state which is not recursive cannot remove nested files.")
+
+        for f in plan["remove"]:
+            try:
+                os.remove(f"{bottle_path}/drive_c/{f}")
+            except FileNotFoundError:
+                pass
+
+        def _copy(f):
+            source = plan["sources"][f]
+            target = f"{bottle_path}/drive_c/{f}"
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            return FileCopier.copy_file(source, target), os.path.getsize(source)
+
+        total = plan["bytes"]
+        done = 0
+        strategies = Counter()
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            for strategy, size in executor.map(_copy, plan["sources"]):
+                strategies[strategy] += 1
+                done += size
+                if done < total:
+                    GLib.idle_add(self.__operation_manager.update_task, task_id, done, 1, total)
+
+        logging.info(f"Restored [{len(plan['sources'])}] files: {FileCopier.describe(strategies)}", )
 
     def set_state(
             self,
             config: dict,
             state_id: int,
-            after=False
-    ) -> bool:
-        """Restore a bottle to a state."""
-
+            after=False,
+            dry_run: bool = False
+    ) -> Result:
+        """
+        Restore a bottle to a state. Use dry_run to only get the restore
+        plan (see plan_state), nothing is changed. The restore is refused
+        if the content of some files of the state cannot be found. The
+        after function is called with the status once done, either way.
+        """
         bottle_path = ManagerUtils.get_bottle_path(config)
+        task_id = str(uuid.uuid4())
+
+        def _done(result: Result) -> Result:
+            GLib.idle_add(self.__operation_manager.remove_task, task_id)
+            if after and not dry_run:
+                GLib.idle_add(after, result.status)
+            return result
 
         logging.info(f"Restoring to state: [{state_id}]", )
+        GLib.idle_add(
+            self.__operation_manager.new_task,
+            task_id,
+            _("Restoring state {0} …").format(state_id),
+            False
+        )
 
-        # get bottle and state indexes
-        bottle_index = self.get_index(config)
-        state_index = self.get_state_files(config, state_id)
-
-        search_sources = list(range(int(state_id) + 1))
-        search_sources.reverse()
-
-        # check for removed and chaged files
-        remove_files = []
-        edit_files = []
-        for file in bottle_index.get("Files"):
-            if file["file"] not in [file["file"] for file in state_index.get("Files")]:
-                remove_files.append(file)
-            elif file["checksum"] not in [file["checksum"] for file in state_index.get("Files")]:
-                edit_files.append(file)
-        logging.info(f"[{len(remove_files)}] files to remove.", )
-        logging.info(f"[{len(edit_files)}] files to replace.", )
-
-        # check for new files
-        add_files = []
-        for file in state_index.get("Files"):
-            if file["file"] not in [file["file"] for file in bottle_index.get("Files")]:
-                add_files.append(file)
-        logging.info(f"[{len(add_files)}] files to add.", )
-
-        # perform file updates
-        for file in remove_files:
-            os.remove("%s/drive_c/%s" % (bottle_path, file["file"]))
-
-        for file in add_files:
-            for i in search_sources:
-                source = "%s/states/%s/drive_c/%s" % (
-                    bottle_path, str(i), file["file"]
-                )
-                if os.path.isfile(source):
-                    break
-                target = "%s/drive_c/%s" % (bottle_path, file["file"])
-                shutil.copy2(source, target)
-
-        for file in edit_files:
-            for i in search_sources:
-                source = "%s/states/%s/drive_c/%s" % (
-                    bottle_path, str(i), file["file"])
-                if os.path.isfile(source):
-                    checksum = FileUtils().get_checksum(source)
-                    if file["checksum"] == checksum:
-                        break
-                target = "%s/drive_c/%s" % (bottle_path, file["file"])
-                shutil.copy2(source, target)
+        if int(state_id) not in self.list_states(config):
+            logging.error(f"State [{state_id}] not found.", )
+            return _done(Result(
+                status=False,
+                message=_("State {0} not found.").format(state_id)
+            ))
+
+        plan = self.plan_state(config, state_id)
+        logging.info(f"[{len(plan['remove'])}] files to remove "
+                     f"({FileUtils.get_human_size(plan['removed_bytes'])}).", )
+        logging.info(f"[{len(plan['replace'])}] files to replace.", )
+        logging.info(f"[{len(plan['add'])}] files to add.", )
+        logging.info(f"[{FileUtils.get_human_size(plan['bytes'])}] to write.", )
+        for f in plan["missing"]:
+            logging.error(f"Cannot find the content of [{f}] in the states.", )
+
+        if dry_run:
+            return _done(Result(status=True, data={"plan": plan}))
+
+        if plan["missing"]:
+            return _done(Result(
+                status=False,
+                message=_("The content of {0} files of the state is missing.").format(len(plan["missing"])),
+                data={"plan": plan}
+            ))
+
+        try:
+            self.__execute_plan(bottle_path, plan, task_id)
+        except (OSError, IOError) as e:
+            logging.error(f"Cannot restore state [{state_id}]: {e}", )
+            return _done(Result(
+                status=False,
+                message=_("Could not restore the state files.")
+            ))
 
         # update State in bottle config
         self.manager.update_config(config, "State", state_id)
 
         # update states
-        GLib.idle_add(
-            self.window.page_details.view_versioning.update,
-            False, config
-        )
+        if not self.manager.is_cli:
+            GLib.idle_add(
+                self.window.page_details.view_versioning.update,
+                False, config
+            )
 
         # update bottles
         self.manager.update_bottles()
 
-        # execute caller function after all
-        if after:
-            GLib.idle_add(after)
+        return _done(Result(status=True, data={"plan": plan}))
 
-        return True
+    @staticmethod
+    def get_retention_policy(config: dict) -> dict:
+        """
+        Return the retention policy of the bottle: keep_last, keep_daily,
+        keep_weekly (number of states) and max_size (MiB), 0 to disable.
+        """
+        params = config.get("Parameters", {})
+        return {
+            "keep_last": int(params.get("versioning_keep_last") or 0),
+            "keep_daily": int(params.get("versioning_keep_daily") or 0),
+            "keep_weekly": int(params.get("versioning_keep_weekly") or 0),
+            "max_size": int(params.get("versioning_max_size") or 0)
+        }
+
+    @staticmethod
+    def __select_states(
+            states: dict,
+            checksums: dict,
+            sizes: dict,
+            current: int,
+            keep_last: int = 0,
+            keep_daily: int = 0,
+            keep_weekly: int = 0,
+            max_size: int = 0
+    ) -> list:
+        """
+        Return the ids of the states to keep. A state is kept if it is
+        one of the last keep_last, the newest of one of the last
+        keep_daily days or keep_weekly weeks with states. Without rules
+        all the states are kept. Then the oldest are dropped until the
+        objects they reference (checksums: state id: set, sizes:
+        checksum: size) fit in max_size (MiB). The current and the newest
+        states are always kept.
+        """
+        ids = sorted(states)
+        if not ids:
+            return []
+
+        def _date(state_id):
+            try:
+                return datetime.fromisoformat(states[state_id]["Creation_Date"])
+            except (TypeError, ValueError):
+                return datetime.min
+
+        if keep_last or keep_daily or keep_weekly:
+            keep = set(ids[-keep_last:]) if keep_last else set()
+            for count, period in [
+                (keep_daily, lambda d: d.date()),
+                (keep_weekly, lambda d: d.isocalendar()[:2])
+            ]:
+                periods = set()
+                for state_id in reversed(ids):
+                    period_key = period(_date(state_id))
+                    if period_key in periods:
+                        continue
+                    if len(periods) >= count:
+                        break
+                    periods.add(period_key)
+                    keep.add(state_id)
+        else:
+            keep = set(ids)
+        keep.update({ids[-1], current} & set(ids))
+
+        if max_size:
+            def _size(state_ids):
+                referenced = set().union(*(checksums[i] for i in state_ids))
+                return sum(sizes.get(c) or 0 for c in referenced)
+
+            for state_id in ids:
+                if _size(keep) <= max_size * 1024 * 1024:
+                    break
+                if state_id in keep and state_id not in (ids[-1], current):
+                    keep.remove(state_id)
+
+        return sorted(keep)
+
+    def prune_states(
+            self,
+            config: dict,
+            keep_last: int = None,
+            keep_daily: int = None,
+            keep_weekly: int = None,
+            max_size: int = None,
+            dry_run: bool = False
+    ) -> Result:
+        """
+        Remove the states which are not kept by the retention policy of
+        the bottle (the arguments override it) and collect the objects
+        which are no more referenced. The content of the legacy states
+        (states/<id>/drive_c) needed by the remaining states is moved
+        to the object store first, so they stay restorable, and their
+        copies are removed. Return the removed states and the reclaimed
+        bytes, use dry_run to only compute them.
+        """
+        bottle_path = ManagerUtils.get_bottle_path(config)
+        states_index = StatesIndex(bottle_path)
+        store = ObjectStore(bottle_path)
+
+        policy = self.get_retention_policy(config)
+        for key, value in [
+            ("keep_last", keep_last), ("keep_daily", keep_daily),
+            ("keep_weekly", keep_weekly), ("max_size", max_size)
+        ]:
+            if value is not None:
+                policy[key] = value
+
+        try:
+            states = states_index.list_states()
+            objects = store.get_objects()
+
+            sizes = states_index.get_referenced()
+            unknown = {c: objects[c] for c, size in sizes.items() if size is None and c in objects}
+            if unknown:
+                states_index.set_sizes(unknown)
+                sizes.update(unknown)
+            checksums = {i: set(states_index.get_referenced([i])) for i in states}
+
+            keep = self.__select_states(states, checksums, sizes, int(config.get("State", 0)), **policy)
+            remove = [i for i in states if i not in keep]
+            referenced = set().union(*(checksums[i] for i in keep))
+
+            # content of the legacy states still needed, not in the store yet
+            legacy = {}
+            needed = set()
+            for state_id in keep:
+                missing = {
+                    f: c for f, c in states_index.get_files(state_id).items()
+                    if c not in objects and c not in needed
+                }
+                if missing:
+                    for f, source in self.__find_legacy_sources(config, missing, state_id).items():
+                        legacy[source] = missing[f]
+                    needed.update(missing.values())
+            legacy_dirs = [
+                f"{bottle_path}/states/{i}" if i in remove else f"{bottle_path}/states/{i}/drive_c"
+                for i in states
+                if os.path.isdir(f"{bottle_path}/states/{i}/drive_c")
+            ]
+
+            reclaimed = sum(size for c, size in objects.items() if c not in referenced)
+            reclaimed += sum(FileUtils().get_path_size(d, human=False) for d in legacy_dirs)
+            reclaimed -= sum(os.path.getsize(s) for s in legacy)
+        except (OSError, sqlite3.Error) as e:
+            logging.error(f"Cannot compute the states to prune: {e}", )
+            return Result(status=False, message=_("Could not read the states."))
+
+        logging.info(f"Pruning states of bottle [{config['Name']}]: keeping {keep}, "
+                     f"removing {remove}, [{FileUtils.get_human_size(reclaimed)}] to reclaim.", )
+        data = {"kept": keep, "removed": remove, "reclaimed": max(reclaimed, 0), "policy": policy}
+        if dry_run:
+            return Result(status=True, data=data)
+
+        try:
+            freed = 0
+            found = set()
+            for source, checksum in legacy.items():
+                stored, size = store.add(source, checksum)
+                freed -= size
+                if stored == checksum:
+                    found.add(checksum)
+                elif stored not in referenced:
+                    # not the content the states refer to, nothing to keep it for
+                    freed += store.remove(stored)
+            for checksum in needed - found:
+                logging.warning(f"Content [{checksum}] of the states is missing.", )
+
+            if remove:
+                states_index.remove_states(remove)
+
+            for checksum in objects:
+                if checksum not in referenced:
+                    freed += store.remove(checksum)
+            store.remove_partials()
+
+            for path in legacy_dirs:
+                freed += FileUtils().get_path_size(path, human=False)
+                shutil.rmtree(path, ignore_errors=True)
+        except (OSError, sqlite3.Error) as e:
+            logging.error(f"Cannot prune the states: {e}", )
+            return Result(status=False, message=_("Could not prune the states."))
+
+        data["reclaimed"] = max(freed, 0)
+        logging.info(f"Removed [{len(remove)}] states, "
+                     f"[{FileUtils.get_human_size(data['reclaimed'])}] reclaimed.", )
+
+        if not self.manager.is_cli:
+            GLib.idle_add(
+                self.window.page_details.view_versioning.update,
+                False, config
+            )
+
+        return Result(status=True, data=data)
 
     @staticmethod
     def list_states(config: dict) -> dict:
         """
-        This function take all the states from the states.yml file
+        This function take all the states from the states index
         of the given bottle and return them as a dict.
         """
         bottle_path = ManagerUtils.get_bottle_path(config)
         states = {}
 
         try:
-            states_file = open('%s/states/states.yml' % bottle_path)
-            states_file_yaml = yaml.safe_load(states_file)
-            states_file.close()
-            states = states_file_yaml.get("States")
-
+            states = StatesIndex(bottle_path).list_states()
             logging.info(f"Found [{len(states)}] states for bottle: [{config['Name']}]", )
-        except:
-            logging.warning(f"Cannot find states.yml file for bottle: [{config['Name']}]", )
+        except sqlite3.Error as e:
+            logging.warning(f"Cannot read the states index of bottle: [{config['Name']}]: {e}", )
 
         return states
@@ -0,0 +1,212 @@
+# watcher.py
+#
+# Copyright 2020 brombinmirko <send@mirko.pm>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+from gi.repository import Gio, GLib
+
+from bottles.backend.logger import Logger  # pyright: reportMissingImports=false
+from bottles.backend.globals import Paths
+
+logging = Logger()
+
+
+class WatcherManager:
+    """
+    Watch the bottles and components directories and push the changes
+    to the manager, one bottle or one component type at a time. Gio
+    monitors are inotify based on Linux; if a monitor cannot be created
+    (e.g. the inotify watches are exhausted) the directory is polled.
+    Events are collected for a short delay, so bursts like a component
+    extraction or an atomic config write result in a single update.
+    All the callbacks run in the main loop.
+    """
+
+    delay = 300  # ms
+    poll_interval = 5  # seconds
+    __bottle_files = ["bottle.yml", "placeholder.yml"]
+
+    def __init__(self, manager):
+        self.__manager = manager
+        self.__monitors = {}  # path: Gio.FileMonitor
+        self.__polled = {}  # path: (stat key, callback)
+        self.__poll_source = None
+        self.__pending_bottles = set()
+        self.__pending_components = set()
+        self.__source = None
+        self.__bottle_paths = {}  # watched path: bottle name
+        self.__components = {
+            "runners": (Paths.runners, lambda: manager.check_runners(install_latest=False)),
+            "runtimes": (Paths.runtimes, lambda: manager.check_runtimes(install_latest=False)),
+            "dxvk": (Paths.dxvk, lambda: manager.check_dxvk(install_latest=False)),
+            "vkd3d": (Paths.vkd3d, lambda: manager.check_vkd3d(install_latest=False)),
+            "nvapi": (Paths.nvapi, lambda: manager.check_nvapi(install_latest=False)),
+            "latencyflex": (Paths.latencyflex, lambda: manager.check_latencyflex(install_latest=False))
+        }
+
+    def start(self):
+        self.__watch(Paths.bottles, self.__on_bottles_event)
+        for entry in os.scandir(Paths.bottles):
+            if entry.is_dir():
+                self.__watch_bottle(entry.name)
+
+        for component_type, (path, _) in self.__components.items():
+            self.__watch(
+                path,
+                lambda *args, _type=component_type: self.__on_component_event(_type, *args)
+            )
+
+        logging.info(f"Watching {len(self.__monitors)} paths, "
+                     f"polling {len(self.__polled)}.", )
+
+    def stop(self):
+        for monitor in self.__monitors.values():
+            monitor.cancel()
+        self.__monitors = {}
+        self.__polled = {}
+
+        for source in [self.__source, self.__poll_source]:
+            if source is not None:
+                GLib.source_remove(source)
+        self.__source = self.__poll_source = None
+
+    def __watch(self, path: str, callback: callable):
+        if path in self.__monitors or path in self.__polled:
+            return
+
+        try:
+            monitor = Gio.File.new_for_path(path).monitor_directory(
+                Gio.FileMonitorFlags.WATCH_MOVES, None
+            )
+        except GLib.Error as e:
+            logging.warning(f"Cannot monitor {path}, polling it: {e.message}", )
+            self.__polled[path] = (self.__stat(path), callback)
+            if self.__poll_source is None:
+                self.__poll_source = GLib.timeout_add_seconds(self.poll_interval, self.__poll)
+            return
+
+        monitor.connect("changed", callback)
+        self.__monitors[path] = monitor
+
+    def __watch_bottle(self, name: str):
+        """
+        Watch the bottle directory and, for bottles with a custom path,
+        the directory where the config actually is.
+        """
+        for path in set(self.__get_bottle_paths(name)):
+            self.__bottle_paths[path] = name
+            self.__watch(path, lambda *args, _path=path: self.__on_bottle_event(_path, *args))
+
+    def __unwatch_bottle(self, name: str):
+        for path in [p for p, n in self.__bottle_paths.items() if n == name]:
+            del self.__bottle_paths[path]
+            self.__unwatch(path)
+
+    def __get_bottle_paths(self, name: str) -> list:
+        paths = [os.path.join(Paths.bottles, name)]
+        if not os.path.isdir(paths[0]):
+            return []
+
+        config_path = self.__manager.bottle_registry.get_config_path(name)
+        if config_path is not None:
+            paths.append(os.path.dirname(config_path))
+        return paths
+
+    def __unwatch(self, path: str):
+        monitor = self.__monitors.pop(path, None)
+        if monitor is not None:
+            monitor.cancel()
+        self.__polled.pop(path, None)
+
+    @staticmethod
+    def __stat(path: str):
+        """The directory and the bottle files stats, for the polled paths."""
+        keys = []
+        for _path in [path] + [os.path.join(path, f) for f in WatcherManager.__bottle_files]:
+            try:
+                st = os.stat(_path)
+                keys.append((st.st_mtime_ns, st.st_size, st.st_ino))
+            except OSError:
+                keys.append(None)
+        return keys
+
+    def __poll(self) -> bool:
+        for path, (key, callback) in list(self.__polled.items()):
+            new_key = self.__stat(path)
+            if new_key != key:
+                self.__polled[path] = (new_key, callback)
+                callback(None, Gio.File.new_for_path(path), None, Gio.FileMonitorEvent.CHANGED)
+
+        if not self.__polled:
+            self.__poll_source = None
+            return False
+        return True
+
+    def __on_bottles_event(self, monitor, file, other_file, event):
+        if monitor is None:
+            # the polled bottles directory changed, check all the entries
+            names = set(os.listdir(Paths.bottles))
+            names.update(self.__bottle_paths.values())
+        else:
+            names = {f.get_basename() for f in [file, other_file] if f is not None}
+
+        self.__pending_bottles.update(names)
+        self.__schedule()
+
+    def __on_bottle_event(self, path, monitor, file, other_file, event):
+        if monitor is not None:
+            names = [f.get_basename() for f in [file, other_file] if f is not None]
+            if not any(n in self.__bottle_files for n in names):
+                return
+            if event == Gio.FileMonitorEvent.CHANGED:
+                return  # wait for the CHANGES_DONE_HINT
+
+        self.__pending_bottles.add(self.__bottle_paths.get(path, os.path.basename(path)))
+        self.__schedule()
+
+    def __on_component_event(self, component_type, monitor, file, other_file, event):
+        if event == Gio.FileMonitorEvent.CHANGES_DONE_HINT:
+            return  # contents of a component, not the list
+        self.__pending_components.add(component_type)
+        self.__schedule()
+
+    def __schedule(self):
+        if self.__source is not None:
+            GLib.source_remove(self.__source)
+        self.__source = GLib.timeout_add(self.delay, self.__flush)
+
+    def __flush(self) -> bool:
+        self.__source = None
+        bottles, self.__pending_bottles = self.__pending_bottles, set()
+        components, self.__pending_components = self.__pending_components, set()
+
+        for component_type in components:
+            logging.info(f"Updating {component_type} after a change…", )
+            self.__components[component_type][1]()
+
+        if bottles:
+            for name in bottles:
+                self.__manager.update_bottle(name)
+                watched = {p for p, n in self.__bottle_paths.items() if n == name}
+                if watched != set(self.__get_bottle_paths(name)):
+                    self.__unwatch_bottle(name)
+                    self.__watch_bottle(name)
+            try:
+                self.__manager.window.page_list.update_bottles()
+            except AttributeError:
+                pass
+
+        return False  # GLib.SOURCE_REMOVE
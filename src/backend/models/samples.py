@@ -54,6 +54,10 @@ class Samples:
             "fixme_logs": False,
             "use_runtime": False,
             "use_steam_runtime": False,
+            "versioning_keep_last": 0,
+            "versioning_keep_daily": 0,
+            "versioning_keep_weekly": 0,
+            "versioning_max_size": 0,
         },
         "Environment_Variables": {},
         "Installed_Dependencies": [],
@@ -0,0 +1,167 @@
+# cache.py
+#
+# Copyright 2020 brombinmirko <send@mirko.pm>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import time
+import threading
+import requests
+from typing import Union
+
+from bottles.backend.logger import Logger  # pyright: reportMissingImports=false
+from bottles.backend.globals import Paths
+from bottles.backend.utils.network import HttpClient
+from bottles.backend.utils import yaml
+
+logging = Logger()
+
+
+class IndexCache:
+    """
+    Offline-first cache of a repository index. The cached index is
+    served immediately and, once older than the TTL, revalidated in
+    the background with a conditional GET (ETag/Last-Modified), so the
+    next run gets the new one. An index is downloaded synchronously
+    only when there is no cached copy, and at most once per run.
+    """
+
+    path = f"{Paths.cache}/repos"
+    ttl = 3600
+    timeout = 10
+    __lock = threading.Lock()
+    __fetched = {}
+
+    def __init__(self, name: str):
+        self.name = name
+        self.__content_path = os.path.join(self.path, f"{name}.yml")
+        self.__meta_path = os.path.join(self.path, f"{name}.meta.yml")
+
+    def get(self, urls: list, offline: bool = False) -> tuple:
+        """
+        Return the (index url, content) of the first available url
+        in the given list, or (None, None) if no index is available.
+        Use offline to serve the cached index only, without network.
+        """
+        with IndexCache.__lock:
+            fetched = IndexCache.__fetched.get(self.name)
+            if fetched and fetched[0] in urls:
+                return fetched
+
+        meta = self.__get_meta()
+        content = self.__get_content()
+
+        if meta.get("index") in urls and content is not None:
+            if not offline and time.time() - meta.get("fetched", 0) > self.ttl:
+                logging.info(f"Revalidating {self.name} repository index in background…", )
+                threading.Thread(
+                    target=self.__fetch,
+                    args=(urls, meta),
+                    daemon=True
+                ).start()
+            return self.__remember(meta["index"], content)
+
+        if offline:
+            logging.warning(f"No cached index for {self.name} repository while offline.", )
+            return None, None
+
+        res = self.__fetch(urls)
+        if res is None:
+            return None, None
+
+        return self.__remember(*res)
+
+    def invalidate(self):
+        """Remove the cached index, e.g. when it cannot be parsed."""
+        with IndexCache.__lock:
+            IndexCache.__fetched.pop(self.name, None)
+
+        for path in [self.__content_path, self.__meta_path]:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def __remember(self, index: str, content: bytes) -> tuple:
+        with IndexCache.__lock:
+            IndexCache.__fetched[self.name] = (index, content)
+        return index, content
+
+    def __fetch(self, urls: list, meta: dict = None) -> Union[tuple, None]:
+        """
+        Download the first available index. If meta is given, the
+        request for the cached index is conditional and a not modified
+        response only refreshes the cache time.
+        """
+        for url in urls:
+            headers = {}
+            if meta and meta.get("index") == url:
+                if meta.get("etag"):
+                    headers["If-None-Match"] = meta["etag"]
+                if meta.get("last_modified"):
+                    headers["If-Modified-Since"] = meta["last_modified"]
+
+            try:
+                with HttpClient.get(url, headers=headers, timeout=self.timeout) as res:
+                    if res.status_code == 304:
+                        meta["fetched"] = time.time()
+                        self.__save(meta)
+                        return meta["index"], self.__get_content()
+                    res.raise_for_status()
+                    content = res.content
+                    etag = res.headers.get("ETag")
+                    last_modified = res.headers.get("Last-Modified")
+            except (requests.exceptions.RequestException, OSError):
+                continue
+
+            self.__save({
+                "index": url,
+                "etag": etag,
+                "last_modified": last_modified,
+                "fetched": time.time()
+            }, content)
+            return url, content
+
+        logging.error(f"Could not get index for {self.name} repository", )
+        return None
+
+    def __get_meta(self) -> dict:
+        try:
+            with open(self.__meta_path, "r") as f:
+                return yaml.safe_load(f) or {}
+        except (OSError, yaml.YAMLError):
+            return {}
+
+    def __get_content(self) -> Union[bytes, None]:
+        try:
+            with open(self.__content_path, "rb") as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def __save(self, meta: dict, content: bytes = None):
+        """Write the cache files atomically, the revalidation runs in background."""
+        try:
+            os.makedirs(self.path, exist_ok=True)
+            if content is not None:
+                with open(f"{self.__content_path}.tmp", "wb") as f:
+                    f.write(content)
+                os.replace(f"{self.__content_path}.tmp", self.__content_path)
+
+            with open(f"{self.__meta_path}.tmp", "w") as f:
+                yaml.dump(meta, f)
+            os.replace(f"{self.__meta_path}.tmp", self.__meta_path)
+        except OSError as e:
+            logging.error(f"Cannot write the {self.name} repository cache: {e}", )
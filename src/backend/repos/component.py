@@ -22,16 +22,16 @@ from bottles.backend.repos.repo import Repo  # pyright: reportMissingImports=fal
 class ComponentRepo(Repo):
     name = "components"
 
-    def get(self, name: str, plain: bool = False) -> Union[str, dict, bool]:
-        if name in self.catalog:
-            entry = self.catalog[name]
-            category = entry["Category"]
-            subcategory = entry.get("Sub-category")
+    def get_url(self, name: str) -> str:
+        entry = self.catalog[name]
+        category = entry["Category"]
+        subcategory = entry.get("Sub-category")
 
-            if subcategory:
-                url = f"{self.url}/{category}/{subcategory}/{name}.yml"
-            else:
-                url = f"{self.url}/{category}/{name}.yml"
+        if subcategory:
+            return f"{self.url}/{category}/{subcategory}/{name}.yml"
+        return f"{self.url}/{category}/{name}.yml"
 
-            return self.get_manifest(url, plain)
+    def get(self, name: str, plain: bool = False) -> Union[str, dict, bool]:
+        if name in self.catalog:
+            return self.get_manifest(self.get_url(name), plain)
         return False
@@ -24,7 +24,5 @@ class DependencyRepo(Repo):
 
     def get(self, name: str, plain: bool = False) -> Union[str, dict, bool]:
         if name in self.catalog:
-            entry = self.catalog[name]
-            url = f"{self.url}/{entry['Category']}/{name}.yml"
-            return self.get_manifest(url, plain)
+            return self.get_manifest(self.get_url(name), plain)
         return False
@@ -24,9 +24,7 @@ class InstallerRepo(Repo):
 
     def get(self, name: str, plain: bool = False) -> Union[str, dict, bool]:
         if name in self.catalog:
-            entry = self.catalog[name]
-            url = f"{self.url}/{entry['Category']}/{name}.yml"
-            return self.get_manifest(url, plain)
+            return self.get_manifest(self.get_url(name), plain)
         return False
 
     def get_review(self, name: str) -> Union[str, bool]:
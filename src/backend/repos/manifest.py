@@ -0,0 +1,198 @@
+# manifest.py
+#
+# Copyright 2020 brombinmirko <send@mirko.pm>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import uuid
+import weakref
+import hashlib
+import threading
+import requests
+from glob import glob
+from typing import Union
+from concurrent.futures import ThreadPoolExecutor
+
+from bottles.backend.logger import Logger  # pyright: reportMissingImports=false
+from bottles.backend.globals import Paths
+from bottles.backend.utils.network import HttpClient
+from bottles.backend.utils import yaml
+
+logging = Logger()
+
+
+class ManifestStore:
+    """
+    Store the manifests of a repository on disk. Manifests are saved
+    once by content hash in the objects directory, each repository keeps
+    an url: hash map per catalog revision, so a new index revision gets
+    fresh manifests while an unchanged one resolves them without network.
+    The objects directory is shared by the repositories: writing objects
+    and collecting the unused ones hold the same process-wide lock, and
+    the objects of the stores not saved yet are never collected.
+    """
+
+    path = f"{Paths.cache}/manifests"
+    objects = f"{path}/objects"
+    timeout = 10
+    max_workers = 8
+
+    __objects_lock = threading.RLock()
+    __stores = weakref.WeakSet()
+
+    def __init__(self, name: str, revision: str):
+        self.name = name
+        self.revision = revision
+        self.__index_path = os.path.join(self.path, f"{name}-{revision}.yml")
+        self.__lock = threading.Lock()
+        self.__index = None
+        with ManifestStore.__objects_lock:
+            ManifestStore.__stores.add(self)
+
+    def get(self, url: str) -> Union[bytes, None]:
+        """Return the manifest content, fetching it only if not stored."""
+        content = self.__read(url)
+        if content is not None:
+            return content
+
+        content = self.__fetch(url)
+        if content is None:
+            return None
+
+        self.__store(url, content)
+        self.__save_index()
+        return content
+
+    def prefetch(self, urls: list):
+        """Concurrently fetch and store all the given manifests not stored yet."""
+        missing = [url for url in set(urls) if self.__read(url, check_only=True) is None]
+        if not missing:
+            return
+
+        logging.info(f"Prefetching {len(missing)} {self.name} manifests…", )
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            for url, content in zip(missing, executor.map(self.__fetch, missing)):
+                if content is not None:
+                    self.__store(url, content)
+
+        self.__save_index()
+
+    def __get_index(self) -> dict:
+        with self.__lock:
+            if self.__index is None:
+                try:
+                    with open(self.__index_path, "r") as f:
+                        self.__index = yaml.safe_load(f) or {}
+                except (OSError, yaml.YAMLError):
+                    self.__index = {}
+            return self.__index
+
+    def __read(self, url: str, check_only: bool = False) -> Union[bytes, bool, None]:
+        _hash = self.__get_index().get(url)
+        if _hash is None:
+            return None
+
+        _object = os.path.join(self.objects, _hash)
+        if check_only:
+            return True if os.path.isfile(_object) else None
+
+        try:
+            with open(_object, "rb") as f:
+                content = f.read()
+        except OSError:
+            return None
+
+        if hashlib.sha256(content).hexdigest() != _hash:
+            logging.warning(f"Stored manifest looks corrupted: {url}", )
+            return None
+
+        return content
+
+    def __store(self, url: str, content: bytes):
+        _hash = hashlib.sha256(content).hexdigest()
+        _object = os.path.join(self.objects, _hash)
+
+        index = self.__get_index()
+        with ManifestStore.__objects_lock:
+            try:
+                os.makedirs(self.objects, exist_ok=True)
+                if not os.path.isfile(_object):
+                    tmp_path = f"{_object}.{uuid.uuid4().hex}.tmp"
+                    with open(tmp_path, "wb") as f:
+                        f.write(content)
+                    os.replace(tmp_path, _object)
+            except OSError as e:
+                logging.error(f"Cannot store {self.name} manifest: {e}", )
+                return
+
+            with self.__lock:
+                index[url] = _hash
+
+    def __save_index(self):
+        index = self.__get_index()
+        first = not os.path.exists(self.__index_path)
+
+        try:
+            with self.__lock:
+                with open(f"{self.__index_path}.tmp", "w") as f:
+                    yaml.dump(index, f)
+                os.replace(f"{self.__index_path}.tmp", self.__index_path)
+        except OSError as e:
+            logging.error(f"Cannot write {self.name} manifests index: {e}", )
+            return
+
+        if first:
+            self.__clean_revisions()
+
+    def __get_used(self) -> set:
+        """Return the objects of the stores in memory, saved or not."""
+        used = set()
+        for store in list(ManifestStore.__stores):
+            index = store.__get_index()
+            with store.__lock:
+                used.update(index.values())
+        return used
+
+    def __clean_revisions(self):
+        """Remove the other revisions of this repository and the unused objects."""
+        for old in glob(os.path.join(self.path, f"{self.name}-*.yml")):
+            if old != self.__index_path:
+                os.remove(old)
+
+        with ManifestStore.__objects_lock:
+            used = self.__get_used()
+            for index in glob(os.path.join(self.path, "*.yml")):
+                try:
+                    with open(index, "r") as f:
+                        used.update((yaml.safe_load(f) or {}).values())
+                except (OSError, yaml.YAMLError):
+                    return  # do not remove objects we cannot be sure about
+
+            if not os.path.isdir(self.objects):
+                return
+
+            for _object in os.listdir(self.objects):
+                if _object not in used and not _object.endswith(".tmp"):
+                    try:
+                        os.remove(os.path.join(self.objects, _object))
+                    except FileNotFoundError:
+                        pass  # removed by another instance
+
+    def __fetch(self, url: str) -> Union[bytes, None]:
+        try:
+            return HttpClient.fetch(url, timeout=self.timeout)
+        except (requests.exceptions.RequestException, OSError):
+            logging.error(f"Cannot fetch {self.name} manifest: {url}", )
+            return None
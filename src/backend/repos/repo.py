@@ -15,10 +15,13 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-import yaml
-import urllib.request
+import hashlib
+import requests
 
 from bottles.backend.logger import Logger  # pyright: reportMissingImports=false
+from bottles.backend.repos.manifest import ManifestStore
+from bottles.backend.utils.network import HttpClient
+from bottles.backend.utils import yaml
 
 logging = Logger()
 
@@ -26,30 +29,55 @@ logging = Logger()
 class Repo:
     name: str = ""
 
-    def __init__(self, url: str, index: str):
+    def __init__(self, url: str, index: str, catalog: dict = None, revision: str = None):
         self.url = url
-        self.catalog = self.__get_catalog(index)
+        if catalog is None:
+            catalog, revision = self.__get_catalog(index)
+        self.catalog = catalog
+        self.store = ManifestStore(self.name, revision) if revision else None
 
     def __get_catalog(self, index: str):
         if index in ["", None]:
-            return {}
+            return {}, None
 
         try:
-            with urllib.request.urlopen(index) as url:
-                index = yaml.safe_load(url.read())
-        except (urllib.error.HTTPError, urllib.error.URLError, yaml.YAMLError):
+            content = HttpClient.fetch(index)
+            index = yaml.safe_load(content)
+        except (requests.exceptions.RequestException, yaml.YAMLError):
             logging.error(f"Cannot fetch {self.name} repository index.", )
-            return {}
+            return {}, None
 
-        return index
+        return index, hashlib.sha1(content).hexdigest()
+
+    def get_url(self, name: str) -> str:
+        """Return the manifest url of a catalog entry."""
+        return f"{self.url}/{self.catalog[name]['Category']}/{name}.yml"
+
+    def prefetch(self, names: list = None):
+        """
+        Fetch concurrently and store the manifests of the given catalog
+        entries (all the catalog if names is None).
+        """
+        if self.store is None:
+            return
+
+        if names is None:
+            names = self.catalog.keys()
+
+        self.store.prefetch([self.get_url(n) for n in names if n in self.catalog])
 
     def get_manifest(self, url: str, plain: bool = False) -> dict:
         try:
-            with urllib.request.urlopen(url) as u:
-                res = u.read()
-                if plain:
-                    return res.decode("utf-8")
-                return yaml.safe_load(res)
-        except (urllib.error.HTTPError, urllib.error.URLError, yaml.YAMLError):
+            if self.store is not None:
+                res = self.store.get(url)
+                if res is None:
+                    return False
+            else:
+                res = HttpClient.fetch(url)
+
+            if plain:
+                return res.decode("utf-8")
+            return yaml.safe_load(res)
+        except (requests.exceptions.RequestException, yaml.YAMLError):
             logging.error(f"Cannot fetch {self.name} manifest.", )
             return False
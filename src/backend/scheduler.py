@@ -0,0 +1,214 @@
+# scheduler.py
+#
+# Copyright 2020 brombinmirko <send@mirko.pm>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import itertools
+import threading
+from urllib.parse import urlparse
+
+from bottles.backend.downloader import Downloader  # pyright: reportMissingImports=false
+from bottles.backend.logger import Logger
+
+logging = Logger()
+
+
+class DownloadJob:
+    """
+    A download queued in the DownloadScheduler. Requests of the same
+    file share the job: each one adds its progress and queue functions,
+    and the hash algorithms it needs while the job is queued.
+    """
+
+    def __init__(self, url: str, file: str, priority: int, segments: int = None):
+        self.url = url
+        self.file = file
+        self.priority = priority
+        self.segments = segments
+        self.host = urlparse(url).netloc
+        self.result = None
+        self.algorithms = set()
+        self.digests = {}  # algorithm: digest, once downloaded
+        self.funcs = []
+        self.queue_funcs = []
+        self.__done = threading.Event()
+
+    def progress(self, count, block_size, total_size):
+        for func in list(self.funcs):
+            func(count, block_size, total_size)
+
+    def queued(self, position: int):
+        for func in list(self.queue_funcs):
+            func(position)
+
+    def finish(self, result: bool):
+        self.result = result
+        self.__done.set()
+
+    def wait(self) -> bool:
+        """Wait for the download and return its result."""
+        self.__done.wait()
+        return self.result
+
+
+class DownloadScheduler:
+    """
+    Run all the downloads on a bounded pool of workers. Jobs are taken
+    by priority (INTERACTIVE before BACKGROUND, then in order), with at
+    most max_per_host downloads from the same host. Requests of a file
+    already queued or downloading wait for the same job instead of
+    downloading it again. The queue position of the waiting jobs is
+    reported through their queue functions (0 once started).
+    """
+
+    INTERACTIVE = 0
+    BACKGROUND = 10
+
+    max_workers = 3
+    max_per_host = 2
+
+    __lock = threading.Condition()
+    __pending = []
+    __running = {}  # file: job
+    __hosts = {}  # host: running downloads
+    __workers = 0
+    __counter = itertools.count()
+
+    @staticmethod
+    def download(
+            url: str,
+            file: str,
+            func: callable = None,
+            queue_func: callable = None,
+            priority: int = INTERACTIVE,
+            segments: int = None
+    ) -> bool:
+        """Queue the download and wait for its result."""
+        return DownloadScheduler.submit(url, file, func, queue_func, priority, segments).wait()
+
+    @staticmethod
+    def submit(
+            url: str,
+            file: str,
+            func: callable = None,
+            queue_func: callable = None,
+            priority: int = INTERACTIVE,
+            segments: int = None,
+            algorithms: tuple = ()
+    ) -> DownloadJob:
+        """
+        Queue the download and return its job. The digests of the given
+        algorithms are computed while downloading (see job.digests).
+        """
+        file = os.path.abspath(file)
+        with DownloadScheduler.__lock:
+            job = DownloadScheduler.__find(file)
+            if job is not None:
+                logging.info(f"Download of [{file}] already in progress, waiting for it.", )
+                if job.url != url:
+                    logging.warning(f"[{file}] is requested from [{url}] and [{job.url}].", )
+                if priority < job.priority and job in [j for _, _, j in DownloadScheduler.__pending]:
+                    # an interactive request promotes a background download
+                    DownloadScheduler.__pending = [
+                        (priority, n, j) if j is job else (p, n, j)
+                        for p, n, j in DownloadScheduler.__pending
+                    ]
+                    job.priority = priority
+            else:
+                job = DownloadJob(url, file, priority, segments)
+                DownloadScheduler.__pending.append((priority, next(DownloadScheduler.__counter), job))
+
+            if file not in DownloadScheduler.__running:
+                job.algorithms.update(algorithms)
+
+            if func is not None:
+                job.funcs.append(func)
+            if queue_func is not None:
+                job.queue_funcs.append(queue_func)
+
+            DownloadScheduler.__pending.sort(key=lambda p: p[:2])
+            if DownloadScheduler.__workers < DownloadScheduler.max_workers:
+                DownloadScheduler.__workers += 1
+                threading.Thread(target=DownloadScheduler.__work, daemon=True).start()
+            DownloadScheduler.__lock.notify_all()
+
+        DownloadScheduler.__report()
+        return job
+
+    @staticmethod
+    def get_queue() -> dict:
+        """Return the running and the pending downloads (URLs), in order."""
+        with DownloadScheduler.__lock:
+            return {
+                "running": [job.url for job in DownloadScheduler.__running.values()],
+                "pending": [job.url for _, _, job in DownloadScheduler.__pending]
+            }
+
+    @staticmethod
+    def __find(file: str):
+        if file in DownloadScheduler.__running:
+            return DownloadScheduler.__running[file]
+        for _, _, job in DownloadScheduler.__pending:
+            if job.file == file:
+                return job
+        return None
+
+    @staticmethod
+    def __take():
+        """Take the first pending job whose host is not busy."""
+        for i, (_, _, job) in enumerate(DownloadScheduler.__pending):
+            if DownloadScheduler.__hosts.get(job.host, 0) < DownloadScheduler.max_per_host:
+                del DownloadScheduler.__pending[i]
+                DownloadScheduler.__hosts[job.host] = DownloadScheduler.__hosts.get(job.host, 0) + 1
+                DownloadScheduler.__running[job.file] = job
+                return job
+        return None
+
+    @staticmethod
+    def __report():
+        with DownloadScheduler.__lock:
+            jobs = [job for _, _, job in DownloadScheduler.__pending]
+        for position, job in enumerate(jobs, start=1):
+            job.queued(position)
+
+    @staticmethod
+    def __work():
+        while True:
+            with DownloadScheduler.__lock:
+                job = DownloadScheduler.__take()
+                while job is None:
+                    # idle workers exit, so the pool only lives with downloads
+                    if not DownloadScheduler.__pending:
+                        DownloadScheduler.__workers -= 1
+                        return
+                    DownloadScheduler.__lock.wait()
+                    job = DownloadScheduler.__take()
+
+            job.queued(0)
+            DownloadScheduler.__report()
+            result = False
+            try:
+                downloader = Downloader(job.url, job.file, job.progress, job.segments, tuple(job.algorithms))
+                result = downloader.download()
+                job.digests = downloader.digests
+            except Exception as e:
+                logging.error(f"Download of [{job.url}] failed: {e}", )
+            finally:
+                with DownloadScheduler.__lock:
+                    del DownloadScheduler.__running[job.file]
+                    DownloadScheduler.__hosts[job.host] -= 1
+                    DownloadScheduler.__lock.notify_all()
+                job.finish(result)
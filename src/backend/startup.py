@@ -0,0 +1,131 @@
+# startup.py
+#
+# Copyright 2020 brombinmirko <send@mirko.pm>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import time
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from bottles.backend.logger import Logger  # pyright: reportMissingImports=false
+from bottles.backend.utils import yaml
+
+logging = Logger()
+
+
+class StartupReport:
+    """
+    Store the wall time of each startup phase. Offsets are relative
+    to the start of the scheduler run, durations are in seconds.
+    """
+
+    def __init__(self):
+        self.date = str(datetime.now())
+        self.total = 0.0
+        self.phases = {}
+        self.errors = []
+
+    def add_phase(self, name: str, start: float, duration: float, error: Exception = None):
+        self.phases[name] = {
+            "start": round(start, 3),
+            "duration": round(duration, 3),
+            "status": "failed" if error else "ok"
+        }
+        if error:
+            self.phases[name]["error"] = str(error)
+            self.errors.append(error)
+
+    def get_results(self, plain: bool = False):
+        results = {
+            "Date": self.date,
+            "Total": round(self.total, 3),
+            "Phases": dict(sorted(self.phases.items(), key=lambda p: p[1]["start"]))
+        }
+
+        if plain:
+            return yaml.dump(results, sort_keys=False, indent=4)
+
+        return results
+
+
+class StartupScheduler:
+    """
+    Run the startup phases on a bounded worker pool. Each phase
+    starts as soon as all the phases it requires are completed, so
+    independent checks (disk scans, catalog fetches) run concurrently
+    while the real dependencies are still respected.
+    """
+
+    def __init__(self, max_workers: int = 4):
+        # phases are mostly I/O bound, no need to scale with the CPUs
+        self.max_workers = max_workers
+        self.__phases = {}
+
+    def add(self, name: str, func: callable, requires: list = None):
+        """Register a phase, requires is a list of phase names."""
+        if name in self.__phases:
+            raise ValueError(f"Phase already registered: {name}")
+
+        self.__phases[name] = {
+            "func": func,
+            "requires": set(requires or [])
+        }
+
+    def run(self) -> StartupReport:
+        """
+        Execute all the registered phases and return the report. A
+        failing phase does not stop its dependents, the exceptions are
+        collected in the report errors.
+        """
+        for name, phase in self.__phases.items():
+            unknown = phase["requires"] - self.__phases.keys()
+            if unknown:
+                raise ValueError(f"Phase {name} requires unknown phases: {', '.join(unknown)}")
+
+        report = StartupReport()
+        pending = dict(self.__phases)
+        completed = set()
+        running = {}
+        start = time.perf_counter()
+
+        def timed(_func):
+            _start = time.perf_counter()
+            try:
+                _func()
+            except Exception as e:
+                return _start, time.perf_counter(), e
+            return _start, time.perf_counter(), None
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while pending or running:
+                for name in [n for n, p in pending.items() if p["requires"] <= completed]:
+                    phase = pending.pop(name)
+                    running[executor.submit(timed, phase["func"])] = name
+
+                if not running:
+                    raise ValueError(f"Circular requirements in phases: {', '.join(pending)}")
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    _start, _end, error = future.result()
+                    report.add_phase(name, _start - start, _end - _start, error)
+                    completed.add(name)
+
+                    if error:
+                        logging.error(f"Startup phase [{name}] failed: {error}", )
+
+        report.total = time.perf_counter() - start
+        return report
@@ -0,0 +1,177 @@
+# copier.py
+#
+# Copyright 2020 brombinmirko <send@mirko.pm>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import errno
+import shutil
+import threading
+from collections import Counter
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from bottles.backend.logger import Logger  # pyright: reportMissingImports=false
+
+logging = Logger()
+
+
+class FileCopier:
+    """
+    Copy files with the cheapest strategy the filesystems support:
+    - reflink: FICLONE, the copy shares the extents (btrfs, xfs);
+    - copy_file_range: the copy is made in the kernel, which can still
+      offload it (e.g. NFS, overlayfs);
+    - sendfile: in the kernel, for older kernels;
+    - copy: a plain read/write copy.
+    Content which is never modified in place (e.g. the state objects)
+    can be hardlinked instead, with immutable=True. The metadata are
+    copied like shutil.copy2 does. Every copy returns the strategy used.
+    """
+
+    REFLINK = "reflink"
+    HARDLINK = "hardlink"
+    COPY_FILE_RANGE = "copy_file_range"
+    SENDFILE = "sendfile"
+    COPY = "copy"
+
+    FICLONE = 0x40049409
+    __unsupported = (errno.EOPNOTSUPP, errno.ENOTTY, errno.EXDEV, errno.EINVAL, errno.ENOSYS,
+                     errno.EBADF, errno.EPERM)
+    __lock = threading.Lock()
+    __no_reflink = set()  # (source device, target device) pairs without reflink
+
+    @staticmethod
+    def copy_file(source: str, target: str, immutable: bool = False) -> str:
+        """Copy source to target (a file path) and return the strategy used."""
+        if immutable:
+            try:
+                if os.path.lexists(target):
+                    os.remove(target)
+                os.link(source, target)
+                return FileCopier.HARDLINK
+            except OSError as e:
+                if e.errno not in FileCopier.__unsupported + (errno.EMLINK,):
+                    raise
+
+        if os.path.islink(target):
+            os.remove(target)
+
+        with open(source, "rb") as fsrc, open(target, "wb") as fdst:
+            strategy = FileCopier.__copy_data(fsrc.fileno(), fdst.fileno())
+            if strategy == FileCopier.COPY:
+                shutil.copyfileobj(fsrc, fdst, 1024 * 1024)
+
+        shutil.copystat(source, target)
+        return strategy
+
+    @staticmethod
+    def copy_tree(
+            source: str,
+            target: str,
+            symlinks: bool = False,
+            ignore: callable = None,
+            dirs_exist_ok: bool = False,
+            immutable: bool = False
+    ) -> Counter:
+        """
+        Copy a tree like shutil.copytree, with copy_file for each file.
+        Return a Counter of the strategies used.
+        """
+        strategies = Counter()
+
+        def _copy(src, dst):
+            strategies[FileCopier.copy_file(src, dst, immutable)] += 1
+            return dst
+
+        shutil.copytree(
+            source, target,
+            symlinks=symlinks,
+            ignore=ignore,
+            copy_function=_copy,
+            dirs_exist_ok=dirs_exist_ok
+        )
+        logging.info(f"Copied {source} to {target}: {FileCopier.describe(strategies)}", )
+        return strategies
+
+    @staticmethod
+    def describe(strategies: Counter) -> str:
+        if not strategies:
+            return "no files"
+        return ", ".join(f"{count} {strategy}" for strategy, count in strategies.most_common())
+
+    @staticmethod
+    def __copy_data(src_fd: int, dst_fd: int) -> str:
+        """
+        Try the in-kernel strategies, return COPY if none is supported
+        and the data must be copied by the caller.
+        """
+        src_st = os.fstat(src_fd)
+        devices = (src_st.st_dev, os.fstat(dst_fd).st_dev)
+
+        if fcntl is not None and devices not in FileCopier.__no_reflink:
+            try:
+                fcntl.ioctl(dst_fd, FileCopier.FICLONE, src_fd)
+                return FileCopier.REFLINK
+            except OSError as e:
+                if e.errno not in FileCopier.__unsupported:
+                    raise
+                with FileCopier.__lock:
+                    FileCopier.__no_reflink.add(devices)
+
+        size = src_st.st_size
+        for strategy, func in [
+            (FileCopier.COPY_FILE_RANGE, FileCopier.__copy_file_range),
+            (FileCopier.SENDFILE, FileCopier.__sendfile)
+        ]:
+            try:
+                if func(src_fd, dst_fd, size):
+                    return strategy
+            except OSError as e:
+                if e.errno not in FileCopier.__unsupported:
+                    raise
+            # start again from scratch with the next strategy
+            os.lseek(src_fd, 0, os.SEEK_SET)
+            os.ftruncate(dst_fd, 0)
+            os.lseek(dst_fd, 0, os.SEEK_SET)
+
+        return FileCopier.COPY
+
+    @staticmethod
+    def __copy_file_range(src_fd: int, dst_fd: int, size: int) -> bool:
+        if not hasattr(os, "copy_file_range"):
+            return False
+        copied = 0
+        while True:
+            sent = os.copy_file_range(src_fd, dst_fd, max(size - copied, 1024 * 1024))
+            if sent == 0:
+                # some filesystems report 0 without copying, the copy is
+                # complete only if the whole size was copied
+                return copied >= size
+            copied += sent
+
+    @staticmethod
+    def __sendfile(src_fd: int, dst_fd: int, size: int) -> bool:
+        if not hasattr(os, "sendfile"):
+            return False
+        copied = 0
+        while True:
+            sent = os.sendfile(dst_fd, src_fd, None, max(size - copied, 1024 * 1024))
+            if sent == 0:
+                return copied >= size
+            copied += sent
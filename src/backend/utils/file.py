@@ -16,13 +16,15 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 import os
+import json
 import time
 import shutil
-import hashlib
 
 from typing import Union
 from pathlib import Path
 
+from bottles.backend.utils.hashing import FileHasher  # pyright: reportMissingImports=false
+
 
 class FileUtils:
     """
@@ -31,20 +33,62 @@ class FileUtils:
     """
 
     @staticmethod
-    def get_checksum(file):
+    def get_checksum(file, algorithm: str = "md5"):
         """
-        This function returns the MD5 checksum of the given file.
+        This function returns the checksum of the given file, MD5 by
+        default.
         """
-        checksum = hashlib.md5()
+        return FileHasher(algorithm).hash_file(file)
 
+    @staticmethod
+    def get_recorded_checksum(file: str, algorithm: str = "md5") -> Union[str, None]:
+        """
+        This function returns the checksum recorded for the given file
+        by record_checksum, if the file did not change since then.
+        """
         try:
-            with open(file, "rb") as f:
-                for chunk in iter(lambda: f.read(4096), b""):
-                    checksum.update(chunk)
-            return checksum.hexdigest().lower()
-        except FileNotFoundError:
+            with open(f"{file}.checksums", "r") as f:
+                record = json.load(f)
+            st = os.stat(file)
+            if record["size"] != st.st_size or record["mtime_ns"] != st.st_mtime_ns:
+                return None
+            return record.get(algorithm)
+        except (OSError, ValueError, KeyError, TypeError):
             return None
 
+    @staticmethod
+    def record_checksum(file: str, algorithm: str, checksum: str):
+        """
+        This function records the verified checksum of the given file
+        in <file>.checksums, with its size and mtime, so the file does
+        not need to be hashed again.
+        """
+        try:
+            with open(f"{file}.checksums", "r") as f:
+                record = json.load(f)
+        except (OSError, ValueError):
+            record = {}
+
+        try:
+            st = os.stat(file)
+            if not isinstance(record, dict) \
+                    or record.get("size") != st.st_size or record.get("mtime_ns") != st.st_mtime_ns:
+                record = {}
+            record.update({"size": st.st_size, "mtime_ns": st.st_mtime_ns, algorithm: checksum})
+            with open(f"{file}.checksums.tmp", "w") as f:
+                json.dump(record, f)
+            os.replace(f"{file}.checksums.tmp", f"{file}.checksums")
+        except (OSError, ValueError):
+            pass
+
+    @staticmethod
+    def get_checksums(files: list, algorithm: str = "md5", callback: callable = None) -> dict:
+        """
+        This function returns the checksums of the given files, hashed
+        concurrently, as a dict of file: checksum.
+        """
+        return FileHasher(algorithm).hash_files(files, callback=callback)
+
     @staticmethod
     def use_insensitive_ext(string):
         """Converts a glob pattern into a case-insensitive glob pattern"""
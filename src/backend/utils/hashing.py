@@ -0,0 +1,120 @@
+# hashing.py
+#
+# Copyright 2020 brombinmirko <send@mirko.pm>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import mmap
+import hashlib
+import threading
+from typing import Union
+from concurrent.futures import ThreadPoolExecutor
+
+from bottles.backend.logger import Logger  # pyright: reportMissingImports=false
+
+logging = Logger()
+
+
+class FileHasher:
+    """
+    Hash files with a constant memory usage: each thread reads into its
+    own preallocated buffer, which is passed to the hash as memoryview.
+    Big files can be hashed through mmap instead. hashlib releases the
+    GIL on large updates, so hash_files scales on a thread pool.
+    Supported algorithms: md5, sha1, sha256 and blake2b (fast on CPUs
+    without SHA extensions, with a 32 bytes digest).
+    """
+
+    algorithms = {
+        "md5": hashlib.md5,
+        "sha1": hashlib.sha1,
+        "sha256": hashlib.sha256,
+        "blake2b": lambda: hashlib.blake2b(digest_size=32)
+    }
+    buffer_size = 1024 * 1024
+    mmap_threshold = 64 * 1024 * 1024
+    max_workers = min(8, os.cpu_count() or 1)
+
+    __local = threading.local()
+
+    def __init__(self, algorithm: str = "md5", use_mmap: bool = False):
+        if algorithm not in self.algorithms:
+            raise ValueError(f"Unsupported hash algorithm: {algorithm}")
+        self.algorithm = algorithm
+        self.use_mmap = use_mmap
+
+    def new(self):
+        """Return a new hash object of the selected algorithm."""
+        return self.algorithms[self.algorithm]()
+
+    def hash_file(self, path: str) -> Union[str, None]:
+        """Return the hex digest of the file, None if it does not exist or cannot be read."""
+        checksum = self.new()
+        try:
+            with open(path, "rb") as f:
+                size = os.fstat(f.fileno()).st_size
+                if self.use_mmap and size >= self.mmap_threshold:
+                    with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+                        checksum.update(m)
+                else:
+                    self.__update(checksum, f)
+        except FileNotFoundError:
+            return None
+        except OSError as e:
+            logging.warning(f"Cannot hash {path}: {e}", )
+            return None
+        return checksum.hexdigest().lower()
+
+    def hash_files(self, paths: list, max_workers: int = None, callback: callable = None) -> dict:
+        """
+        Hash many files on a thread pool and return a dict of path: digest,
+        the digest is None for the missing and unreadable files. The optional callback
+        receives the count of the hashed files and the total.
+        """
+        paths = list(paths)
+        results = {}
+
+        def _hash(_path):
+            return _path, self.hash_file(_path)
+
+        if len(paths) < 2:
+            iterator = map(_hash, paths)
+            executor = None
+        else:
+            executor = ThreadPoolExecutor(max_workers=max_workers or self.max_workers)
+            iterator = executor.map(_hash, paths)
+
+        try:
+            for path, digest in iterator:
+                results[path] = digest
+                if callback is not None:
+                    callback(len(results), len(paths))
+        finally:
+            if executor is not None:
+                executor.shutdown()
+
+        return results
+
+    def __update(self, checksum, f):
+        buffer = getattr(FileHasher.__local, "buffer", None)
+        if buffer is None or len(buffer) != self.buffer_size:
+            buffer = FileHasher.__local.buffer = bytearray(self.buffer_size)
+
+        view = memoryview(buffer)
+        while True:
+            read = f.readinto(buffer)
+            if not read:
+                break
+            checksum.update(view[:read])
@@ -0,0 +1,129 @@
+# icons.py
+#
+# Copyright 2020 brombinmirko <send@mirko.pm>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import time
+import fnmatch
+import threading
+from typing import Union
+
+from bottles.backend.logger import Logger  # pyright: reportMissingImports=false
+
+logging = Logger()
+
+
+class IconsIndex:
+    """
+    Index of the icon file names of a directory tree, built once and
+    rebuilt only when one of the walked directories changes (mtime).
+    Lookups return the first file, in walk order, whose lowercase name
+    contains the given name, like a walk with a *name* fnmatch would.
+    Names of 3+ characters are resolved with a trigram index.
+    """
+
+    check_interval = 10  # seconds between the directories mtime checks
+
+    def __init__(self, path: str):
+        self.path = path
+        self.__lock = threading.Lock()
+        self.__names = []  # (lowercase name, icon name) in walk order
+        self.__trigrams = {}  # trigram: set of positions
+        self.__dirs = None  # directory: mtime
+        self.__checked = 0
+        self.__cache = {}
+
+    def find(self, name: str) -> Union[str, None]:
+        """Return the icon name (file name without extension) or None."""
+        with self.__lock:
+            self.__check()
+
+            name = name.lower()
+            if name in self.__cache:
+                return self.__cache[name]
+
+            pos = self.__lookup(name)
+            res = self.__names[pos][1] if pos is not None else None
+            self.__cache[name] = res
+            return res
+
+    def __lookup(self, name: str) -> Union[int, None]:
+        if any(c in name for c in "*?["):
+            # keep the fnmatch semantic for the rare names with wildcards
+            pattern = f"*{name}*"
+            for i, (lower, _) in enumerate(self.__names):
+                if fnmatch.fnmatch(lower, pattern):
+                    return i
+            return None
+
+        if len(name) < 3:
+            for i, (lower, _) in enumerate(self.__names):
+                if name in lower:
+                    return i
+            return None
+
+        candidates = None
+        for i in range(len(name) - 2):
+            positions = self.__trigrams.get(name[i:i + 3])
+            if not positions:
+                return None
+            candidates = positions if candidates is None else candidates & positions
+            if not candidates:
+                return None
+
+        for pos in sorted(candidates):
+            if name in self.__names[pos][0]:
+                return pos
+        return None
+
+    def __check(self):
+        """Rebuild the index if it is missing or a directory changed."""
+        now = time.monotonic()
+        if self.__dirs is not None and now - self.__checked < self.check_interval:
+            return
+        self.__checked = now
+
+        if self.__dirs is not None:
+            try:
+                if all(os.stat(d).st_mtime_ns == m for d, m in self.__dirs.items()):
+                    return
+            except OSError:
+                pass
+
+        self.__build()
+
+    def __build(self):
+        start = time.perf_counter()
+        names, trigrams, dirs = [], {}, {}
+
+        for root, _dirs, files in os.walk(self.path):
+            try:
+                dirs[root] = os.stat(root).st_mtime_ns
+            except OSError:
+                continue
+
+            for file in files:
+                pos = len(names)
+                lower = file.lower()
+                names.append((lower, file[:-4]))
+                for i in range(len(lower) - 2):
+                    trigrams.setdefault(lower[i:i + 3], set()).add(pos)
+
+        self.__names, self.__trigrams = names, trigrams
+        self.__dirs = dirs
+        self.__cache = {}
+        logging.debug(f"Icons index built with {len(names)} icons in "
+                      f"{time.perf_counter() - start:.3f}s", )
@@ -0,0 +1,309 @@
+# lnk.py
+#
+# Copyright 2020 brombinmirko <send@mirko.pm>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import locale
+import struct
+from typing import Union, BinaryIO
+from concurrent.futures import ThreadPoolExecutor
+
+from bottles.backend.logger import Logger  # pyright: reportMissingImports=false
+
+logging = Logger()
+
+
+class ShellLinkError(Exception):
+    pass
+
+
+class _Stream:
+    """
+    Sequential reader of a shell link. Each structure is read once, with
+    its declared size, into a reusable buffer and sliced as memoryview.
+    The declared sizes are checked against the rest of the file before
+    allocating, as they come from the untrusted link.
+    """
+
+    def __init__(self, f: BinaryIO):
+        self.__f = f
+        self.__size = os.fstat(f.fileno()).st_size
+        self.__buffer = bytearray(4096)
+
+    def __check(self, size: int):
+        if not 0 <= size <= self.__size - self.__f.tell():
+            raise ShellLinkError("Unexpected end of file")
+
+    def read(self, size: int) -> memoryview:
+        self.__check(size)
+        if size > len(self.__buffer):
+            self.__buffer = bytearray(size)
+        view = memoryview(self.__buffer)[:size]
+        if self.__f.readinto(view) != size:
+            raise ShellLinkError("Unexpected end of file")
+        return view
+
+    def read_copy(self, size: int) -> memoryview:
+        """Read a structure which must outlive the next read."""
+        self.__check(size)
+        data = bytearray(size)
+        if self.__f.readinto(data) != size:
+            raise ShellLinkError("Unexpected end of file")
+        return memoryview(data)
+
+    def read_uint(self, size: int) -> int:
+        return int.from_bytes(self.read(size), "little")
+
+
+class ShellLink:
+    """
+    Parser for the Shell Link (.lnk) binary file format [MS-SHLLINK].
+    It decodes the header, the LinkTargetIDList, the LinkInfo, the
+    StringData and the EnvironmentVariableDataBlock, which is enough to
+    get the target, its arguments, working directory and icon.
+    """
+
+    HEADER_SIZE = 0x4C
+    LINK_CLSID = bytes.fromhex("0114020000000000c000000000000046")
+
+    # LinkFlags
+    HAS_LINK_TARGET_ID_LIST = 0x01
+    HAS_LINK_INFO = 0x02
+    HAS_NAME = 0x04
+    HAS_RELATIVE_PATH = 0x08
+    HAS_WORKING_DIR = 0x10
+    HAS_ARGUMENTS = 0x20
+    HAS_ICON_LOCATION = 0x40
+    IS_UNICODE = 0x80
+
+    # LinkInfoFlags
+    VOLUME_ID_AND_LOCAL_BASE_PATH = 0x01
+    COMMON_NETWORK_RELATIVE_LINK = 0x02
+
+    ENVIRONMENT_VARIABLE_BLOCK = 0xA0000001
+
+    max_workers = 8
+
+    @staticmethod
+    def parse(path: str, codepage: str = None) -> dict:
+        """
+        Parse a shell link and return a dict with: path (the best known
+        target), name, relative_path, working_dir, arguments,
+        icon_location, icon_index, show_command, file_attributes and
+        id_list (the names of the LinkTargetIDList items). Raise
+        ShellLinkError if the file is not a valid shell link.
+        """
+        if codepage is None:
+            codepage = locale.getpreferredencoding(False) or "cp1252"
+
+        with open(path, "rb") as f:
+            try:
+                return ShellLink.__parse(_Stream(f), codepage)
+            except (struct.error, IndexError, ValueError) as e:
+                raise ShellLinkError(str(e))
+
+    @staticmethod
+    def parse_many(paths: list, max_workers: int = None) -> dict:
+        """
+        Parse many shell links on a worker pool, return a dict of
+        path: result, the result is None if the file cannot be parsed.
+        """
+        def _parse(_path):
+            try:
+                return ShellLink.parse(_path, codepage)
+            except (OSError, ShellLinkError) as e:
+                logging.warning(f"Cannot parse shortcut {_path}: {e}", )
+                return None
+
+        codepage = locale.getpreferredencoding(False) or "cp1252"
+        paths = list(paths)
+        if len(paths) < 2:
+            return {p: _parse(p) for p in paths}
+
+        with ThreadPoolExecutor(max_workers=max_workers or ShellLink.max_workers) as executor:
+            return dict(zip(paths, executor.map(_parse, paths)))
+
+    @staticmethod
+    def __parse(stream: _Stream, codepage: str) -> dict:
+        header = stream.read(ShellLink.HEADER_SIZE)
+        if int.from_bytes(header[0:4], "little") != ShellLink.HEADER_SIZE \
+                or header[4:20] != ShellLink.LINK_CLSID:
+            raise ShellLinkError("Not a shell link")
+
+        flags, attributes = struct.unpack_from("<II", header, 0x14)
+        icon_index, show_command = struct.unpack_from("<iI", header, 0x38)
+        unicode = bool(flags & ShellLink.IS_UNICODE)
+
+        res = {
+            "path": None,
+            "name": None,
+            "relative_path": None,
+            "working_dir": None,
+            "arguments": None,
+            "icon_location": None,
+            "icon_index": icon_index,
+            "show_command": show_command,
+            "file_attributes": attributes,
+            "id_list": []
+        }
+
+        if flags & ShellLink.HAS_LINK_TARGET_ID_LIST:
+            size = stream.read_uint(2)
+            res["id_list"] = ShellLink.__parse_id_list(stream.read(size), codepage)
+
+        local_path = None
+        if flags & ShellLink.HAS_LINK_INFO:
+            size = stream.read_uint(4)
+            local_path = ShellLink.__parse_link_info(stream.read_copy(size - 4), codepage)
+
+        for flag, key in [
+            (ShellLink.HAS_NAME, "name"),
+            (ShellLink.HAS_RELATIVE_PATH, "relative_path"),
+            (ShellLink.HAS_WORKING_DIR, "working_dir"),
+            (ShellLink.HAS_ARGUMENTS, "arguments"),
+            (ShellLink.HAS_ICON_LOCATION, "icon_location")
+        ]:
+            if flags & flag:
+                count = stream.read_uint(2)
+                if unicode:
+                    res[key] = str(stream.read(count * 2), "utf-16-le", errors="replace")
+                else:
+                    res[key] = str(stream.read(count), codepage, errors="replace")
+
+        environment_path = ShellLink.__parse_extra_data(stream, codepage)
+
+        res["path"] = local_path or ShellLink.__id_list_path(res["id_list"]) or environment_path
+        return res
+
+    @staticmethod
+    def __cstring(data: memoryview, offset: int, codepage: str) -> str:
+        end = bytes(data[offset:]).find(b"\x00")
+        end = len(data) if end < 0 else offset + end
+        return str(data[offset:end], codepage, errors="replace")
+
+    @staticmethod
+    def __wstring(data: memoryview, offset: int) -> str:
+        end = offset
+        while end + 1 < len(data) and (data[end] or data[end + 1]):
+            end += 2
+        return str(data[offset:end], "utf-16-le", errors="replace")
+
+    @staticmethod
+    def __parse_link_info(data: memoryview, codepage: str) -> Union[str, None]:
+        """
+        Return the target path from a LinkInfo structure, data starts
+        after the LinkInfoSize field, so the offsets are shifted by 4.
+        """
+        header_size, flags, _, base_offset, network_offset, suffix_offset = \
+            struct.unpack_from("<IIIIII", data, 0)
+        base_unicode_offset = suffix_unicode_offset = None
+        if header_size >= 0x24:
+            base_unicode_offset, suffix_unicode_offset = struct.unpack_from("<II", data, 0x1C - 4)
+
+        if suffix_unicode_offset:
+            suffix = ShellLink.__wstring(data, suffix_unicode_offset - 4)
+        else:
+            suffix = ShellLink.__cstring(data, suffix_offset - 4, codepage)
+
+        if flags & ShellLink.VOLUME_ID_AND_LOCAL_BASE_PATH:
+            if base_unicode_offset:
+                base = ShellLink.__wstring(data, base_unicode_offset - 4)
+            else:
+                base = ShellLink.__cstring(data, base_offset - 4, codepage)
+            return base + suffix
+
+        if flags & ShellLink.COMMON_NETWORK_RELATIVE_LINK:
+            offset = network_offset - 4
+            net_name_offset, = struct.unpack_from("<I", data, offset + 8)
+            if net_name_offset > 0x14:
+                net_name_unicode_offset, = struct.unpack_from("<I", data, offset + 0x14)
+                net_name = ShellLink.__wstring(data, offset + net_name_unicode_offset)
+            else:
+                net_name = ShellLink.__cstring(data, offset + net_name_offset, codepage)
+            return f"{net_name}\\{suffix}" if suffix else net_name
+
+        return None
+
+    @staticmethod
+    def __parse_id_list(data: memoryview, codepage: str) -> list:
+        """
+        Return the names of the items of an IDList: the volume of a
+        drive item and the (long, if available) name of file entries.
+        """
+        names = []
+        offset = 0
+        while offset + 2 <= len(data):
+            size = int.from_bytes(data[offset:offset + 2], "little")
+            if size == 0:
+                break
+            item = data[offset + 2:offset + size]
+            offset += size
+            if not item:
+                continue
+
+            item_type = item[0] & 0x70
+            if item_type == 0x20:  # volume, e.g. "C:\"
+                names.append(ShellLink.__cstring(item, 1, codepage))
+            elif item_type == 0x30:  # file entry
+                unicode = bool(item[0] & 0x04)
+                if unicode:
+                    short_name = ShellLink.__wstring(item, 12)
+                    name_end = 12 + (len(short_name) + 1) * 2
+                else:
+                    short_name = ShellLink.__cstring(item, 12, codepage)
+                    name_end = 12 + len(short_name.encode(codepage, errors="replace")) + 1
+                    name_end += name_end % 2
+                names.append(ShellLink.__file_entry_long_name(item, name_end) or short_name)
+        return names
+
+    @staticmethod
+    def __file_entry_long_name(item: memoryview, offset: int) -> Union[str, None]:
+        """Read the long name from the 0xBEEF0004 extension block, if any."""
+        if offset + 8 > len(item):
+            return None
+        size, version, signature = struct.unpack_from("<HHI", item, offset)
+        if signature != 0xBEEF0004 or offset + size > len(item):
+            return None
+
+        name_offset = {3: 0x14, 7: 0x26, 8: 0x2A}.get(version, 0x2E if version >= 9 else None)
+        if name_offset is None:
+            return None
+        return ShellLink.__wstring(item[:offset + size], offset + name_offset) or None
+
+    @staticmethod
+    def __id_list_path(names: list) -> Union[str, None]:
+        if not names or not names[0].endswith(":\\"):
+            return None
+        return names[0] + "\\".join(names[1:])
+
+    @staticmethod
+    def __parse_extra_data(stream: _Stream, codepage: str) -> Union[str, None]:
+        """Return the target of the EnvironmentVariableDataBlock, if any."""
+        path = None
+        while True:
+            try:
+                size = stream.read_uint(4)
+            except ShellLinkError:
+                break  # the terminal block is optional for some writers
+            if size < 8:
+                break
+
+            block = stream.read(size - 4)
+            signature = int.from_bytes(block[0:4], "little")
+            if signature == ShellLink.ENVIRONMENT_VARIABLE_BLOCK and size >= 0x314:
+                path = ShellLink.__wstring(block, 4 + 260) \
+                    or ShellLink.__cstring(block[:4 + 260], 4, codepage)
+        return path or None
@@ -0,0 +1,144 @@
+# network.py
+#
+# Copyright 2020 brombinmirko <send@mirko.pm>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import threading
+import requests
+from urllib.parse import urlparse
+from urllib.request import url2pathname
+from requests.adapters import BaseAdapter, HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+class FileAdapter(BaseAdapter):
+    """Serve file:// URLs (e.g. the local repositories) like HTTP ones."""
+
+    def send(self, request, **kwargs):
+        response = requests.Response()
+        response.url = request.url
+        response.request = request
+        path = url2pathname(urlparse(request.url).path)
+        try:
+            response.raw = open(path, "rb")
+            response.status_code = 200
+            response.headers["Content-Length"] = str(os.fstat(response.raw.fileno()).st_size)
+        except FileNotFoundError:
+            response.status_code = 404
+        except OSError:
+            response.status_code = 403
+        return response
+
+    def close(self):
+        pass
+
+
+def get_retry(methods: tuple = ("GET", "HEAD"), **kwargs) -> Retry:
+    """Return a Retry for the given methods, allowed_methods is method_whitelist before urllib3 1.26."""
+    try:
+        return Retry(allowed_methods=methods, **kwargs)
+    except TypeError:
+        return Retry(method_whitelist=methods, **kwargs)
+
+
+class HttpClient:
+    """
+    The HTTP client of the backend: a session shared by all the network
+    calls, so the connections (and TLS sessions) to the repositories and
+    GitHub are kept alive and reused. Requests get default timeouts, the
+    same User-Agent, and are retried with an exponential backoff on
+    connection errors and on 429/5xx responses (respecting Retry-After).
+    The transport is pluggable: mount an adapter for an URL prefix, e.g.
+    to serve the requests from a local stand-in server in tests.
+    Requests made with retry=False (e.g. the connection probe) use a
+    second session without retries, so they fail within their timeout.
+    """
+
+    # some mirrors serve a page instead of the file to the browsers
+    user_agent = "curl/7.79.1"
+    timeout = (10, 30)  # connect, read
+    retries = get_retry(
+        total=3,
+        connect=2,
+        read=2,
+        status=3,
+        backoff_factor=0.5,
+        status_forcelist=(429, 500, 502, 503, 504),
+        raise_on_status=False
+    )
+    pool_connections = 8
+    pool_maxsize = 16
+
+    __sessions = {}  # retry: session
+    __transports = {}  # url prefix: adapter
+    __lock = threading.Lock()
+
+    @staticmethod
+    def get_session(retry: bool = True) -> requests.Session:
+        """Return the shared session (or the one without retries), created on first use."""
+        with HttpClient.__lock:
+            if retry not in HttpClient.__sessions:
+                session = requests.Session()
+                adapter = HTTPAdapter(
+                    pool_connections=HttpClient.pool_connections,
+                    pool_maxsize=HttpClient.pool_maxsize,
+                    max_retries=HttpClient.retries if retry else 0
+                )
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                session.mount("file://", FileAdapter())
+                for prefix, transport in HttpClient.__transports.items():
+                    session.mount(prefix, transport)
+                session.headers.update({"User-Agent": HttpClient.user_agent})
+                HttpClient.__sessions[retry] = session
+            return HttpClient.__sessions[retry]
+
+    @staticmethod
+    def mount(prefix: str, transport: BaseAdapter):
+        """Use the given transport (a requests adapter) for the URLs starting with prefix."""
+        with HttpClient.__lock:
+            HttpClient.__transports[prefix] = transport
+            for session in HttpClient.__sessions.values():
+                session.mount(prefix, transport)
+
+    @staticmethod
+    def reset():
+        """Close the connections and drop the mounted transports."""
+        with HttpClient.__lock:
+            for session in HttpClient.__sessions.values():
+                session.close()
+            HttpClient.__sessions = {}
+            HttpClient.__transports = {}
+
+    @staticmethod
+    def request(method: str, url: str, retry: bool = True, **kwargs) -> requests.Response:
+        kwargs.setdefault("timeout", HttpClient.timeout)
+        return HttpClient.get_session(retry).request(method, url, **kwargs)
+
+    @staticmethod
+    def get(url: str, **kwargs) -> requests.Response:
+        return HttpClient.request("GET", url, **kwargs)
+
+    @staticmethod
+    def head(url: str, **kwargs) -> requests.Response:
+        return HttpClient.request("HEAD", url, **kwargs)
+
+    @staticmethod
+    def fetch(url: str, **kwargs) -> bytes:
+        """Return the content of the URL, raise a RequestException on failure."""
+        with HttpClient.get(url, **kwargs) as response:
+            response.raise_for_status()
+            return response.content
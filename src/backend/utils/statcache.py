@@ -0,0 +1,123 @@
+# statcache.py
+#
+# Copyright 2020 brombinmirko <send@mirko.pm>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import time
+import json
+import hashlib
+
+from bottles.backend.logger import Logger  # pyright: reportMissingImports=false
+from bottles.backend.globals import Paths
+from bottles.backend.utils.file import FileUtils
+
+logging = Logger()
+
+
+class StatCache:
+    """
+    Persistent cache of the file checksums of a bottle, keyed by the
+    size, mtime and inode of each file, so only new or modified files
+    are hashed again. Files modified in the last seconds before the
+    scan are not cached, as a change in the same mtime tick would not
+    be noticed (like git does with racily clean entries).
+    """
+
+    path = f"{Paths.cache}/states"
+    racy_window = 2 * 10 ** 9  # ns
+    __version = 1
+
+    def __init__(self, bottle_path: str):
+        self.bottle_path = bottle_path
+        _hash = hashlib.sha1(bottle_path.encode("utf-8")).hexdigest()[:16]
+        self.__cache_path = os.path.join(self.path, f"{_hash}.json")
+
+    def get_checksums(self, files: dict) -> dict:
+        """
+        Take a dict of key: path and return a dict of key: checksum,
+        files which cannot be read are left out. Entries of the files
+        not given are dropped from the cache.
+        """
+        start = time.time_ns()
+        cached = self.__load()
+        updated = {}
+        checksums = {}
+        stats = {}
+        missing = []
+
+        for key, path in files.items():
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+
+            stats[key] = [st.st_size, st.st_mtime_ns, st.st_ino]
+            entry = cached.get(key)
+            if entry is not None and entry[:3] == stats[key]:
+                checksums[key] = entry[3]
+            else:
+                missing.append(key)
+
+        hashes = FileUtils.get_checksums([files[key] for key in missing])
+        for key in missing:
+            checksum = hashes.get(files[key])
+            if checksum is not None:
+                checksums[key] = checksum
+
+        for key, checksum in checksums.items():
+            if stats[key][1] < start - self.racy_window:
+                updated[key] = stats[key] + [checksum]
+
+        logging.info(f"Hashed [{len(missing)}] of [{len(checksums)}] files.", )
+        if updated != cached:
+            self.__save(updated)
+        return checksums
+
+    def invalidate(self):
+        try:
+            os.remove(self.__cache_path)
+        except FileNotFoundError:
+            pass
+
+    def __load(self) -> dict:
+        try:
+            with open(self.__cache_path, "r") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError):
+            logging.warning("Files cache is corrupted, it will be regenerated.", )
+            return {}
+
+        if not isinstance(data, dict) \
+                or data.get("version") != StatCache.__version \
+                or data.get("bottle") != self.bottle_path:
+            return {}
+        return data.get("files", {})
+
+    def __save(self, files: dict):
+        tmp_path = f"{self.__cache_path}.tmp"
+        try:
+            os.makedirs(self.path, exist_ok=True)
+            with open(tmp_path, "w") as f:
+                json.dump({
+                    "version": StatCache.__version,
+                    "bottle": self.bottle_path,
+                    "files": files
+                }, f)
+            os.replace(tmp_path, self.__cache_path)
+        except OSError as e:
+            logging.error(f"Cannot write the files cache: {e}", )
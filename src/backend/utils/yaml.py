@@ -0,0 +1,50 @@
+# yaml.py
+#
+# Copyright 2020 brombinmirko <send@mirko.pm>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+YAML serialization used by the whole backend. It is a drop-in for the
+few PyYAML functions we use, so it can be imported as:
+
+    from bottles.backend.utils import yaml
+
+The libyaml based CSafeLoader/CSafeDumper are used when PyYAML is
+built with them, otherwise it falls back to the pure Python ones.
+"""
+
+import yaml as _yaml
+
+try:
+    from yaml import CSafeLoader as SafeLoader, CSafeDumper as SafeDumper
+    accelerated = True
+except ImportError:
+    from yaml import SafeLoader, SafeDumper
+    accelerated = False
+
+YAMLError = _yaml.YAMLError
+
+
+def safe_load(stream):
+    """Parse the first document of a stream (str, bytes or file)."""
+    return _yaml.load(stream, Loader=SafeLoader)
+
+
+def dump(data, stream=None, **kwargs):
+    """
+    Serialize data to the given stream, or return it as a string if
+    no stream is given. Accepts the same keyword arguments as yaml.dump.
+    """
+    return _yaml.dump(data, stream, Dumper=SafeDumper, **kwargs)
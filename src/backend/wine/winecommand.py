@@ -4,6 +4,7 @@ from typing import NewType
 
 from bottles.backend.utils.generic import detect_encoding  # pyright: reportMissingImports=false
 from bottles.backend.managers.runtime import RuntimeManager
+from bottles.backend.managers.inventory import InventoryManager
 from bottles.backend.utils.terminal import TerminalUtils
 from bottles.backend.utils.manager import ManagerUtils
 from bottles.backend.utils.display import DisplayUtils
@@ -342,9 +343,10 @@ class WineCommand:
             If the runner is Proton, set the pat to /dist or /files 
             based on check if files exists.
             '''
-            _runner = f"{runner}/files"
-            if os.path.exists(f"{Paths.runners}/{runner}/dist"):
-                _runner = f"{runner}/dist"
+            _proton = InventoryManager.get_entry("runners", runner).get("proton")
+            if _proton is None and os.path.exists(f"{Paths.runners}/{runner}/dist"):
+                _proton = "dist"
+            _runner = f"{runner}/{_proton or 'files'}"
             runner = f"{Paths.runners}/{_runner}/bin/wine"
 
         elif config.get("Environment", "") == "Steam":
@@ -18,11 +18,11 @@
 import os
 import json
 import webbrowser
-import urllib.request
 from urllib.parse import quote
 from gi.repository import Gtk, Handy
 
 from bottles.params import VERSION  # pyright: reportMissingImports=false
+from bottles.backend.utils.network import HttpClient
 
 
 class SimilarReportEntry(Gtk.Box):
@@ -143,9 +143,8 @@ class CrashReportDialog(Handy.Window):
         similar_issues = []
         api_url = "https://api.github.com/repos/bottlesdevs/Bottles/issues?filter=all&state=all"
         try:
-            with urllib.request.urlopen(api_url) as r:
-                data = r.read().decode("utf-8")
-                data = json.loads(data)
+            data = HttpClient.fetch(api_url).decode("utf-8")
+            data = json.loads(data)
 
             for d in data:
                 similarity = CrashReportDialog.__get_similarity(log, d)
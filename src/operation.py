@@ -77,6 +77,16 @@ class TaskEntry(Handy.ActionRow):
             self.spinner_task.stop()
             self.remove()
 
+    def update_queue(self, position):
+        """Show the position of the task in the downloads queue."""
+        if not self.label_task_status.get_visible():
+            self.label_task_status.set_visible(True)
+
+        if position > 0:
+            self.label_task_status.set_text(_("Queued ({0})").format(position))
+        else:
+            self.label_task_status.set_text(_("Calculating..."))
+
     def remove(self):
         tasks = self.list_tasks.get_children()
         if len(tasks) <= 1:
@@ -115,6 +125,10 @@ class OperationManager:
                 count, block_size, total_size, completed
             )
 
+    def update_task_queue(self, task_id, position):
+        if self.get_task(task_id):
+            self.__tasks[task_id].update_queue(position)
+
     def remove_task(self, task_id):
         if self.get_task(task_id):
             self.__tasks[task_id].remove()
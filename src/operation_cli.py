@@ -15,6 +15,9 @@ class OperationManager:
                     ):
         pass
 
+    def update_task_queue(self, task_id, position):
+        pass
+
     def remove_task(self, task_id):
         pass
 
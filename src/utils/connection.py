@@ -15,12 +15,15 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-import urllib.request
+import time
+import threading
+import requests
 
-from datetime import datetime
 from gettext import gettext as _
+from gi.repository import GLib
 
 from bottles.backend.logger import Logger  # pyright: reportMissingImports=false
+from bottles.backend.utils.network import HttpClient
 
 logging = Logger()
 
@@ -30,37 +33,75 @@ class ConnectionUtils:
     This class is used to check the connection, pinging the official
     Bottles's website. If the connection is offline, the user will be
     notified and False will be returned, otherwise True.
+    The connection state is shared by all the instances and cached for
+    ttl seconds: an expired state is refreshed in background while the
+    cached one is returned, so callers never wait for the probe once
+    the state is known (and fail fast when the network is down).
     """
     status = None
     last_check = None
+    ttl = 60
+    timeout = 5
+    __lock = threading.Lock()
+    __refreshing = False
 
     def __init__(self, window=None, **kwargs):
         super().__init__(**kwargs)
         self.window = window
 
-    def check_connection(self, show_notification=False):
-        # check connection using gethostbyname, check if it hangs, then raise
-        try:
-            urllib.request.urlopen('https://usebottles.com/', timeout=5)
-            if self.window is not None:
-                self.window.toggle_btn_noconnection(False)
+    def check_connection(self, show_notification=False, force=False):
+        """
+        Return the connection state. Use force to probe the connection
+        now, ignoring the cached state (e.g. on user request).
+        """
+        cls = ConnectionUtils
+
+        if force or cls.status is None:
+            self.__set_status(self.__probe())
+        elif time.monotonic() - cls.last_check > cls.ttl:
+            with cls.__lock:
+                refresh = not cls.__refreshing
+                cls.__refreshing = True
+            if refresh:
+                threading.Thread(target=self.__refresh, daemon=True).start()
+
+        self.__notify(show_notification)
+        return cls.status
 
-            self.last_check = datetime.now()
-            self.status = True
+    def __refresh(self):
+        self.__set_status(self.__probe())
+        with ConnectionUtils.__lock:
+            ConnectionUtils.__refreshing = False
+        self.__notify()
 
+    def __probe(self) -> bool:
+        # the probe runs outside the lock, callers never wait for another one
+        try:
+            HttpClient.head('https://usebottles.com/', retry=False, timeout=self.timeout).close()
             return True
-        except urllib.error.URLError:
-            logging.warning("Connection status: offline …", )
-            if self.window is not None:
-                self.window.toggle_btn_noconnection(True)
-
-            if show_notification and self.window is not None:
-                self.window.send_notification(
-                    title="Bottles",
-                    text=_("You are offline, unable to download."),
-                    image="network-wireless-disabled-symbolic"
-                )
-            self.last_check = datetime.now()
-            self.status = False
-
-        return False
+        except (requests.exceptions.RequestException, OSError):
+            return False
+
+    @staticmethod
+    def __set_status(status: bool):
+        with ConnectionUtils.__lock:
+            if not status and ConnectionUtils.status is not False:
+                logging.warning("Connection status: offline …", )
+
+            ConnectionUtils.last_check = time.monotonic()
+            ConnectionUtils.status = status
+
+    def __notify(self, show_notification=False):
+        # called from the refresh thread and the startup workers too
+        if self.window is None:
+            return
+
+        GLib.idle_add(self.window.toggle_btn_noconnection, not ConnectionUtils.status)
+
+        if show_notification and not ConnectionUtils.status:
+            GLib.idle_add(
+                self.window.send_notification,
+                "Bottles",
+                _("You are offline, unable to download."),
+                "network-wireless-disabled-symbolic"
+            )
@@ -24,6 +24,7 @@ from bottles.utils.threading import RunAsync  # pyright: reportMissingImports=fa
 from bottles.backend.runner import Runner, gamemode_available, gamescope_available, mangohud_available, obs_vkc_available
 from bottles.backend.managers.runtime import RuntimeManager
 from bottles.backend.managers.steam import SteamManager
+from bottles.backend.managers.transaction import ConfigWriter
 from bottles.backend.utils.manager import ManagerUtils
 
 from bottles.dialogs.envvars import EnvVarsDialog
@@ -108,6 +109,9 @@ class PreferencesView(Gtk.ScrolledWindow):
         self.window = window
         self.manager = window.manager
         self.config = config
+        self.__config_writer = ConfigWriter(self.manager)
+
+        self.connect("destroy", self.__config_writer.flush)
 
         self.btn_overrides.connect("clicked", self.__show_dll_overrides_view)
         self.btn_manage_runners.connect("clicked", self.window.show_prefs_view)
@@ -241,6 +245,7 @@ class PreferencesView(Gtk.ScrolledWindow):
         self.combo_latencyflex.handler_unblock_by_func(self.__set_latencyflex)
 
     def set_config(self, config):
+        self.__config_writer.flush()
         self.config = config
         parameters = self.config.get("Parameters")
 
@@ -408,43 +413,39 @@ class PreferencesView(Gtk.ScrolledWindow):
 
     def __toggle_dxvk_hud(self, widget, state):
         """Toggle the DXVK HUD for current bottle"""
-        new_config = self.manager.update_config(
+        self.config = self.__config_writer.update(
             config=self.config,
             key="dxvk_hud",
             value=state,
             scope="Parameters"
         )
-        self.config = new_config
 
     def __toggle_mangohud(self, widget, state):
         """Toggle the Mangohud for current bottle"""
-        new_config = self.manager.update_config(
+        self.config = self.__config_writer.update(
             config=self.config,
             key="mangohud",
             value=state,
             scope="Parameters"
         )
-        self.config = new_config
 
     def __toggle_obsvkc(self, widget, state):
         """Toggle the OBS Vulkan capture for current bottle"""
-        new_config = self.manager.update_config(
+        self.config = self.__config_writer.update(
             config=self.config,
             key="obsvkc",
             value=state,
             scope="Parameters"
         )
-        self.config = new_config
 
     def __toggle_vkbasalt(self, widget, state):
         """Toggle the vkBasalt for current bottle"""
-        new_config = self.manager.update_config(
+        self.config = self.__config_writer.update(
             config=self.config,
             key="vkbasalt",
             value=state,
             scope="Parameters"
         )
-        self.config = new_config
 
     def __toggle_vkd3d(self, widget=False, state=False):
         """Install/Uninstall VKD3D from the bottle"""
@@ -508,63 +509,57 @@ class PreferencesView(Gtk.ScrolledWindow):
 
     def __toggle_gamemode(self, widget=False, state=False):
         """Toggle the gamemode for current bottle"""
-        new_config = self.manager.update_config(
+        self.config = self.__config_writer.update(
             config=self.config,
             key="gamemode",
             value=state,
             scope="Parameters"
         )
-        self.config = new_config
 
     def __toggle_gamescope(self, widget=False, state=False):
         """Toggle the gamescope for current bottle"""
-        new_config = self.manager.update_config(
+        self.config = self.__config_writer.update(
             config=self.config,
             key="gamescope",
             value=state,
             scope="Parameters"
         )
-        self.config = new_config
 
     def __toggle_fsr(self, widget, state):
         """Toggle the FSR for current bottle"""
-        new_config = self.manager.update_config(
+        self.config = self.__config_writer.update(
             config=self.config,
             key="fsr",
             value=state,
             scope="Parameters"
         )
-        self.config = new_config
 
     def __toggle_runtime(self, widget, state):
         """Toggle the Bottles runtime for current bottle"""
-        new_config = self.manager.update_config(
+        self.config = self.__config_writer.update(
             config=self.config,
             key="use_runtime",
             value=state,
             scope="Parameters"
         )
-        self.config = new_config
 
     def __toggle_steam_runtime(self, widget, state):
         """Toggle the Steam runtime for current bottle"""
-        new_config = self.manager.update_config(
+        self.config = self.__config_writer.update(
             config=self.config,
             key="use_steam_runtime",
             value=state,
             scope="Parameters"
         )
-        self.config = new_config
 
     def __toggle_discrete_gpu(self, widget, state):
         """Toggle the discrete GPU for current bottle"""
-        new_config = self.manager.update_config(
+        self.config = self.__config_writer.update(
             config=self.config,
             key="discrete_gpu",
             value=state,
             scope="Parameters"
         )
-        self.config = new_config
 
     def __toggle_virt_desktop(self, widget, state):
         """Toggle the virtual desktop option."""
@@ -787,23 +782,21 @@ class PreferencesView(Gtk.ScrolledWindow):
 
     def __toggle_pulse_latency(self, widget, state):
         """Set the pulse latency to use for the bottle"""
-        new_config = self.manager.update_config(
+        self.config = self.__config_writer.update(
             config=self.config,
             key="pulseaudio_latency",
             value=state,
             scope="Parameters"
         )
-        self.config = new_config
 
     def __toggle_fixme(self, widget, state):
         """Set the WINE logging level to use for the bottle"""
-        new_config = self.manager.update_config(
+        self.config = self.__config_writer.update(
             config=self.config,
             key="fixme_logs",
             value=state,
             scope="Parameters"
         )
-        self.config = new_config
 
     def __toggle_x11_reg_key(self, widget, state, rkey, ckey):
         """Update x11 registry keys"""
@@ -21,6 +21,8 @@ from gi.repository import Gtk
 
 from bottles.utils.threading import RunAsync  # pyright: reportMissingImports=false
 from bottles.utils.common import open_doc_url
+from bottles.backend.utils.file import FileUtils
+from bottles.dialogs.generic import MessageDialog
 from bottles.widgets.state import StateEntry
 
 
@@ -34,6 +36,7 @@ class VersioningView(Gtk.ScrolledWindow):
     pop_state = Gtk.Template.Child()
     btn_save = Gtk.Template.Child()
     btn_help = Gtk.Template.Child()
+    btn_prune = Gtk.Template.Child()
     entry_state_comment = Gtk.Template.Child()
     hdy_status = Gtk.Template.Child()
 
@@ -49,6 +52,7 @@ class VersioningView(Gtk.ScrolledWindow):
         self.config = config
 
         self.btn_save.connect("clicked", self.add_state)
+        self.btn_prune.connect("clicked", self.prune_states)
         self.entry_state_comment.connect(
             'key-release-event', self.check_entry_state_comment
         )
@@ -125,3 +129,60 @@ class VersioningView(Gtk.ScrolledWindow):
             )
             self.entry_state_comment.set_text("")
             self.pop_state.popdown()
+
+    def prune_states(self, widget):
+        """
+        This function ask the versioning manager which states the
+        retention policy of the bottle would remove (the last 10 are
+        kept if the bottle has no policy) and, once the user confirms,
+        remove them and collect the unreferenced files.
+        """
+        policy = self.versioning_manager.get_retention_policy(self.config)
+        if not any(policy.values()):
+            policy["keep_last"] = 10
+
+        def prune(result, error):
+            if result and result.status:
+                self.window.send_notification(
+                    title=_("States pruned"),
+                    text=_("{0} reclaimed.").format(
+                        FileUtils.get_human_size(result.data["reclaimed"])
+                    ),
+                    image="edit-clear-all-symbolic"
+                )
+            self.btn_prune.set_sensitive(True)
+
+        def confirm(result, error):
+            if not result or not result.status or len(result.data["removed"]) == 0:
+                self.btn_prune.set_sensitive(True)
+                return
+
+            dialog = MessageDialog(
+                parent=self.window,
+                title=_("Confirm pruning"),
+                message=_("{0} states will be removed, reclaiming {1}.").format(
+                    len(result.data["removed"]),
+                    FileUtils.get_human_size(result.data["reclaimed"])
+                )
+            )
+            response = dialog.run()
+            dialog.destroy()
+
+            if response == Gtk.ResponseType.OK:
+                RunAsync(
+                    task_func=self.versioning_manager.prune_states,
+                    callback=prune,
+                    config=self.config,
+                    **policy
+                )
+            else:
+                self.btn_prune.set_sensitive(True)
+
+        self.btn_prune.set_sensitive(False)
+        RunAsync(
+            task_func=self.versioning_manager.prune_states,
+            callback=confirm,
+            config=self.config,
+            dry_run=True,
+            **policy
+        )
@@ -118,7 +118,7 @@ class LibraryEntry(Gtk.Box):
             self.config,
             exec_path=self.program["path"],
             args=self.program["arguments"],
-            cwd=self.program["folder"],
+            cwd=self.program.get("working_dir") or self.program["folder"],
             post_script=self.program.get("script", None),
             terminal=with_terminal
         )
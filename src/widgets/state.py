@@ -20,7 +20,8 @@ from gi.repository import Gtk, GLib, Handy
 from gettext import gettext as _
 
 from bottles.utils.threading import RunAsync  # pyright: reportMissingImports=false
-from bottles.dialogs.generic import SourceDialog
+from bottles.backend.utils.file import FileUtils
+from bottles.dialogs.generic import SourceDialog, MessageDialog
 
 
 @Gtk.Template(resource_path='/com/usebottles/bottles/state-entry.ui')
@@ -65,7 +66,8 @@ class StateEntry(Handy.ActionRow):
 
     def set_state(self, widget):
         """
-        Set the bottle state to this one.
+        Set the bottle state to this one, once the user confirmed the
+        restore plan.
         """
         for w in widget.get_children():
             w.destroy()
@@ -75,11 +77,66 @@ class StateEntry(Handy.ActionRow):
 
         self.spinner.show()
         GLib.idle_add(self.spinner.start)
+
+        def confirm(result, error):
+            if not result or not result.status:
+                self.set_completed(False)
+                return
+
+            plan = result.data["plan"]
+            if plan["missing"]:
+                dialog = MessageDialog(
+                    parent=self.window,
+                    title=_("Cannot restore"),
+                    message=_("The content of {0} files of this state is missing.").format(
+                        len(plan["missing"])
+                    ),
+                    log="\n".join(plan["missing"])
+                )
+                dialog.run()
+                dialog.destroy()
+                self.set_completed(False)
+                return
+
+            message = _("{0} files will be removed, {1} replaced and {2} added ({3} to write).").format(
+                len(plan["remove"]),
+                len(plan["replace"]),
+                len(plan["add"]),
+                FileUtils.get_human_size(plan["bytes"])
+            )
+            if not plan["recursive"]:
+                message += "\n" + _("This state is older than the recursive index, "
+                                    "only the files at the top of drive_c are restored.")
+            dialog = MessageDialog(
+                parent=self.window,
+                title=_("Confirm restore"),
+                message=message,
+                log="\n".join(
+                    [f"- {f}" for f in plan["remove"]]
+                    + [f"~ {f}" for f in plan["replace"]]
+                    + [f"+ {f}" for f in plan["add"]]
+                ) or False
+            )
+            response = dialog.run()
+            dialog.destroy()
+
+            if response != Gtk.ResponseType.OK:
+                self.set_completed(False)
+                return
+
+            RunAsync(
+                task_func=self.versioning_manager.set_state,
+                config=self.config,
+                state_id=self.state[0],
+                after=self.set_completed
+            )
+
         RunAsync(
             task_func=self.versioning_manager.set_state,
+            callback=confirm,
             config=self.config,
             state_id=self.state[0],
-            after=self.set_completed
+            dry_run=True
         )
 
     def open_index(self, widget):
@@ -98,10 +155,18 @@ class StateEntry(Handy.ActionRow):
             message=plain_state
         )
 
-    def set_completed(self):
+    def set_completed(self, status: bool = True):
         """
-        Set completed status to the widget.
+        Set completed status to the widget, or make the restore
+        available again if it failed or was cancelled.
         """
         self.spinner.stop()
-        self.btn_restore.set_visible(False)
-        self.set_sensitive(True)
+        if status:
+            self.btn_restore.set_visible(False)
+            self.set_sensitive(True)
+            return
+
+        self.btn_restore.remove(self.spinner)
+        self.btn_restore.add(Gtk.Image.new_from_icon_name("document-open-recent-symbolic", Gtk.IconSize.BUTTON))
+        self.btn_restore.show_all()
+        self.btn_restore.set_sensitive(True)
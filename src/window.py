@@ -212,7 +212,7 @@ class MainWindow(Handy.ApplicationWindow):
         If true, the manager checks will be performed, unlocking all the
         features locked for no internet connection.
         """
-        if self.utils_conn.check_connection():
+        if self.utils_conn.check_connection(force=True):
             self.manager.checks(install_latest=False, first_run=True)
 
     def toggle_btn_noconnection(self, status):
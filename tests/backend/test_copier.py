@@ -0,0 +1,169 @@
+# test_copier.py
+#
+# Copyright 2020 brombinmirko <send@mirko.pm>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import types
+import errno
+
+import pytest
+
+from bottles.backend.utils import copier
+from bottles.backend.utils.copier import FileCopier
+
+
+def fail(code: int):
+    def _fail(*args, **kwargs):
+        raise OSError(code, os.strerror(code))
+    return _fail
+
+
+def read(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+
+@pytest.fixture
+def source(tmp_path):
+    path = tmp_path / "source.bin"
+    path.write_bytes(os.urandom(3 * 1024 * 1024 + 123))
+    return str(path)
+
+
+@pytest.fixture(autouse=True)
+def reset_reflink_cache():
+    FileCopier._FileCopier__no_reflink.clear()
+    yield
+    FileCopier._FileCopier__no_reflink.clear()
+
+
+@pytest.fixture
+def no_reflink(monkeypatch):
+    monkeypatch.setattr(copier, "fcntl", types.SimpleNamespace(ioctl=fail(errno.EOPNOTSUPP)))
+
+
+@pytest.fixture
+def no_copy_file_range(monkeypatch, no_reflink):
+    monkeypatch.setattr(os, "copy_file_range", fail(errno.EXDEV), raising=False)
+
+
+@pytest.fixture
+def no_sendfile(monkeypatch, no_copy_file_range):
+    monkeypatch.setattr(os, "sendfile", fail(errno.EINVAL), raising=False)
+
+
+def test_copy(source, tmp_path):
+    target = str(tmp_path / "target.bin")
+    strategy = FileCopier.copy_file(source, target)
+
+    assert strategy in [FileCopier.REFLINK, FileCopier.COPY_FILE_RANGE, FileCopier.SENDFILE, FileCopier.COPY]
+    assert read(target) == read(source)
+
+
+def test_fallback_without_reflink(source, tmp_path, no_reflink):
+    target = str(tmp_path / "target.bin")
+    strategy = FileCopier.copy_file(source, target)
+
+    assert strategy != FileCopier.REFLINK
+    assert read(target) == read(source)
+
+
+def test_fallback_without_copy_file_range(source, tmp_path, no_copy_file_range):
+    target = str(tmp_path / "target.bin")
+    strategy = FileCopier.copy_file(source, target)
+
+    assert strategy in [FileCopier.SENDFILE, FileCopier.COPY]
+    assert read(target) == read(source)
+
+
+def test_fallback_to_plain_copy(source, tmp_path, no_sendfile):
+    target = str(tmp_path / "target.bin")
+    strategy = FileCopier.copy_file(source, target)
+
+    assert strategy == FileCopier.COPY
+    assert read(target) == read(source)
+
+
+def test_fallback_after_partial_copy_file_range(source, tmp_path, monkeypatch, no_reflink):
+    """A filesystem reporting 0 before the end hands over to the next strategy from scratch."""
+    calls = []
+
+    def _copy_file_range(src_fd, dst_fd, count):
+        calls.append(count)
+        if len(calls) > 1:
+            return 0
+        data = os.read(src_fd, 1024 * 1024)
+        return os.write(dst_fd, data)
+
+    monkeypatch.setattr(os, "copy_file_range", _copy_file_range, raising=False)
+    monkeypatch.setattr(os, "sendfile", fail(errno.EINVAL), raising=False)
+    target = str(tmp_path / "target.bin")
+    strategy = FileCopier.copy_file(source, target)
+
+    assert strategy == FileCopier.COPY
+    assert read(target) == read(source)
+
+
+def test_reflink_support_is_remembered(source, tmp_path, monkeypatch):
+    calls = []
+
+    def _ioctl(*args):
+        calls.append(args)
+        raise OSError(errno.EOPNOTSUPP, os.strerror(errno.EOPNOTSUPP))
+
+    monkeypatch.setattr(copier, "fcntl", types.SimpleNamespace(ioctl=_ioctl))
+    for i in range(2):
+        FileCopier.copy_file(source, str(tmp_path / f"target-{i}.bin"))
+
+    assert len(calls) == 1
+
+
+def test_unexpected_error_is_raised(source, tmp_path, monkeypatch):
+    monkeypatch.setattr(copier, "fcntl", types.SimpleNamespace(ioctl=fail(errno.EIO)))
+
+    with pytest.raises(OSError):
+        FileCopier.copy_file(source, str(tmp_path / "target.bin"))
+
+
+def test_immutable_hardlink(source, tmp_path):
+    target = str(tmp_path / "target.bin")
+    strategy = FileCopier.copy_file(source, target, immutable=True)
+
+    assert strategy == FileCopier.HARDLINK
+    assert os.stat(target).st_ino == os.stat(source).st_ino
+
+
+def test_immutable_fallback_across_devices(source, tmp_path, monkeypatch, no_sendfile):
+    monkeypatch.setattr(os, "link", fail(errno.EXDEV))
+    target = str(tmp_path / "target.bin")
+    strategy = FileCopier.copy_file(source, target, immutable=True)
+
+    assert strategy == FileCopier.COPY
+    assert os.stat(target).st_ino != os.stat(source).st_ino
+    assert read(target) == read(source)
+
+
+def test_copy_tree(source, tmp_path, no_sendfile):
+    tree = tmp_path / "tree"
+    (tree / "a" / "b").mkdir(parents=True)
+    (tree / "a" / "b" / "file.bin").write_bytes(read(source))
+    (tree / "top.txt").write_text("top")
+
+    strategies = FileCopier.copy_tree(str(tree), str(tmp_path / "copy"))
+
+    assert strategies == {FileCopier.COPY: 2}
+    assert read(str(tmp_path / "copy" / "a" / "b" / "file.bin")) == read(source)
+    assert (tmp_path / "copy" / "top.txt").read_text() == "top"
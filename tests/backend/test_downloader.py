@@ -0,0 +1,286 @@
+# test_downloader.py
+#
+# Copyright 2020 brombinmirko <send@mirko.pm>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import io
+import os
+import re
+import hashlib
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import pytest
+import requests
+from requests.adapters import BaseAdapter
+
+from bottles.backend.managers.artifacts import ArtifactCache
+from bottles.backend.utils.network import HttpClient
+
+
+def read(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+
+class Resource:
+    """The file served by the test server, which can be changed or cut."""
+
+    def __init__(self, content: bytes, ranges: bool = True):
+        self.content = content
+        self.etag = '"1"'
+        self.ranges = ranges
+        self.cut = None  # bytes sent before closing each response
+        self.gate = threading.Event()
+        self.gate.set()
+        self.requests = []  # Range header of each request
+
+    def change(self, content: bytes):
+        self.content = content
+        self.etag = f'"{int(self.etag.strip(chr(34))) + 1}"'
+
+
+def make_handler(resource: Resource):
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            resource.requests.append(self.headers.get("Range"))
+            resource.gate.wait()
+            content = resource.content
+            size = len(content)
+            start, end = 0, size - 1
+            match = re.match(r"bytes=(\d+)-(\d*)", self.headers.get("Range", ""))
+            if_range = self.headers.get("If-Range")
+            if resource.ranges and match and if_range in (None, resource.etag):
+                start = int(match.group(1))
+                end = min(int(match.group(2) or end), end)
+                self.send_response(206)
+                self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+            else:
+                self.send_response(200)
+            self.send_header("ETag", resource.etag)
+            self.send_header("Content-Length", str(end - start + 1))
+            self.end_headers()
+
+            data = content[start:end + 1]
+            if resource.cut is not None:
+                data = data[:resource.cut]
+                self.close_connection = True
+            try:
+                self.wfile.write(data)
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+
+@pytest.fixture
+def payload():
+    return os.urandom(2 * 1024 * 1024 + 321)
+
+
+@pytest.fixture
+def downloader(monkeypatch):
+    pytest.importorskip("gi")
+    from bottles.backend import downloader
+    monkeypatch.setattr(downloader.Downloader, "min_segment_size", 256 * 1024)
+    monkeypatch.setattr(downloader.Downloader, "journal_interval", 64 * 1024)
+    return downloader
+
+
+@pytest.fixture(params=[True, False], ids=["ranges", "no-ranges"])
+def resource(request, payload):
+    return Resource(payload, ranges=request.param)
+
+
+@pytest.fixture
+def url(resource):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(resource))
+    thread = threading.Thread(target=server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_port}/resource.tar.xz"
+    resource.gate.set()
+    server.shutdown()
+    server.server_close()
+
+
+def digests(content: bytes) -> dict:
+    return {a: hashlib.new(a, content).hexdigest() for a in ("md5", "sha256")}
+
+
+def test_download(downloader, url, resource, payload, tmp_path):
+    file = str(tmp_path / "resource.tar.xz")
+    job = downloader.Downloader(url, file, segments=4, algorithms=("md5", "sha256"))
+
+    assert job.download()
+    assert read(file) == payload
+    assert job.digests == digests(payload)
+    assert not os.path.exists(job.part_path)
+    assert not os.path.exists(job.journal_path)
+    if resource.ranges:
+        assert len(resource.requests) == 4  # the first one serves the first segment
+    else:
+        assert resource.requests == ["bytes=0-"]
+
+
+def test_download_resumed(downloader, url, resource, payload, tmp_path, monkeypatch):
+    if not resource.ranges:
+        pytest.skip("only the downloads in segments are resumed")
+    monkeypatch.setattr(downloader.Downloader, "retries", 0)
+    file = str(tmp_path / "resource.tar.xz")
+    job = downloader.Downloader(url, file, segments=4, algorithms=("sha256",))
+
+    resource.cut = 200 * 1024
+    assert not job.download()
+    assert os.path.isfile(job.journal_path)
+
+    resource.cut = None
+    resource.requests.clear()
+    job = downloader.Downloader(url, file, segments=4, algorithms=("sha256",))
+    assert job.download()
+    assert read(file) == payload
+    assert job.digests["sha256"] == digests(payload)["sha256"]
+    # each segment is resumed from where it stopped
+    resumed = [int(re.match(r"bytes=(\d+)-", r).group(1)) for r in resource.requests[1:]]
+    assert len(resumed) == 4 and all(start % (len(payload) // 4 + 1) != 0 for start in resumed)
+
+
+def test_download_resumed_changed(downloader, url, resource, payload, tmp_path, monkeypatch):
+    if not resource.ranges:
+        pytest.skip("only the downloads in segments are resumed")
+    monkeypatch.setattr(downloader.Downloader, "retries", 0)
+    file = str(tmp_path / "resource.tar.xz")
+
+    resource.cut = 200 * 1024
+    assert not downloader.Downloader(url, file, segments=4).download()
+
+    resource.cut = None
+    resource.change(payload[::-1])
+    job = downloader.Downloader(url, file, segments=4, algorithms=("sha256",))
+    assert job.download()
+    assert read(file) == payload[::-1]
+    assert job.digests["sha256"] == digests(payload[::-1])["sha256"]
+
+
+def test_scheduler_merges_requests(downloader, url, resource, payload, tmp_path):
+    from bottles.backend.scheduler import DownloadScheduler
+    file = str(tmp_path / "resource.tar.xz")
+
+    resource.gate.clear()
+    first = DownloadScheduler.submit(url, file, algorithms=("md5",))
+    second = DownloadScheduler.submit(url, file, algorithms=("sha256",))
+    resource.gate.set()
+
+    assert first is second
+    assert first.wait()
+    assert read(file) == payload
+    # sha256 is only added if the download did not start, else the caller hashes the file
+    assert "md5" in first.digests
+    assert all(digest == digests(payload)[a] for a, digest in first.digests.items())
+    assert resource.requests.count("bytes=0-") == 1
+
+
+class StandIn(BaseAdapter):
+    """A transport serving the resource without network, mounted on HttpClient."""
+
+    def __init__(self, content: bytes):
+        super().__init__()
+        self.content = content
+        self.requests = []
+
+    def send(self, request, **kwargs):
+        self.requests.append(request.url)
+        response = requests.Response()
+        response.url = request.url
+        response.request = request
+        response.status_code = 200
+        response.headers["Content-Length"] = str(len(self.content))
+        response.raw = io.BytesIO(self.content)
+        return response
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def stand_in(payload):
+    transport = StandIn(payload)
+    HttpClient.mount("http://stand-in/", transport)
+    yield transport
+    HttpClient.reset()
+
+
+def test_mounted_transport(stand_in, payload):
+    assert HttpClient.fetch("http://stand-in/resource.tar.xz") == payload
+    assert HttpClient.fetch("http://stand-in/resource.tar.xz", retry=False) == payload
+    assert len(stand_in.requests) == 2
+
+
+def test_download_mounted(downloader, stand_in, payload, tmp_path):
+    file = str(tmp_path / "resource.tar.xz")
+    job = downloader.Downloader("http://stand-in/resource.tar.xz", file, algorithms=("md5",))
+
+    assert job.download()
+    assert read(file) == payload
+    assert job.digests == {"md5": digests(payload)["md5"]}
+    assert stand_in.requests == ["http://stand-in/resource.tar.xz"]
+
+
+@pytest.fixture
+def artifact(tmp_path, payload):
+    ArtifactCache.evict(0)
+    path = tmp_path / "artifact.tar.xz"
+    path.write_bytes(payload)
+    return str(path), ArtifactCache.get_key(f"sha256:{hashlib.sha256(payload).hexdigest()}")
+
+
+def test_artifact_add_leaves_a_link(artifact, payload):
+    path, key = artifact
+    target = ArtifactCache.add(key, path, name="artifact.tar.xz")
+
+    assert target == ArtifactCache.get(key)
+    assert ArtifactCache.is_linked(key, path)
+    assert read(path) == payload
+
+
+def test_artifact_added_twice(artifact, payload):
+    path, key = artifact
+    target = ArtifactCache.add(key, path)
+
+    assert ArtifactCache.add(key, path) == target
+    assert not os.path.islink(target)
+    assert ArtifactCache.get(key) == target
+    assert read(path) == payload
+
+
+def test_artifact_without_checksum_not_cached():
+    assert ArtifactCache.get_key(None) is None
+
+
+def test_artifact_evicted(artifact, tmp_path, payload):
+    path, key = artifact
+    target = ArtifactCache.add(key, path)
+    other = str(tmp_path / "other.tar.xz")
+    assert ArtifactCache.link(key, other)
+
+    assert ArtifactCache.evict(0)["freed"] == len(payload)
+    assert not os.path.exists(target)
+    assert ArtifactCache.get(key) is None
+    assert not ArtifactCache.link(key, other)
@@ -0,0 +1,57 @@
+# test_lnk.py
+#
+# Copyright 2020 brombinmirko <send@mirko.pm>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import struct
+import tracemalloc
+
+import pytest
+
+from bottles.backend.utils.lnk import ShellLink, ShellLinkError
+
+
+def header(flags: int = 0) -> bytes:
+    data = bytearray(ShellLink.HEADER_SIZE)
+    data[0:4] = struct.pack("<I", ShellLink.HEADER_SIZE)
+    data[4:20] = ShellLink.LINK_CLSID
+    data[0x14:0x18] = struct.pack("<I", flags)
+    return bytes(data)
+
+
+@pytest.mark.parametrize("content", [
+    header() + struct.pack("<II", 0xFFFFFFF0, ShellLink.ENVIRONMENT_VARIABLE_BLOCK) + bytes(16),
+    header(ShellLink.HAS_LINK_INFO) + struct.pack("<I", 0xFFFFFFF0) + bytes(16),
+    header(ShellLink.HAS_LINK_TARGET_ID_LIST) + struct.pack("<H", 0xFFFF) + bytes(16),
+], ids=["extra-data", "link-info", "id-list"])
+def test_oversized_structure(tmp_path, content):
+    path = tmp_path / "bad.lnk"
+    path.write_bytes(content)
+
+    tracemalloc.start()
+    try:
+        with pytest.raises(ShellLinkError):
+            ShellLink.parse(str(path))
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    assert peak < 1024 * 1024
+
+
+def test_no_extra_data(tmp_path):
+    path = tmp_path / "empty.lnk"
+    path.write_bytes(header())
+
+    assert ShellLink.parse(str(path))["path"] is None
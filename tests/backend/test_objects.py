@@ -0,0 +1,60 @@
+# test_objects.py
+#
+# Copyright 2020 brombinmirko <send@mirko.pm>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import hashlib
+
+import pytest
+
+from bottles.backend.managers.objects import ObjectStore
+
+
+def md5(content: bytes) -> str:
+    return hashlib.md5(content).hexdigest()
+
+
+@pytest.fixture
+def store(tmp_path):
+    return ObjectStore(str(tmp_path / "bottle"))
+
+
+@pytest.fixture
+def source(tmp_path):
+    path = tmp_path / "file.dll"
+    path.write_bytes(b"hashed content")
+    return path
+
+
+def test_add(store, source):
+    checksum = md5(b"hashed content")
+
+    assert store.add(str(source), checksum) == (checksum, len(b"hashed content"))
+    assert store.add(str(source), checksum) == (checksum, 0)
+    with open(store.get_path(checksum), "rb") as f:
+        assert f.read() == b"hashed content"
+
+
+def test_add_changed_since_hashed(store, source):
+    checksum = md5(b"hashed content")
+    source.write_bytes(b"changed content")
+
+    stored, size = store.add(str(source), checksum)
+
+    assert stored == md5(b"changed content")
+    assert size == len(b"changed content")
+    assert not store.has(checksum)
+    assert store.has(stored)
+    assert list(store.get_objects()) == [stored]
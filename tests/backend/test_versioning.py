@@ -0,0 +1,90 @@
+# test_versioning.py
+#
+# Copyright 2020 brombinmirko <send@mirko.pm>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import types
+import hashlib
+
+import pytest
+import yaml
+
+pytest.importorskip("gi")
+
+from bottles.backend.utils.manager import ManagerUtils  # noqa: E402
+from bottles.backend.managers.states import StatesIndex  # noqa: E402
+from bottles.backend.managers.versioning import VersioningManager  # noqa: E402
+
+
+def write(path: str, content: bytes) -> str:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(content)
+    return hashlib.md5(content).hexdigest()
+
+
+@pytest.fixture
+def legacy_bottle(request):
+    """A bottle with a state made before the recursive index (YAML, top-level files only)."""
+    name = request.node.name
+    config = {"Name": name, "Path": name}
+    bottle = ManagerUtils.get_bottle_path(config)
+    drive_c = os.path.join(bottle, "drive_c")
+    checksum = write(f"{drive_c}/top.txt", b"top")
+    write(f"{bottle}/states/0/drive_c/top.txt", b"top")
+    write(f"{drive_c}/windows/system32/nested.dll", b"nested")
+    write(f"{drive_c}/Program Files/App/app.exe", b"app")
+
+    with open(f"{bottle}/states/states.yml", "w") as f:
+        yaml.safe_dump({"States": {0: {"Creation_Date": "2021-01-01 00:00:00", "Comment": "legacy"}}}, f)
+    with open(f"{bottle}/states/0/files.yml", "w") as f:
+        yaml.safe_dump({"Files": [{"file": "top.txt", "checksum": checksum}]}, f)
+    with open(f"{bottle}/states/0/index.yml", "w") as f:
+        yaml.safe_dump({"Update_Date": "2021-01-01 00:00:00", "Additions": [], "Removed": [], "Changes": []}, f)
+
+    return config
+
+
+def test_legacy_state_is_not_recursive(legacy_bottle):
+    states_index = StatesIndex(ManagerUtils.get_bottle_path(legacy_bottle))
+    assert states_index.is_recursive(0) is False
+
+
+def test_legacy_restore_keeps_nested_files(legacy_bottle):
+    bottle = ManagerUtils.get_bottle_path(legacy_bottle)
+    write(f"{bottle}/drive_c/added.txt", b"added")
+    write(f"{bottle}/drive_c/top.txt", b"changed")
+
+    plan = VersioningManager.plan_state(legacy_bottle, 0)
+
+    assert plan["recursive"] is False
+    assert plan["remove"] == ["added.txt"]
+    assert list(plan["replace"]) == ["top.txt"]
+    assert all(os.sep not in f for f in plan["remove"])
+
+
+def test_restore_refused_when_content_missing(legacy_bottle):
+    bottle = ManagerUtils.get_bottle_path(legacy_bottle)
+    os.remove(f"{bottle}/states/0/drive_c/top.txt")
+    write(f"{bottle}/drive_c/top.txt", b"changed")
+    versioning = VersioningManager(None, types.SimpleNamespace(is_cli=True))
+
+    res = versioning.set_state(legacy_bottle, 0)
+
+    assert res.status is False
+    assert res.data["plan"]["missing"] == ["top.txt"]
+    with open(f"{bottle}/drive_c/top.txt", "rb") as f:
+        assert f.read() == b"changed"
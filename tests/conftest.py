@@ -0,0 +1,42 @@
+# conftest.py
+#
+# Copyright 2020 brombinmirko <send@mirko.pm>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+The sources are installed as the bottles package, import them from
+src/ as such. The data directory is a temporary one, set before the
+backend computes its paths.
+"""
+
+import os
+import sys
+import tempfile
+import importlib.util
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+os.environ["XDG_DATA_HOME"] = tempfile.mkdtemp(prefix="bottles-tests-")
+os.makedirs(os.path.join(os.environ["XDG_DATA_HOME"], "bottles", "bottles"))
+
+if "bottles" not in sys.modules:
+    spec = importlib.util.spec_from_file_location(
+        "bottles",
+        os.path.join(root, "src", "__init__.py"),
+        submodule_search_locations=[os.path.join(root, "src")]
+    )
+    module = importlib.util.module_from_spec(spec)
+    sys.modules["bottles"] = module
+    spec.loader.exec_module(module)